@@ -1,58 +1,105 @@
 import os
 import uuid
 import json
-import sqlite3
 import time
-import yfinance as yf
-from datetime import datetime, timedelta
-from fastapi import FastAPI, BackgroundTasks, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from main import run_financial_analysis
-from langfuse import Langfuse
-from bs4 import BeautifulSoup
-from evaluator import run_eval
-
-# --- 1. DATABASE CONFIGURATION ---
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "market_data.db")
-
-def init_db():
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS reports 
-                     (ticker TEXT PRIMARY KEY, price REAL, timestamp TEXT, data TEXT)''')
-        conn.commit()
-        conn.close()
-        print("✅ DB initialized successfully")
-    except Exception as e:
-        print(f"❌ DB Initialization Error: {e}")
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from functools import partial
+from dotenv import load_dotenv
 
-def save_to_db(ticker, price, data_dict):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""REPLACE INTO reports (ticker, price, timestamp, data) 
-                     VALUES (?, ?, ?, ?)""", 
-                  (ticker, price, datetime.now().isoformat(), json.dumps(data_dict)))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"❌ Error saving to DB: {e}")
+load_dotenv()  # before the imports below, which read their settings at import
 
-# Initialize DB on startup
-init_db()
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel
+from typing import List
+from fundamentals import build_fundamentals, source_cache
+from quotes import quote_service, router as quote_router, aclose_async_client
+from llm_cache import llm_cache
+from news import news_index
+from freshness import create_policy, FRESH, NEEDS_PRICE
+from scheduler import JobScheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+from job_store import create_job_store
+from eval_pipeline import EvalPipeline
+from prewarm import create_prewarmer
+from lazy import lazy_import
+from metrics import Callback, CACHE_LOOKUP_SECONDS, REPORT_CACHE, ANALYSIS_SECONDS
+import metrics
+import db
+
+# --- 1. STARTUP ---
+# Importing this module only defines routes and cheap objects, so a cold
+# instance answers health checks quickly. The heavy dependencies load
+# on first use:
+# - crewai (main.py) when the first crew job runs;
+# - the evaluator's OpenAI client in the eval worker;
+# - yfinance on the first cache miss;
+# - the Langfuse SDK through get_langfuse().
+# The job store opens its SQLite file on first use, and the agent and
+# eval workers start in the lifespan hook below (or on the first job), so
+# importing creates no files and starts no threads. Set
+# STARTUP_WARMUP=1 to load the heavy modules in the background right
+# after startup, before the first job needs them. `python importtime.py`
+# reports the per-module import cost.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0") == "1"
+WARMUP_MODULES = ("main", "evaluator", "yfinance")
+
+def warm_up():
+    started = time.perf_counter()
+    for name in WARMUP_MODULES:
+        module_started = time.perf_counter()
+        try:
+            lazy_import(name)
+        except Exception as e:
+            print(f"⚠️ Warm-up import of {name} failed: {e}")
+            continue
+        print(f"   {name}: {(time.perf_counter() - module_started) * 1000:.0f} ms")
+    get_langfuse()
+    print(f"🔥 Warm-up finished in {time.perf_counter() - started:.1f}s")
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    # Pooled WAL connections and the batched report writer live in db.py
+    await asyncio.to_thread(db.init_db)
+    scheduler.start()
+    eval_pipeline.start()
+    if STARTUP_WARMUP:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    if PREWARM:
+        prewarmer.start()
+    print(f"🚀 API ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    yield
+
+    prewarmer.stop()
+    scheduler.shutdown()
+    # Score what's already queued so those reports still get evals
+    await asyncio.to_thread(eval_pipeline.shutdown)
+    await aclose_async_client()
+    if _langfuse is not None:
+        _langfuse.flush()
+    db.get_writer().flush()
 
 # --- LANGFUSE OBSERVABILITY CLIENT ---
-langfuse = Langfuse(
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-    host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com")
-)
+_langfuse = None
+_langfuse_lock = threading.Lock()
+
+def get_langfuse():
+    global _langfuse
+    with _langfuse_lock:
+        if _langfuse is None:
+            _langfuse = lazy_import("langfuse").Langfuse(
+                public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+                secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+                host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com")
+            )
+        return _langfuse
 
 # --- 2. API SETUP ---
-app = FastAPI(title="AI Financial Analyst API")
+app = FastAPI(title="AI Financial Analyst API", lifespan=lifespan)
 
 ALLOWED_ORIGINS = os.getenv(
     "ALLOWED_ORIGINS",
@@ -66,222 +113,510 @@ app.add_middleware(
     allow_headers=["Content-Type"],
 )
 
-results_db = {}
+# --- JOB STATE ---
+# SQLite (WAL) by default so every uvicorn worker sees the same jobs and
+# the same single-flight claims; JOB_STORE=memory for a single process.
+job_store = create_job_store(
+    os.getenv("JOB_STORE", "sqlite"),
+    path=os.getenv("JOB_STORE_PATH", db.DB_PATH),
+    ttl_seconds=int(os.getenv("JOB_TTL_SECONDS", "3600")),
+    claim_ttl_seconds=int(os.getenv("JOB_CLAIM_TTL_SECONDS", "90"))
+)
+
+# --- AGENT WORKER POOL ---
+# Crew runs go through a bounded queue drained by a fixed number of
+# workers, so load spikes get a 429 instead of exhausting the threadpool.
+scheduler = JobScheduler(
+    workers=int(os.getenv("AGENT_WORKERS", "2")),
+    max_queue=int(os.getenv("AGENT_QUEUE_SIZE", "20")),
+    mode=os.getenv("AGENT_WORKER_MODE", "thread")
+)
+
+# --- EVAL PIPELINE ---
+# Reports are scored after the user already has the result, on separate
+# eval workers, several reports per judge request (see record_eval).
+eval_pipeline = EvalPipeline(
+    on_scored=lambda item, scores: record_eval(item, scores),
+    after_batch=lambda: get_langfuse().flush(),
+    on_skipped=lambda item, reason: publish_progress(item["job_id"], "eval", status="skipped", reason=reason),
+    workers=int(os.getenv("EVAL_WORKERS", "1")),
+    batch_size=int(os.getenv("EVAL_BATCH_SIZE", "4")),
+    max_wait=float(os.getenv("EVAL_BATCH_WAIT_SECONDS", "2"))
+)
+
+# --- PROGRESS STREAMING ---
+# How often /stream re-reads job state, and how long one stream may stay open
+STREAM_POLL_SECONDS = float(os.getenv("STREAM_POLL_SECONDS", "0.5"))
+STREAM_MAX_SECONDS = int(os.getenv("STREAM_MAX_SECONDS", "900"))
+# How long a stream stays open after the result, waiting for the eval event
+STREAM_EVAL_WAIT_SECONDS = int(os.getenv("STREAM_EVAL_WAIT_SECONDS", "120"))
+
+def publish_progress(job_id, stage, **extra):
+    job_store.append_event(job_id, {"stage": stage, "ts": time.time(), **extra})
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- BATCH SETTINGS ---
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+# Crew runs one batch may have in flight at once, so a NIFTY 50 screen
+# doesn't take every worker away from interactive users
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+BATCH_RETRY_SECONDS = 5
 
 class AnalysisRequest(BaseModel):
     ticker: str
 
+class BatchAnalysisRequest(BaseModel):
+    tickers: List[str]
+
 # --- 3. HELPER: SAFE PRICE FETCH ---
 def get_safe_price(ticker):
+    # Shared, coalesced quote (Groww -> Google -> yfinance); 0.0 if every source fails
+    quote = quote_service.get_quote(ticker)
+    return quote["price"] if quote else 0.0
+
+async def aget_safe_price(ticker):
+    """get_safe_price() for async routes: async HTTP, coalesced with sync callers."""
+    quote = await quote_service.aget_quote(ticker)
+    return quote["price"] if quote else 0.0
+
+def get_bulk_prices(tickers):
+    """Latest price for every ticker from a single yf.download call (0.0 where missing)."""
+    yf = lazy_import("yfinance")
+    prices = {t: 0.0 for t in tickers}
     try:
-        stock = yf.Ticker(ticker)
-        # We use .fast_info specifically because it avoids the buggy .info block
-        price = stock.fast_info.get('last_price')
-        if price is None:
-            # Fallback if fast_info fails
-            price = 0.0
-        return price
+        data = yf.download(tickers, period="5d", interval="1d", auto_adjust=True,
+                           progress=False, group_by="column")
+        closes = data["Close"]
+        if closes.ndim == 1:
+            closes = closes.to_frame(tickers[0])
+        last = closes.ffill().iloc[-1]
+        for t in tickers:
+            price = last.get(t)
+            if price is not None and price == price and price > 0:
+                prices[t] = float(price)
     except Exception as e:
-        print(f"⚠️ YFinance Warning for {ticker}: {e}")
-        return 0.0
+        print(f"⚠️ Bulk price download failed for {len(tickers)} tickers: {e}")
+    return prices
+
+# --- SMART CACHE LOGIC ---
+# A report is served while the price hasn't moved more than the ticker's
+# usual noise and it's under an hour old in trading time (FRESHNESS_POLICY=
+# fixed restores the flat 0.5% / 1 hour rule). The policy reads prices the
+# quote service already holds, so most cache hits need no network call.
+freshness = create_policy(os.getenv("FRESHNESS_POLICY", "volatility"), quotes=quote_service)
+
+async def check_freshness(ticker, row):
+    """
+    The freshness verdict for a cached report, computed without blocking
+    the event loop. The check itself can read bars from disk, so it runs
+    on a thread. The live price, when one is needed, is fetched with
+    async HTTP.
+    """
+    verdict = await asyncio.to_thread(freshness.check, ticker, row)
+    if verdict == NEEDS_PRICE:
+        current_price = await aget_safe_price(ticker)
+        verdict = await asyncio.to_thread(freshness.check, ticker, row, current_price)
+    return verdict
 
 # --- 4. ROUTES ---
 @app.get("/")
 def home():
     return {"status": "AI Agents Online", "version": "2.0"}
     
-@app.get("/fundamentals/{ticker}")
-def get_fundamentals(ticker: str):
-    clean = ticker.upper().strip()
-    for suffix in ['.NSE', '.NS', '.BSE', '.BO']:
-        if clean.endswith(suffix):
-            clean = clean[:-len(suffix)]
-            break
-
-    result = {
-        "mcap": "N/A", "pe": "N/A", "high52": "N/A", "low52": "N/A",
-        "book_value": "N/A", "div_yield": "N/A", "roce": "N/A",
-        "roe": "N/A", "eps": "N/A", "debt_eq": "N/A"
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters for this process's caches."""
+    return {
+        "llm": llm_cache.stats_snapshot(),
+        "fundamentals": dict(source_cache.stats),
+        "quotes": dict(quote_service.stats),
     }
 
-    def sf(val):
-        try:
-            return float(str(val).replace(',', '').strip())
-        except:
-            return None
-
-    def fmt(val, prefix='', suffix='', decimals=2):
-        f = sf(val)
-        return f"{prefix}{f:.{decimals}f}{suffix}" if f is not None else "N/A"
-
-    def get_row(df, *keys):
-        for k in keys:
-            if k in df.index:
-                val = sf(df.loc[k].iloc[0])
-                if val is not None:
-                    return val
-        return None
-
-    try:
-        # Try NSE first, fall back to BSE
-        stock = yf.Ticker(f"{clean}.NS")
-        fast = stock.fast_info
-
-        # Test if this ticker is valid — fast_info.last_price is None for invalid tickers
-        if not getattr(fast, 'last_price', None):
-            stock = yf.Ticker(f"{clean}.BO")
-            fast = stock.fast_info
-
-        # --- LAYER 1: fast_info — always reliable ---
-        shares  = sf(getattr(fast, 'shares', None))
-        price   = sf(getattr(fast, 'last_price', None))
-        mcap    = sf(getattr(fast, 'market_cap', None))
-        yr_high = sf(getattr(fast, 'year_high', None))
-        yr_low  = sf(getattr(fast, 'year_low', None))
-
-        if mcap:    result['mcap']   = f"₹{mcap/1e7:,.0f} Cr"
-        if yr_high: result['high52'] = f"₹{yr_high:.2f}"
-        if yr_low:  result['low52']  = f"₹{yr_low:.2f}"
-
-        # --- LAYER 2: get_info() — try first for derived metrics ---
-        info = {}
-        try:
-            info = stock.get_info() or {}
-        except Exception as e:
-            print(f"get_info() failed for {clean}: {e}")
-       
-        if info.get('trailingEps'):   result['eps']        = fmt(info['trailingEps'], prefix='₹')
-        if info.get('bookValue'):     result['book_value'] = fmt(info['bookValue'], prefix='₹')
-        if info.get('returnOnEquity'):result['roe']        = fmt(info['returnOnEquity'] * 100, suffix='%')
-        if info.get('debtToEquity'):  result['debt_eq']    = fmt(info['debtToEquity'])
-
-        # --- LAYER 3: Financial statements — fallback + ROCE ---
-        try:
-            income_stmt   = stock.get_income_stmt()
-            balance_sheet = stock.balance_sheet
-
-            net_income     = get_row(income_stmt,   'Net Income', 'NetIncome')
-            ebitda         = get_row(income_stmt,   'Normalized EBITDA', 'EBITDA')
-            common_equity  = get_row(balance_sheet, 'Common Stock Equity', 'StockholdersEquity')
-            total_debt     = get_row(balance_sheet, 'Total Debt', 'LongTermDebt')   
-            invested_cap   = get_row(balance_sheet, 'Invested Capital')
-            total_assets   = get_row(balance_sheet, 'Total Assets')
-            current_liab   = get_row(balance_sheet, 'Current Liabilities')
-            
-            # P/E: Price / EPS — calculate directly, don't rely on result['eps'] string
-            if result['pe'] == 'N/A' and price and net_income and shares and shares > 0:
-                eps_val = net_income / shares
-                if eps_val > 0:
-                    result['pe'] = f"{price / eps_val:.2f}"
-
-            # Dividend Yield: Annual Dividends Paid / Market Cap * 100
-            try:
-                cashflow = stock.cashflow
-                dividends_paid = get_row(cashflow, 'Cash Dividends Paid', 'Common Stock Dividend Paid')
-                if dividends_paid and mcap and mcap > 0:
-                    # dividends_paid is negative in cashflow statement, so abs()
-                    result['div_yield'] = f"{(abs(dividends_paid) / mcap) * 100:.2f}%"
-            except Exception as e:
-                print(f"Dividend yield calc error: {e}")
-                
-            # Fallback EPS: Net Income / shares
-            if result['eps'] == 'N/A' and net_income and shares and shares > 0:
-                result['eps'] = f"₹{net_income / shares:.2f}"
-
-            # Fallback Book Value: Common Equity / shares
-            if result['book_value'] == 'N/A' and common_equity and shares and shares > 0:
-                result['book_value'] = f"₹{common_equity / shares:.2f}"
-
-            # Fallback ROE: Net Income / Common Equity
-            if result['roe'] == 'N/A' and net_income and common_equity and common_equity > 0:
-                result['roe'] = f"{(net_income / common_equity) * 100:.2f}%"
-
-            # Fallback D/E: Total Debt / Common Equity (as percentage, matching yfinance format)
-            if result['debt_eq'] == 'N/A' and total_debt and common_equity and common_equity > 0:
-                result['debt_eq'] = fmt((total_debt / common_equity) * 100)
-
-            # ROCE: Net Income / Invested Capital (best approximation from available data)
-            # Fall back to Total Assets - Current Liabilities if Invested Capital missing
-            capital_employed = invested_cap or (
-                (total_assets - current_liab) if total_assets and current_liab else None
-            )
-            if net_income and capital_employed and capital_employed > 0:
-                result['roce'] = f"{(net_income / capital_employed) * 100:.2f}%"
+@app.get("/metrics")
+def get_metrics():
+    """Latency, queue, cache and token metrics in Prometheus text format."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
-        except Exception as e:
-            print(f"Statements fallback error for {clean}: {e}")
+@app.get("/quotes/sources")
+def get_quote_sources():
+    """Per-source latency, error rate and circuit state, in the order they'll be tried."""
+    return quote_router.snapshot()
 
-    except Exception as e:
-        print(f"❌ Fundamentals Error for {ticker}: {e}")
+@app.get("/quote/{ticker}")
+async def get_quote(ticker: str):
+    quote = await quote_service.aget_quote(ticker)
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"No live price for {ticker}")
+    return quote
 
-    return result
+@app.get("/fundamentals/{ticker}")
+def get_fundamentals(ticker: str):
+    return build_fundamentals(ticker)
 
 @app.post("/analyze")
-async def start_analysis(request: AnalysisRequest, background_tasks: BackgroundTasks):
+async def start_analysis(request: AnalysisRequest):
+    # Runs on the event loop, so nothing here may block: SQLite work goes
+    # to db threads (db.run) and quotes use async HTTP. A slow price source
+    # or a busy writer lock then delays only this request, not every
+    # /status poll served by the same loop.
     ticker = request.ticker.upper()
-    job_id = str(uuid.uuid4())
-    
-    # 1. Get Live Price safely
-    current_price = get_safe_price(ticker)
+
+    # 0. Attach to an in-flight run for this ticker if there is one
+    running_job = await db.run(job_store.active_job, ticker)
+    if running_job:
+        return {"job_id": running_job, "status": "started", "shared": True}
     
-    # 2. Check the SQL Filing Cabinet
+    # 1. Check the SQL Filing Cabinet
+    lookup_started = time.perf_counter()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT price, timestamp, data FROM reports WHERE ticker=?", (ticker,))
-        row = c.fetchone()
-        conn.close()
-    except:
+        row = await db.aget_report(ticker)
+    except Exception as e:
+        print(f"⚠️ Cache lookup failed for {ticker}: {e}")
         row = None
 
-    if row:
-        old_price, old_time, saved_data = row
-        last_run = datetime.fromisoformat(old_time)
-        
-        # Calculate price change if we have a valid current price
-        price_change = 0
-        if old_price > 0 and current_price > 0:
-            price_change = abs(current_price - old_price) / old_price
-        
-        # SMART CACHE LOGIC: 
-        # If price moved < 0.5% AND it was less than 1 hour ago, return saved data instantly
-        if price_change < 0.005 and (datetime.now() - last_run) < timedelta(hours=1):
-            return {
-                "status": "completed", 
-                "result": json.loads(saved_data), 
-                "source": "Verified Intelligence"
-            }
+    # 2. If the saved report is still fresh, return it instantly. A live
+    # price is only fetched when the policy can't decide without one.
+    if row is None:
+        cache_result = "miss"
+    else:
+        cache_result = "fresh" if await check_freshness(ticker, row) == FRESH else "stale"
+    CACHE_LOOKUP_SECONDS.observe(time.perf_counter() - lookup_started, result=cache_result)
+    REPORT_CACHE.inc(route="analyze", result=cache_result)
+
+    if cache_result == "fresh":
+        return {
+            "status": "completed", 
+            "result": json.loads(row[2]), 
+            "source": "Verified Intelligence"
+        }
 
     # 3. If no cache or price moved too much, start the Agents
-    results_db[job_id] = {"status": "pending", "result": None}
-    background_tasks.add_task(execute_analysis, job_id, ticker)
-    
+    try:
+        job_id, shared = await db.run(enqueue_analysis, ticker)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Analysis queue is full. Please retry shortly.")
+    if shared:
+        return {"job_id": job_id, "status": "started", "shared": True}
     return {"job_id": job_id, "status": "started"}
 
+def enqueue_analysis(ticker, priority=PRIORITY_INTERACTIVE, run=None):
+    """
+    Claims the ticker and queues a crew run for it. Returns (job_id, shared).
+    shared is True when another request claimed the ticker first, and then
+    job_id is that request's job. Raises QueueFullError when the queue has
+    no room. The claim is atomic, so it is safe even though the caller
+    checked for a running job a moment earlier.
+    """
+    job_id = str(uuid.uuid4())
+    running_job = job_store.claim_ticker(ticker, job_id)
+    if running_job:
+        return running_job, True
+
+    try:
+        job_store.put(job_id, {
+            "status": "queued",
+            "result": None,
+            "events": [{"stage": "queued", "ts": time.time()}]
+        }, ticker=ticker)
+        scheduler.submit(job_id, run or execute_analysis, job_id, ticker, priority=priority)
+    except BaseException:
+        # Queue full, scheduler shut down, job store error: nothing will run
+        # this job, so nothing may keep the ticker claimed for it
+        job_store.release_ticker(ticker, job_id)
+        job_store.delete(job_id)
+        raise
+    return job_id, False
+
 @app.get("/status/{job_id}")
 async def get_status(job_id: str):
-    job_data = results_db.get(job_id)
+    job_data = await db.run(job_store.get, job_id)
     if not job_data:
         return {"status": "not_found"}
+
+    if job_data["status"] == "queued":
+        return {
+            **job_data,
+            "queue_position": scheduler.position(job_id),
+            "queue_depth": scheduler.depth()
+        }
     return job_data
 
+@app.get("/stream/{job_id}")
+async def stream_status(job_id: str):
+    """
+    Server-sent events for one job, so clients don't have to poll /status.
+
+    event: queue     -> {"queue_position", "queue_depth"} while waiting
+    event: progress  -> {"stage", "ts"} for running, quant, news, risk, eval
+                        (eval has "status": "skipped" if the report won't be scored)
+    event: result    -> the same payload /status returns once completed
+    event: failed    -> {"status": "failed", "error"}; stream ends
+    event: not_found -> unknown or expired job_id; stream ends
+
+    result always comes before eval. The stream closes after the eval
+    event, STREAM_EVAL_WAIT_SECONDS after the result if no eval arrives,
+    or on failure/timeout.
+    Job state is read from the shared job store, so any worker can serve it.
+    """
+    async def event_stream():
+        sent_events = 0
+        result_sent = False
+        last_position = None
+        idle_polls = 0
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+
+        while time.monotonic() < deadline:
+            job_data = await db.run(job_store.get, job_id)
+            if not job_data:
+                yield sse("not_found", {"status": "not_found"})
+                return
+
+            emitted = False
+            events = job_data.get("events", [])
+            status = job_data["status"]
+            new_events = events[sent_events:]
+            sent_events = len(events)
+            if status == "completed" and not result_sent:
+                # The agents' progress first, then the result, then eval
+                later = [e for e in new_events if e.get("stage") == "eval"]
+                new_events = [e for e in new_events if e.get("stage") != "eval"]
+            else:
+                later = []
+            for event in new_events:
+                yield sse("progress", event)
+                emitted = True
+
+            if status == "queued":
+                position = scheduler.position(job_id)
+                if position is not None and position != last_position:
+                    last_position = position
+                    yield sse("queue", {"queue_position": position, "queue_depth": scheduler.depth()})
+                    emitted = True
+            elif status == "completed" and not result_sent:
+                yield sse("result", {k: v for k, v in job_data.items() if k != "events"})
+                result_sent = True
+                emitted = True
+                deadline = min(deadline, time.monotonic() + STREAM_EVAL_WAIT_SECONDS)
+                for event in later:
+                    yield sse("progress", event)
+            elif status == "failed":
+                yield sse("failed", {"status": "failed", "error": job_data.get("error")})
+                return
+
+            if result_sent and any(e.get("stage") == "eval" for e in events):
+                return
+
+            # Comment line every ~15s keeps proxies from closing an idle stream
+            idle_polls = 0 if emitted else idle_polls + 1
+            if idle_polls * STREAM_POLL_SECONDS >= 15:
+                idle_polls = 0
+                yield ": keepalive\n\n"
+
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/history/{ticker}")
+def get_report_history(ticker: str,
+                       limit: int = Query(50, ge=1, le=500),
+                       before: str = None,
+                       since: str = None,
+                       include_data: bool = False):
+    """
+    Past reports for a ticker, newest first. Page backwards by passing
+    `next_before` from one response as `before` of the next.
+    """
+    ticker = ticker.upper()
+    items = db.get_history(ticker, limit=limit, before=before, since=since, include_data=include_data)
+    return {
+        "ticker": ticker,
+        "items": items,
+        "next_before": items[-1]["timestamp"] if len(items) == limit else None
+    }
+
+@app.post("/analyze/batch")
+def start_batch_analysis(request: BatchAnalysisRequest):
+    """
+    Analyzes a watchlist in one call. Fresh reports come straight from the
+    cache; only stale tickers get crew runs, at most BATCH_CONCURRENCY at a
+    time and behind interactive /analyze jobs in the queue.
+    Progress and results: GET /analyze/batch/{batch_id}.
+    """
+    tickers = list(dict.fromkeys(t.upper().strip() for t in request.tickers if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers given.")
+    if len(tickers) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} tickers per batch.")
+
+    batch_id = str(uuid.uuid4())
+
+    # Judge every cached report from memory first; the tickers that still
+    # need a live price get it from one bulk download instead of one quote each
+    rows, verdicts = {}, {}
+    for ticker in tickers:
+        try:
+            rows[ticker] = db.get_report(ticker)
+        except Exception as e:
+            print(f"⚠️ Cache lookup failed for {ticker}: {e}")
+            rows[ticker] = None
+        if rows[ticker]:
+            verdicts[ticker] = freshness.check(ticker, rows[ticker])
+
+    need_price = [t for t, verdict in verdicts.items() if verdict == NEEDS_PRICE]
+    if need_price:
+        prices = get_bulk_prices(need_price)
+        for ticker in need_price:
+            verdicts[ticker] = freshness.check(ticker, rows[ticker], prices[ticker])
+
+    for ticker in tickers:
+        verdict = verdicts.get(ticker)
+        REPORT_CACHE.inc(route="batch", result="miss" if verdict is None else "fresh" if verdict == FRESH else "stale")
+
+    members = {}
+    to_dispatch = []
+    for ticker in tickers:
+        running_job = job_store.active_job(ticker)
+        if running_job:
+            members[ticker] = {"job_id": running_job}
+            continue
+
+        if verdicts.get(ticker) == FRESH:
+            members[ticker] = {"result": json.loads(rows[ticker][2]), "source": "Verified Intelligence"}
+            continue
+
+        # Claim now so /analyze calls for this ticker attach to the batch's job.
+        # The store's heartbeat keeps the claim alive however long it waits.
+        job_id = str(uuid.uuid4())
+        running_job = job_store.claim_ticker(ticker, job_id)
+        if running_job:
+            members[ticker] = {"job_id": running_job}
+            continue
+
+        try:
+            job_store.put(job_id, {
+                "status": "waiting",
+                "result": None,
+                "batch_id": batch_id,
+                "events": [{"stage": "waiting", "ts": time.time()}]
+            }, ticker=ticker)
+        except BaseException:
+            job_store.release_ticker(ticker, job_id)
+            raise
+        members[ticker] = {"job_id": job_id}
+        to_dispatch.append((job_id, ticker))
+
+    job_store.put(batch_id, {"kind": "batch", "status": "running", "members": members})
+
+    if to_dispatch:
+        threading.Thread(
+            target=dispatch_batch, args=(to_dispatch,),
+            name=f"batch-{batch_id[:8]}", daemon=True
+        ).start()
+
+    return get_batch_status(batch_id)
+
+@app.get("/analyze/batch/{batch_id}")
+def get_batch_status(batch_id: str):
+    batch = job_store.get(batch_id)
+    if not batch or batch.get("kind") != "batch":
+        return {"status": "not_found"}
+
+    results, jobs = {}, {}
+    progress = {"total": len(batch["members"]), "cached": 0, "completed": 0, "failed": 0, "pending": 0}
+
+    for ticker, member in batch["members"].items():
+        if "result" in member:
+            results[ticker] = member["result"]
+            progress["cached"] += 1
+            continue
+
+        jobs[ticker] = member["job_id"]
+        job_data = job_store.get(member["job_id"]) or {"status": "not_found"}
+        if job_data["status"] == "completed":
+            results[ticker] = job_data["result"]
+            progress["completed"] += 1
+        elif job_data["status"] in ("failed", "not_found"):
+            progress["failed"] += 1
+        else:
+            progress["pending"] += 1
+
+    status = "running" if progress["pending"] else "completed"
+    if status != batch["status"]:
+        # Marks the batch finished so the job store's TTL eviction can reclaim it
+        job_store.update(batch_id, {"status": status})
+
+    return {"batch_id": batch_id, "status": status, "progress": progress, "jobs": jobs, "results": results}
+
+def dispatch_batch(members):
+    """Feeds a batch's stale tickers to the worker pool, BATCH_CONCURRENCY at a time."""
+    slots = threading.Semaphore(BATCH_CONCURRENCY)
+
+    def run_member(job_id, ticker):
+        try:
+            execute_analysis(job_id, ticker)
+        finally:
+            slots.release()
+
+    for job_id, ticker in members:
+        slots.acquire()
+        try:
+            job_store.update(job_id, {"status": "queued"})
+            publish_progress(job_id, "queued")
+            while True:
+                try:
+                    scheduler.submit(job_id, run_member, job_id, ticker, priority=PRIORITY_BATCH)
+                    break
+                except QueueFullError:
+                    # Interactive traffic has the queue; wait for room
+                    time.sleep(BATCH_RETRY_SECONDS)
+        except Exception as e:
+            # This member will never run; fail it and carry on with the rest
+            slots.release()
+            print(f"❌ Couldn't queue batch job {job_id} for {ticker}: {e}")
+            fail_batch_member(job_id, ticker, e)
+
+def fail_batch_member(job_id, ticker, error):
+    """Marks a batch job that can't be queued failed and frees its ticker. Never raises."""
+    try:
+        job_store.update(job_id, {"status": "failed", "error": str(error)}, ticker=ticker)
+        publish_progress(job_id, "failed")
+    except Exception as e:
+        # Once the claim is dropped nothing refreshes the job, so the store's
+        # orphan sweep marks it failed instead
+        print(f"⚠️ Couldn't mark batch job {job_id} failed: {e}")
+    try:
+        job_store.release_ticker(ticker, job_id)
+    except Exception as e:
+        # The heartbeat has already let go of it; the claim expires on its own
+        print(f"⚠️ Couldn't release {ticker} for batch job {job_id}: {e}")
+
 # --- 5. BACKGROUND ENGINE ---
 def execute_analysis(job_id: str, ticker: str):
     # --- START LANGFUSE TRACE ---
     # A "trace" is one complete run of the analysis for a ticker.
     # Think of it like opening a logbook entry for this job.
     start_time = time.time()
-
-    trace = langfuse.trace(
-        name="stock-analysis",
-        metadata={
-            "ticker": ticker,
-            "job_id": job_id
-        },
-        tags=[ticker]
-    )
+    trace = None
 
     try:
+        job_store.update(job_id, {"status": "running"}, ticker=ticker)
+        publish_progress(job_id, "running")
+
+        trace = get_langfuse().trace(
+            name="stock-analysis",
+            metadata={
+                "ticker": ticker,
+                "job_id": job_id
+            },
+            tags=[ticker]
+        )
+
         # --- START A SPAN FOR THE CREWAI RUN ---
         # A "span" is a timed section inside the trace.
         # This one measures exactly how long the CrewAI agents take.
@@ -290,8 +625,12 @@ def execute_analysis(job_id: str, ticker: str):
             input={"ticker": ticker}
         )
 
-        # Run CrewAI Agents (nothing changed here)
-        output = run_financial_analysis(ticker)
+        # Run CrewAI Agents (in a worker process when AGENT_WORKER_MODE=process).
+        # Per-agent progress needs a callback into this process, so process
+        # mode only reports the coarse stages.
+        run_financial_analysis = lazy_import("main").run_financial_analysis   # crewai loads on the first job
+        on_progress = None if scheduler.mode == "process" else partial(publish_progress, job_id)
+        output = scheduler.offload(run_financial_analysis, ticker, on_progress)
 
         # Calculate how long the agents took
         latency = round(time.time() - start_time, 2)
@@ -317,97 +656,173 @@ def execute_analysis(job_id: str, ticker: str):
         # Get price for the DB record
         final_price = get_safe_price(ticker)
 
-        # Save to SQL
-        save_to_db(ticker, final_price, analysis_data)
+        # Save to SQL (batched write-behind; readable immediately)
+        db.save_report(ticker, final_price, analysis_data)
 
-        # Update results memory
-        results_db[job_id] = {
+        # Update job state
+        job_store.update(job_id, {
             "status": "completed",
             "result": analysis_data,
             "source": "Live Agent Analysis"
-        }
-
-        # --- RUN EVALUATION ---
-        # This scores the quality of the analysis that just completed.
-        # It runs after the result is saved so a eval failure never
-        # blocks the user from seeing their result.
-        eval_scores = run_eval(analysis_data, ticker)
+        }, ticker=ticker)
+        ANALYSIS_SECONDS.observe(time.time() - start_time, status="completed")
 
-        # --- LOG EVAL SCORES TO LANGFUSE ---
-        # Each score() call creates a named metric on the trace.
-        # You'll see these as individual score cards in the Langfuse dashboard.
+    except Exception as e:
+        # --- LOG THE FAILURE TO LANGFUSE ---
+        latency = round(time.time() - start_time, 2)
+        print(f"❌ Background Task Failed: {e}")
+        job_store.update(job_id, {"status": "failed", "error": str(e)}, ticker=ticker)
+        publish_progress(job_id, "failed")
+        ANALYSIS_SECONDS.observe(time.time() - start_time, status="failed")
+
+        if trace is not None:
+            trace.update(
+                metadata={
+                    "ticker": ticker,
+                    "job_id": job_id,
+                    "status": "failed",
+                    "error": str(e),
+                    "latency_seconds": latency
+                }
+            )
+        return
 
-        # Score 1: Signal/Score Consistency (0.0 or 1.0)
-        langfuse.score(
-            trace_id=trace.id,
-            name="signal_consistency",
-            value=eval_scores["signal_consistency"],
-            comment=eval_scores["consistency_reason"]
-        )
+    finally:
+        # The only release. On success the result is in the cache by now, so
+        # new requests no longer need to attach, and they don't wait on the
+        # Langfuse update and the eval hand-off below.
+        job_store.release_ticker(ticker, job_id)
+        # No flush here: Langfuse sends in the background, and the eval
+        # pipeline flushes once per scored batch.
+
+    fallback_used = not (hasattr(output, 'json_dict') and output.json_dict)
+    trace.update(
+        output={
+            "technical_signal": analysis_data.get("technical_signal"),
+            "sentiment_score":  analysis_data.get("sentiment_score"),
+            "status": "completed"
+        },
+        metadata={
+            "ticker":          ticker,
+            "latency_seconds": latency,
+            "job_id":          job_id,
+            "fallback_used":   fallback_used
+        }
+    )
 
-        # Score 2: Risk Specificity (1–5)
-        langfuse.score(
-            trace_id=trace.id,
-            name="risk_specificity",
-            value=eval_scores["risk_specificity"],
-            comment=eval_scores["reasoning"]
-        )
+    # --- HAND OFF TO THE EVAL PIPELINE ---
+    # Scoring costs another LLM round trip. It runs on the eval workers,
+    # so this worker is free for the next job as soon as the result is
+    # saved; an eval failure never blocks the user from seeing it.
+    eval_pipeline.submit({
+        "job_id":        job_id,
+        "ticker":        ticker,
+        "analysis_data": analysis_data,
+        "trace":         trace,
+        "latency":       latency,
+        "fallback_used": fallback_used
+    })
+
+
+# --- EVAL SCORES ---
+# (score name, comment field) for each metric logged to Langfuse
+EVAL_SCORES = (
+    ("signal_consistency",   "consistency_reason"),  # 0.0 or 1.0
+    ("risk_specificity",     "reasoning"),           # 1–5
+    ("catalyst_specificity", "reasoning"),           # 1–5
+    ("overall_quality",      "reasoning"),           # 1–10
+)
 
-        # Score 3: Catalyst Specificity (1–5)
-        langfuse.score(
-            trace_id=trace.id,
-            name="catalyst_specificity",
-            value=eval_scores["catalyst_specificity"],
-            comment=eval_scores["reasoning"]
-        )
+def record_eval(item, eval_scores):
+    """Eval pipeline callback for one scored report: progress event + Langfuse scores."""
+    publish_progress(item["job_id"], "eval", overall_quality=eval_scores["overall_quality"])
 
-        # Score 4: Overall Quality (1–10)
-        langfuse.score(
+    # --- LOG EVAL SCORES TO LANGFUSE ---
+    # Each score() call creates a named metric on the trace. They are only
+    # queued here; the pipeline sends the whole batch with one flush.
+    trace = item["trace"]
+    for name, comment_field in EVAL_SCORES:
+        get_langfuse().score(
             trace_id=trace.id,
-            name="overall_quality",
-            value=eval_scores["overall_quality"],
-            comment=eval_scores["reasoning"]
-        )
-        
-        langfuse.flush()
-
-        # --- UPDATE TRACE WITH FINAL RESULT + EVAL SUMMARY ---
-        trace.update(
-            output={
-                "technical_signal":   analysis_data.get("technical_signal"),
-                "sentiment_score":    analysis_data.get("sentiment_score"),
-                "overall_quality":    eval_scores["overall_quality"],
-                "signal_consistency": eval_scores["signal_consistency"],
-                "status": "completed"
-            },
-            metadata={
-                "ticker":          ticker,
-                "latency_seconds": latency,
-                "job_id":          job_id,
-                "fallback_used":   not (hasattr(output, 'json_dict') and output.json_dict),
-                "eval_reasoning":  eval_scores["reasoning"]
-            }
+            name=name,
+            value=eval_scores[name],
+            comment=eval_scores[comment_field]
         )
 
-    except Exception as e:
-        # --- LOG THE FAILURE TO LANGFUSE ---
-        latency = round(time.time() - start_time, 2)
-        print(f"❌ Background Task Failed: {e}")
-        results_db[job_id] = {"status": "failed", "error": str(e)}
+    # --- UPDATE TRACE WITH FINAL RESULT + EVAL SUMMARY ---
+    analysis_data = item["analysis_data"]
+    trace.update(
+        output={
+            "technical_signal":   analysis_data.get("technical_signal"),
+            "sentiment_score":    analysis_data.get("sentiment_score"),
+            "overall_quality":    eval_scores["overall_quality"],
+            "signal_consistency": eval_scores["signal_consistency"],
+            "status": "completed"
+        },
+        metadata={
+            "ticker":          item["ticker"],
+            "latency_seconds": item["latency"],
+            "job_id":          item["job_id"],
+            "fallback_used":   item["fallback_used"],
+            "eval_reasoning":  eval_scores["reasoning"]
+        }
+    )
 
-        trace.update(
-            metadata={
-                "ticker": ticker,
-                "job_id": job_id,
-                "status": "failed",
-                "error": str(e),
-                "latency_seconds": latency
-            }
-        )
+# --- 6. PRE-OPEN WARMING ---
+def prewarm_ticker(ticker):
+    """
+    Prewarmer hook. It refreshes fundamentals, then runs one crew analysis
+    at background priority and blocks until the report is saved.
+    Returns False, without running anything, if the ticker is already
+    being analyzed or the queue is full.
+    """
+    build_fundamentals(ticker)
+    done = threading.Event()
+
+    def run(job_id, ticker):
+        try:
+            execute_analysis(job_id, ticker)
+        finally:
+            done.set()
 
-    finally:
-        # --- FLUSH ENSURES DATA IS SENT ---
-        # Langfuse batches data before sending. flush() forces it to send now.
-        # This is important in background tasks where the process might end
-        # before the batch is sent automatically.
-        langfuse.flush()
\ No newline at end of file
+    try:
+        job_id, shared = enqueue_analysis(ticker, PRIORITY_BACKGROUND, run=run)
+    except QueueFullError:
+        return False   # users have the queue; don't add to it
+    if shared:
+        return False
+    done.wait()
+    return (job_store.get(job_id) or {}).get("status") == "completed"
+
+# PREWARM=1 runs the pre-open schedule in this process; `python prewarm.py`
+# runs it on its own. With several uvicorn workers, the ticker claims stop
+# two workers from warming the same ticker at once.
+PREWARM = os.getenv("PREWARM", "0") == "1"
+prewarmer = create_prewarmer(prewarm_ticker)   # started by the lifespan hook
+
+# --- 7. METRICS ---
+# Read from the objects that already keep these numbers, at scrape time.
+# Per process: with several uvicorn workers, each reports its own.
+def _stats_by_label(**sources):
+    """{(name, stat): value} for each source's numeric stats."""
+    return {(name, stat): value
+            for name, stats in sources.items()
+            for stat, value in stats.items()
+            if isinstance(value, int)}
+
+Callback("analyst_queue_depth", "Crew jobs waiting for an agent worker", scheduler.depth)
+Callback("analyst_jobs_in_flight", "Crew jobs running now", lambda: scheduler.stats()["running"])
+Callback("analyst_eval_queue_depth", "Reports waiting to be scored", eval_pipeline.depth)
+Callback(
+    "analyst_cache_events_total", "Cache hits, misses and other events, per cache",
+    lambda: _stats_by_label(llm=llm_cache.stats_snapshot(), fundamentals=source_cache.stats,
+                            quotes=quote_service.stats, news=news_index.stats),
+    labels=("cache", "event"), type="counter")
+Callback(
+    "analyst_eval_total", "Eval pipeline items submitted, dropped and scored, and judge batches",
+    lambda: {(stat,): value for stat, value in eval_pipeline.stats.items()},
+    labels=("event",), type="counter")
+Callback(
+    "analyst_prewarm_total", "Pre-open warming passes and per-ticker outcomes",
+    lambda: {(stat,): value for stat, value in prewarmer.stats.items()},
+    labels=("event",), type="counter")
@@ -0,0 +1,135 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from db import get_pool
+
+CREATE_CACHE = '''CREATE TABLE IF NOT EXISTS cache_entries
+                  (namespace TEXT, key TEXT, value BLOB, expires_at REAL,
+                   PRIMARY KEY (namespace, key))'''
+SELECT_ENTRY = "SELECT value, expires_at FROM cache_entries WHERE namespace=? AND key=?"
+UPSERT_ENTRY = "REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)"
+PURGE_EXPIRED = "DELETE FROM cache_entries WHERE expires_at < ?"
+
+
+class TieredCache:
+    """
+    Two-tier TTL cache: an in-process LRU in front of a SQLite table.
+
+    Each namespace has its own TTL, so slow-moving data (e.g. annual
+    statements) and fast-moving data (e.g. quotes) can share one cache.
+    The SQLite tier survives restarts and is shared by every worker
+    process; a memory hit costs a dict lookup.
+
+    Values are pickled for the SQLite tier, so only cache data this
+    process produced itself.
+    """
+
+    def __init__(self, ttls, memory_size=512, pool=None, purge_every_seconds=600):
+        self.ttls = ttls
+        self.memory_size = memory_size
+        self.purge_every_seconds = purge_every_seconds
+        self._pool = pool
+        self._memory = OrderedDict()   # (namespace, key) -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._schema_ready = False
+        self._last_purge = time.time()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = get_pool()
+        if not self._schema_ready:
+            with self._pool.connection() as conn:
+                conn.execute(CREATE_CACHE)
+            self._schema_ready = True
+        return self._pool
+
+    # --- MEMORY TIER ---
+    def _memory_get(self, entry_key, now):
+        with self._lock:
+            hit = self._memory.get(entry_key)
+            if hit is None:
+                return None
+            if hit[1] < now:
+                del self._memory[entry_key]
+                return None
+            self._memory.move_to_end(entry_key)
+            return hit
+
+    def _memory_set(self, entry_key, value, expires_at):
+        with self._lock:
+            self._memory[entry_key] = (value, expires_at)
+            self._memory.move_to_end(entry_key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, namespace, key):
+        """Returns (tier, value); tier is "memory_hits", "disk_hits" or None on a miss."""
+        now = time.time()
+        entry_key = (namespace, key)
+
+        hit = self._memory_get(entry_key, now)
+        if hit is not None:
+            return "memory_hits", hit[0]
+
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_ENTRY, (namespace, key)).fetchone()
+        if row and row[1] >= now:
+            value = pickle.loads(row[0])
+            self._memory_set(entry_key, value, row[1])
+            return "disk_hits", value
+
+        return None, None
+
+    # --- PUBLIC API ---
+    def get(self, namespace, key):
+        """Returns (found, value)."""
+        tier, value = self._lookup(namespace, key)
+        self.stats[tier or "misses"] += 1
+        return tier is not None, value
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = self.ttls[namespace] if ttl is None else ttl
+        expires_at = time.time() + ttl
+        self._memory_set((namespace, key), value, expires_at)
+        with self.pool.connection() as conn:
+            conn.execute(UPSERT_ENTRY, (namespace, key, pickle.dumps(value), expires_at))
+        self._maybe_purge()
+
+    def get_or_load(self, namespace, key, loader, ttl_for=None):
+        """
+        Cached value, or loader() stored under the namespace TTL.
+        Concurrent misses for the same key wait for one load instead of
+        all going upstream. Exceptions from loader are not cached.
+        ttl_for(value) may return a TTL to use instead of the namespace's
+        (e.g. a short one for an empty answer), or None to keep it.
+        """
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault((namespace, key), threading.Lock())
+        with key_lock:
+            # Someone else may have loaded it while we waited
+            tier, value = self._lookup(namespace, key)
+            if tier:
+                return value
+            value = loader()
+            self.set(namespace, key, value, ttl=ttl_for(value) if ttl_for else None)
+            return value
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_every_seconds:
+            return
+        self._last_purge = now
+        with self.pool.connection() as conn:
+            conn.execute(PURGE_EXPIRED, (now,))
+        with self._lock:
+            # Key locks are only needed while a load is running
+            self._key_locks = {k: l for k, l in self._key_locks.items() if l.locked()}
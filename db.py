@@ -0,0 +1,312 @@
+import os
+import json
+import queue
+import sqlite3
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from metrics import DB_WRITE_SECONDS, DB_ROWS_WRITTEN
+from datetime import datetime
+
+# --- 1. CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "market_data.db")
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across app crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",        # 16 MB page cache
+    "PRAGMA mmap_size=134217728",      # 128 MB memory-mapped reads
+)
+
+# Statements are module constants so sqlite3's per-connection statement
+# cache compiles each one once and reuses it.
+CREATE_REPORTS = '''CREATE TABLE IF NOT EXISTS reports
+                    (ticker TEXT PRIMARY KEY, price REAL, timestamp TEXT, data TEXT)'''
+SELECT_REPORT = "SELECT price, timestamp, data FROM reports WHERE ticker=?"
+UPSERT_REPORT = "REPLACE INTO reports (ticker, price, timestamp, data) VALUES (?, ?, ?, ?)"
+
+# `reports` only ever holds the latest report per ticker (the /analyze
+# cache lookup); every report is also appended to `report_history`, with
+# the fields trend views filter on pulled out of the JSON into columns.
+CREATE_HISTORY = '''CREATE TABLE IF NOT EXISTS report_history
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT, timestamp TEXT, price REAL,
+                     technical_signal TEXT, sentiment_score REAL, data TEXT)'''
+CREATE_HISTORY_INDEX = "CREATE INDEX IF NOT EXISTS idx_report_history_ticker_ts ON report_history (ticker, timestamp)"
+INSERT_HISTORY = '''INSERT INTO report_history (ticker, timestamp, price, technical_signal, sentiment_score, data)
+                    VALUES (?, ?, ?, ?, ?, ?)'''
+SELECT_HISTORY = '''SELECT id, timestamp, price, technical_signal, sentiment_score, data
+                    FROM report_history WHERE ticker=? AND timestamp < ? AND timestamp >= ?
+                    ORDER BY timestamp DESC, id DESC LIMIT ?'''
+# Backfills history from the pre-history `reports` table; a no-op once
+# every latest report is already in report_history
+MIGRATE_HISTORY = '''INSERT INTO report_history (ticker, timestamp, price, technical_signal, sentiment_score, data)
+                     SELECT ticker, timestamp, price,
+                            CASE WHEN json_valid(data) THEN json_extract(data, '$.technical_signal') END,
+                            CASE WHEN json_valid(data) THEN CAST(json_extract(data, '$.sentiment_score') AS REAL) END,
+                            data
+                     FROM reports
+                     WHERE NOT EXISTS (SELECT 1 FROM report_history h
+                                       WHERE h.ticker = reports.ticker AND h.timestamp = reports.timestamp)'''
+
+
+# --- 2. CONNECTION POOL ---
+class ConnectionPool:
+    """
+    A fixed-size, thread-safe pool of SQLite connections to one file.
+
+    Connections are opened lazily, tuned once with PRAGMAS and then
+    reused, so requests no longer pay for connect/close and cold page
+    caches. They run in autocommit mode; use transaction() to group writes.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=10,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _discard(self, conn):
+        conn.close()
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Runs the block in one transaction. Anything that fails, COMMIT
+        included (SQLITE_BUSY, I/O errors), is rolled back before the
+        connection goes back to the pool, so no borrower inherits an
+        open transaction or the write lock.
+        """
+        conn = self._acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    # Stuck mid-transaction: close it rather than pool it
+                    self._discard(conn)
+                    raise
+            self._idle.put(conn)
+            raise
+        self._idle.put(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path=DB_PATH):
+    """One shared pool per database file."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+# --- 3. ASYNC ACCESS ---
+# Async routes never call SQLite on the event loop; they hand the call
+# to these threads. A pool of its own, sized like the connection pool,
+# means quick lookups such as /status don't queue behind whatever else
+# is using asyncio's default executor.
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+
+async def run(fn, *args, **kwargs):
+    """Awaits a blocking database call (db.*, job store) made on a db thread."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+# --- 4. BATCHED REPORT WRITER ---
+class ReportWriter:
+    """
+    Write-behind queue for report rows.
+
+    A single background thread drains whatever has accumulated and writes
+    it with one executemany in one transaction, so bursts of finished
+    jobs cost one writer lock instead of one each. Rows waiting to be
+    written are visible to get_report() through pending().
+    """
+
+    def __init__(self, pool, batch_size=64, max_delay=0.05):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._pending = {}          # ticker -> newest row not yet committed
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        with self._lock:
+            self._pending[row[0]] = row
+        self._queue.put(row)
+
+    def pending(self, ticker):
+        with self._lock:
+            return self._pending.get(ticker)
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.max_delay))
+            except queue.Empty:
+                pass
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"❌ Error saving {len(batch)} report(s) to DB: {e}")
+            finally:
+                with self._lock:
+                    for row in batch:
+                        if self._pending.get(row[0]) is row:
+                            del self._pending[row[0]]
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        with DB_WRITE_SECONDS.time():
+            try:
+                save_reports(batch, self.pool)
+            except sqlite3.OperationalError as e:
+                # busy_timeout already waited 5s; one more try before giving up
+                print(f"⚠️ Report write retry after: {e}")
+                save_reports(batch, self.pool)
+        DB_ROWS_WRITTEN.inc(len(batch))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ReportWriter(get_pool())
+            atexit.register(_writer.flush)
+        return _writer
+
+
+# --- 5. REPORTS ACCESS ---
+def init_db(path=DB_PATH):
+    with get_pool(path).transaction(immediate=True) as conn:
+        conn.execute(CREATE_REPORTS)
+        conn.execute(CREATE_HISTORY)
+        conn.execute(CREATE_HISTORY_INDEX)
+        migrated = conn.execute(MIGRATE_HISTORY).rowcount
+    if migrated:
+        print(f"📚 Copied {migrated} existing report(s) into report_history")
+    print("✅ DB initialized successfully")
+
+def get_report(ticker):
+    """Returns (price, timestamp, data_json) for the cached report, or None."""
+    pending = get_writer().pending(ticker)
+    if pending:
+        return pending[1:]
+    with get_pool().connection() as conn:
+        return conn.execute(SELECT_REPORT, (ticker,)).fetchone()
+
+async def aget_report(ticker):
+    """get_report() for the event loop: the SQLite read runs on a db thread."""
+    pending = get_writer().pending(ticker)
+    if pending:
+        return pending[1:]
+    return await run(get_report, ticker)
+
+def save_report(ticker, price, data_dict):
+    """Queues a report for the batched writer; visible to get_report() immediately."""
+    get_writer().submit((ticker, price, datetime.now().isoformat(), json.dumps(data_dict)))
+
+def _history_row(row):
+    ticker, price, timestamp, data_json = row
+    try:
+        data = json.loads(data_json)
+    except (TypeError, ValueError):
+        data = {}
+    try:
+        sentiment = float(data.get("sentiment_score"))
+    except (TypeError, ValueError):
+        sentiment = None
+    return (ticker, timestamp, price, data.get("technical_signal"), sentiment, data_json)
+
+def save_reports(rows, pool=None):
+    """
+    Writes (ticker, price, timestamp, data_json) rows in one transaction:
+    appended to report_history, and replacing each ticker's latest report.
+    """
+    with (pool or get_pool()).transaction(immediate=True) as conn:
+        conn.executemany(UPSERT_REPORT, rows)
+        conn.executemany(INSERT_HISTORY, [_history_row(row) for row in rows])
+
+def get_history(ticker, limit=50, before=None, since=None, include_data=False):
+    """
+    Reports for a ticker, newest first, `limit` at a time. Page backwards
+    by passing the last timestamp of one page as `before` of the next.
+    """
+    with get_pool().connection() as conn:
+        rows = conn.execute(SELECT_HISTORY, (ticker, before or "9999", since or "", limit)).fetchall()
+    items = []
+    for _id, timestamp, price, signal, sentiment, data in rows:
+        item = {"timestamp": timestamp, "price": price,
+                "technical_signal": signal, "sentiment_score": sentiment}
+        if include_data:
+            item["data"] = json.loads(data)
+        items.append(item)
+    return items
@@ -0,0 +1,133 @@
+import time
+import queue
+import threading
+
+from lazy import lazy_import
+
+
+class EvalPipeline:
+    """
+    Scores finished reports off the analysis workers' critical path.
+
+    execute_analysis hands each saved report to submit() and returns;
+    eval workers pull reports off a queue in micro-batches (up to
+    `batch_size`, waiting at most `max_wait` seconds for a batch to
+    fill) and score each batch with one judge request.
+
+    on_scored(item, scores) is called per report (progress event, score
+    logging); after_batch() once per batch, e.g. to flush telemetry.
+    on_skipped(item, reason) is called for a report that won't be scored,
+    because the queue was full or its batch failed.
+    Workers start on start() or the first submit().
+    """
+
+    def __init__(self, on_scored, after_batch=None, on_skipped=None, workers=1,
+                 batch_size=4, max_wait=2.0, max_queue=500):
+        self.on_scored = on_scored
+        self.after_batch = after_batch
+        self.on_skipped = on_skipped
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "dropped": 0, "scored": 0, "batches": 0}
+        self.workers = workers
+        self._threads = []
+
+    def start(self):
+        """Starts the eval workers. Safe to call more than once."""
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"eval-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+
+    def submit(self, item):
+        """
+        Queues one report for scoring. item needs "analysis_data" and
+        "ticker"; everything else is passed through to on_scored.
+        Never blocks: if the queue is full the report goes unscored.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            print(f"⚠️ Eval queue full; skipping eval for {item['ticker']}")
+            self._count("dropped")
+            self._skip(item, "eval queue full")
+            return False
+        self._count("submitted")
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def _skip(self, item, reason):
+        if self.on_skipped is None:
+            return
+        try:
+            self.on_skipped(item, reason)
+        except Exception as e:
+            print(f"⚠️ Eval skip callback failed for {item['ticker']}: {e}")
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                # Loaded with the first batch rather than at API startup:
+                # evaluator builds an OpenAI client on import
+                run_eval_batch = lazy_import("evaluator").run_eval_batch
+                scores = run_eval_batch([(item["analysis_data"], item["ticker"]) for item in batch])
+            except Exception as e:
+                print(f"❌ Eval batch of {len(batch)} failed: {e}")
+                for item in batch:
+                    self._skip(item, f"eval failed: {e}")
+                continue
+
+            for item, item_scores in zip(batch, scores):
+                try:
+                    self.on_scored(item, item_scores)
+                except Exception as e:
+                    print(f"⚠️ Eval callback failed for {item['ticker']}: {e}")
+            self._count("scored", len(batch))
+            self._count("batches")
+            if self.after_batch:
+                # The batch is scored and reported by now; a failed flush
+                # must not turn it into skipped evals
+                try:
+                    self.after_batch()
+                except Exception as e:
+                    print(f"⚠️ Eval after-batch hook failed: {e}")
+
+    def shutdown(self, timeout=30):
+        """Scores whatever is still queued, then stops the workers."""
+        self._stopping.set()
+        for t in self._threads:
+            t.join(timeout)
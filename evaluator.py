@@ -1,10 +1,28 @@
 import os
 import json
+import httpx
+import numpy as np
 from openai import OpenAI
+from llm_cache import cached_chat_completion
+from metrics import JUDGE_SECONDS
 
-# We reuse the same OpenAI client that CrewAI uses
-# No new API keys needed
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Same API key CrewAI uses — no new keys needed.
+# One module-level client with an explicit keep-alive pool, so judge calls
+# from every worker reuse warm TLS connections instead of opening new ones.
+http_client = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=int(os.getenv("EVAL_HTTP_POOL_SIZE", "20")),
+        max_keepalive_connections=int(os.getenv("EVAL_HTTP_POOL_SIZE", "20")),
+        keepalive_expiry=float(os.getenv("EVAL_HTTP_KEEPALIVE_SECONDS", "120")),
+    ),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+)
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+
+# Bump whenever the consistency rules or the judge rubric change;
+# rescore.py keeps one set of scores per rubric version.
+RUBRIC_VERSION = "v1"
 
 
 # ─────────────────────────────────────────────
@@ -49,10 +67,43 @@ def eval_signal_consistency(analysis_data: dict) -> dict:
     }
 
 
+def eval_signal_consistency_batch(analyses: list) -> list:
+    """
+    eval_signal_consistency for many reports in one vectorized pass —
+    used when re-grading history, where there can be thousands of rows.
+    Same rules and same output as calling it once per report.
+    """
+    signals = np.array([str(a.get("technical_signal", "")).strip().title() for a in analyses], dtype=object)
+
+    def _score(a):
+        try:
+            return float(a.get("sentiment_score", 5.0))
+        except (ValueError, TypeError):
+            return 5.0
+    scores = np.array([_score(a) for a in analyses], dtype=float)
+
+    consistent = np.ones(len(analyses), dtype=bool)  # unknown signal = no penalty
+    bullish, bearish, neutral = signals == "Bullish", signals == "Bearish", signals == "Neutral"
+    consistent[bullish] = scores[bullish] > 5.5
+    consistent[bearish] = scores[bearish] < 4.5
+    consistent[neutral] = (scores[neutral] >= 3.5) & (scores[neutral] <= 6.5)
+
+    expected = {"Bullish": "score > 5.5", "Bearish": "score < 4.5"}
+    return [
+        {
+            "score": 1.0 if ok else 0.0,
+            "reason": (f"{signal} signal with score {score} — consistent." if ok else
+                       f"CONTRADICTION: {signal} signal but sentiment_score is {score}. "
+                       f"A {signal} call should have a {expected.get(signal, 'score between 3.5 and 6.5')}.")
+        }
+        for signal, score, ok in zip(signals, scores, consistent)
+    ]
+
+
 # ─────────────────────────────────────────────
 # EVALUATOR 2: LLM-as-Judge Quality Scores
 # ─────────────────────────────────────────────
-def eval_with_llm_judge(analysis_data: dict, ticker: str) -> dict:
+def eval_with_llm_judge(analysis_data: dict, ticker: str, strict: bool = False) -> dict:
     """
     Sends the analysis output to GPT-4o-mini with a rubric.
     Asks it to score 3 dimensions and return JSON.
@@ -62,6 +113,10 @@ def eval_with_llm_judge(analysis_data: dict, ticker: str) -> dict:
     - catalyst_specificity (1–5)
     - overall_quality (1–10)
     - reasoning: one sentence explaining the scores
+
+    If the judge fails, neutral placeholder scores are returned so a live
+    analysis isn't held up. strict=True raises instead, for callers that
+    store the scores as real grades.
     """
 
     # Format the analysis cleanly for the judge
@@ -109,22 +164,17 @@ Example format:
 
     try:
         print(f"🤖 Sending to LLM judge for {ticker}...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,       # deterministic scoring
-            max_tokens=200,
-        )
-        raw = response.choices[0].message.content.strip()
-
-        # Strip markdown code fences if the model adds them despite instructions
-        if raw.startswith("```"):
-            raw = raw.split("```")[1]
-            if raw.startswith("json"):
-                raw = raw[4:]
-        raw = raw.strip()
-
-        scores = json.loads(raw)
+        # Same report -> same prompt -> cached verdict, no API call
+        with JUDGE_SECONDS.time(mode="single"):
+            raw = cached_chat_completion(
+                client,
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,       # deterministic scoring
+                max_tokens=200,
+            ).strip()
+
+        scores = json.loads(_strip_fences(raw))
 
         return {
             "risk_specificity":    float(scores.get("risk_specificity", 3)),
@@ -136,6 +186,8 @@ Example format:
     except Exception as e:
         print(f"⚠️ LLM judge failed for {ticker}: {e}")
         print(f"⚠️ Full error: {type(e).__name__}: {e}")
+        if strict:
+            raise
         # Return neutral scores on failure — don't crash the analysis
         return {
             "risk_specificity":    3.0,
@@ -145,6 +197,107 @@ Example format:
         }
 
 
+# ─────────────────────────────────────────────
+# EVALUATOR 2b: Micro-Batched LLM Judge
+# ─────────────────────────────────────────────
+def _report_block(analysis_data: dict, ticker: str) -> str:
+    risk_bullets     = "\n".join(f"  - {r}" for r in analysis_data.get("risk_summary", []))
+    catalyst_bullets = "\n".join(f"  - {c}" for c in analysis_data.get("key_catalysts", []))
+    return f"""TECHNICAL SIGNAL: {analysis_data.get("technical_signal")}
+SENTIMENT SCORE: {analysis_data.get("sentiment_score")} / 10
+
+KEY CATALYSTS (should be specific to {ticker}):
+{catalyst_bullets}
+
+RISK SUMMARY (should be specific to {ticker}):
+{risk_bullets}"""
+
+
+def _strip_fences(raw: str) -> str:
+    # Strip markdown code fences if the model adds them despite instructions
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("```")[1]
+        if raw.startswith("json"):
+            raw = raw[4:]
+    return raw.strip()
+
+
+def eval_batch_with_llm_judge(items: list, strict: bool = False) -> list:
+    """
+    Scores several reports in ONE judge request instead of one each.
+    items is a list of (analysis_data, ticker) pairs; returns score dicts
+    (same shape as eval_with_llm_judge) in the same order.
+
+    If the batched answer can't be matched back to every report, each
+    report is scored on its own instead. strict is passed on to
+    eval_with_llm_judge.
+    """
+    if len(items) == 1:
+        return [eval_with_llm_judge(*items[0], strict=strict)]
+
+    reports = "\n\n".join(
+        f"=== REPORT {i} — {ticker} ===\n{_report_block(data, ticker)}"
+        for i, (data, ticker) in enumerate(items, start=1)
+    )
+
+    prompt = f"""You are a strict financial analysis quality reviewer.
+
+You are evaluating {len(items)} AI-generated stock analysis reports. Score each one independently.
+
+{reports}
+
+---
+Score EACH report on the following 3 dimensions.
+Be strict. Generic statements that could apply to ANY stock should score 1–2.
+
+DIMENSION 1 — risk_specificity (integer 1–5):
+  5 = All 3 risks are specific to the report's stock (e.g. mentions actual company events, promoter issues, sector-specific threats)
+  3 = Mix of specific and generic risks
+  1 = All 3 risks are generic boilerplate (e.g. "market volatility", "macroeconomic uncertainty")
+
+DIMENSION 2 — catalyst_specificity (integer 1–5):
+  5 = All 3 catalysts are specific and concrete (e.g. mentions actual upcoming events, earnings, product launches)
+  3 = Mix of specific and vague catalysts
+  1 = All 3 catalysts are vague or generic
+
+DIMENSION 3 — overall_quality (integer 1–10):
+  10 = Excellent, actionable, specific report
+  5  = Average, some useful content
+  1  = Useless, entirely generic
+
+Return ONLY a valid JSON object with one entry per report, keyed by its REPORT number. No markdown.
+Example format:
+{{"reports": [{{"id": 1, "risk_specificity": 4, "catalyst_specificity": 3, "overall_quality": 7, "reasoning": "One sentence here."}}]}}
+"""
+
+    try:
+        print(f"🤖 Sending {len(items)} reports to LLM judge in one batch...")
+        with JUDGE_SECONDS.time(mode="batch"):
+            raw = cached_chat_completion(
+                client,
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                max_tokens=120 * len(items) + 50,
+            )
+        by_id = {int(s["id"]): s for s in json.loads(_strip_fences(raw))["reports"]}
+
+        return [
+            {
+                "risk_specificity":    float(by_id[i].get("risk_specificity", 3)),
+                "catalyst_specificity": float(by_id[i].get("catalyst_specificity", 3)),
+                "overall_quality":     float(by_id[i].get("overall_quality", 5)),
+                "reasoning":           str(by_id[i].get("reasoning", ""))
+            }
+            for i in range(1, len(items) + 1)
+        ]
+
+    except Exception as e:
+        print(f"⚠️ Batched LLM judge failed for {len(items)} reports ({type(e).__name__}: {e}); scoring one by one")
+        return [eval_with_llm_judge(data, ticker, strict=strict) for data, ticker in items]
+
+
 # ─────────────────────────────────────────────
 # MAIN ENTRY POINT — called from app.py
 # ─────────────────────────────────────────────
@@ -158,14 +311,34 @@ def run_eval(analysis_data: dict, ticker: str) -> dict:
     consistency   = eval_signal_consistency(analysis_data)
     llm_scores    = eval_with_llm_judge(analysis_data, ticker)
 
-    results = {
+    results = _combine(consistency, llm_scores)
+
+    print(f"✅ Eval complete for {ticker}: overall_quality={results['overall_quality']}/10")
+    return results
+
+
+def run_eval_batch(items: list) -> list:
+    """
+    run_eval for several (analysis_data, ticker) pairs at once: the rule
+    checks run per report, the LLM judge scores them all in one request.
+    """
+    print(f"🔍 Running eval for {len(items)} reports: {', '.join(t for _, t in items)}")
+
+    consistency = [eval_signal_consistency(data) for data, _ in items]
+    llm_scores  = eval_batch_with_llm_judge(items)
+
+    results = [_combine(c, s) for c, s in zip(consistency, llm_scores)]
+    for (_, ticker), r in zip(items, results):
+        print(f"✅ Eval complete for {ticker}: overall_quality={r['overall_quality']}/10")
+    return results
+
+
+def _combine(consistency: dict, llm_scores: dict) -> dict:
+    return {
         "signal_consistency":    consistency["score"],
         "consistency_reason":    consistency["reason"],
         "risk_specificity":      llm_scores["risk_specificity"],
         "catalyst_specificity":  llm_scores["catalyst_specificity"],
         "overall_quality":       llm_scores["overall_quality"],
         "reasoning":             llm_scores["reasoning"],
-    }
-
-    print(f"✅ Eval complete for {ticker}: overall_quality={results['overall_quality']}/10")
-    return results
\ No newline at end of file
+    }
\ No newline at end of file
@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+import numpy as np
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+
+import ohlcv_store
+from indicators import atr, normalize_symbol
+
+FRESH, STALE, NEEDS_PRICE = "fresh", "stale", "needs_price"
+
+
+# --- 1. MARKET CALENDAR ---
+class MarketCalendar:
+    """
+    NSE cash session: 09:15–15:30 IST, Monday to Friday, minus holidays
+    (NSE_HOLIDAYS=2026-01-26,2026-03-03,...). Report age is measured in
+    trading time, so nothing goes stale while the market is shut.
+    """
+
+    def __init__(self, tz="Asia/Kolkata", open_at=dtime(9, 15), close_at=dtime(15, 30), holidays=()):
+        self.tz = ZoneInfo(tz)
+        self.open_at = open_at
+        self.close_at = close_at
+        self.holidays = {datetime.strptime(d.strip(), "%Y-%m-%d").date() for d in holidays if d.strip()}
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def is_open(self, moment):
+        local = moment.astimezone(self.tz)
+        return self.is_trading_day(local.date()) and self.open_at <= local.time() < self.close_at
+
+    def trading_seconds(self, start, end, max_days=30):
+        """Seconds of open market between two aware datetimes (inf past max_days)."""
+        start, end = start.astimezone(self.tz), end.astimezone(self.tz)
+        if end <= start:
+            return 0.0
+        if (end - start).days > max_days:
+            return float("inf")
+
+        total = 0.0
+        day = start.date()
+        while day <= end.date():
+            if self.is_trading_day(day):
+                session_open = datetime.combine(day, self.open_at, self.tz)
+                session_close = datetime.combine(day, self.close_at, self.tz)
+                overlap = (min(end, session_close) - max(start, session_open)).total_seconds()
+                total += max(overlap, 0.0)
+            day += timedelta(days=1)
+        return total
+
+
+class WallClock:
+    """Every second counts: the original "less than 1 hour old" rule."""
+
+    def trading_seconds(self, start, end, max_days=None):
+        return max((end - start).total_seconds(), 0.0)
+
+
+# --- 2. POLICIES ---
+class FreshnessPolicy:
+    """
+    Decides whether a cached report (price, timestamp, data) can be served.
+
+    check() never touches the network. It returns FRESH or STALE when
+    it can decide from the report's age and an in-memory quote, and
+    NEEDS_PRICE when the caller must fetch a live price and call again
+    with it. Subclasses pick how far the price may move (max_move).
+    """
+
+    def __init__(self, max_age=3600, calendar=None, quotes=None, quote_max_age=60):
+        self.max_age = max_age
+        self.calendar = calendar or WallClock()
+        self.quotes = quotes
+        self.quote_max_age = quote_max_age
+
+    def max_move(self, ticker):
+        raise NotImplementedError
+
+    def check(self, ticker, row, current_price=None, now=None):
+        old_price, old_time, _ = row
+        # Reports store naive local timestamps; astimezone() reads them as such
+        last_run = datetime.fromisoformat(old_time).astimezone()
+        now = now or datetime.now().astimezone()
+
+        age = self.calendar.trading_seconds(last_run, now)
+        if age >= self.max_age:
+            return STALE
+        if age == 0:
+            return FRESH   # market hasn't traded since the report was made
+
+        if current_price is None and self.quotes is not None:
+            quote = self.quotes.peek(ticker, max_age=self.quote_max_age)
+            current_price = quote["price"] if quote else None
+        if current_price is None:
+            return NEEDS_PRICE
+
+        # No usable price on either side: judge by age alone
+        if not (old_price and old_price > 0 and current_price > 0):
+            return FRESH
+        move = abs(current_price - old_price) / old_price
+        return FRESH if move < self.max_move(ticker) else STALE
+
+
+class FixedThresholdPolicy(FreshnessPolicy):
+    """Same tolerance for every ticker (0.5% by default)."""
+
+    def __init__(self, threshold=0.005, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def max_move(self, ticker):
+        return self.threshold
+
+
+class VolatilityPolicy(FreshnessPolicy):
+    """
+    Tolerance scaled to how much the ticker normally moves: a fraction of
+    its ATR(14) as a percentage of price, clamped to [floor, cap]. A 0.5%
+    move is noise for a small-cap but news for a large-cap index heavyweight.
+
+    ATR comes from the local OHLCV store (no network) and is recomputed
+    at most once per `refresh_seconds` per ticker. Tickers with no stored
+    bars fall back to `default`.
+    """
+
+    def __init__(self, atr_fraction=0.25, floor=0.0025, cap=0.03, default=0.005,
+                 refresh_seconds=3600, **kwargs):
+        super().__init__(**kwargs)
+        self.atr_fraction = atr_fraction
+        self.floor = floor
+        self.cap = cap
+        self.default = default
+        self.refresh_seconds = refresh_seconds
+        self._thresholds = {}   # symbol -> (threshold, computed_at)
+        self._lock = threading.Lock()
+
+    def _atr_pct(self, symbol):
+        hist = ohlcv_store.read_history(symbol, period="3mo")
+        if len(hist) < 15:
+            return None
+        high, low, close = (hist[f].to_numpy(dtype=float)[:, None] for f in ("High", "Low", "Close"))
+        value = atr(high, low, close)[-1, 0] / close[-1, 0]
+        return None if np.isnan(value) else float(value)
+
+    def max_move(self, ticker):
+        symbol = normalize_symbol(ticker)
+        with self._lock:
+            cached = self._thresholds.get(symbol)
+        if cached and time.time() - cached[1] < self.refresh_seconds:
+            return cached[0]
+
+        try:
+            atr_pct = self._atr_pct(symbol)
+        except Exception as e:
+            print(f"⚠️ ATR lookup failed for {symbol}: {e}")
+            atr_pct = None
+        threshold = self.default if atr_pct is None else min(max(atr_pct * self.atr_fraction, self.floor), self.cap)
+
+        with self._lock:
+            self._thresholds[symbol] = (threshold, time.time())
+        return threshold
+
+
+def create_policy(name="volatility", quotes=None):
+    """
+    "volatility": ATR-scaled tolerance, age counted in NSE trading time.
+    "fixed":      the original rule — 0.5% move, 1 hour of wall-clock time.
+    """
+    max_age = int(os.getenv("CACHE_MAX_AGE_SECONDS", "3600"))
+    if name == "fixed":
+        return FixedThresholdPolicy(max_age=max_age, quotes=quotes)
+    if name == "volatility":
+        calendar = MarketCalendar(holidays=os.getenv("NSE_HOLIDAYS", "").split(","))
+        return VolatilityPolicy(
+            atr_fraction=float(os.getenv("CACHE_ATR_FRACTION", "0.25")),
+            max_age=max_age,
+            calendar=calendar,
+            quotes=quotes
+        )
+    raise ValueError(f"Unknown freshness policy: {name}")
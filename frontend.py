@@ -1,9 +1,9 @@
+import os
+import json
 import streamlit as st
 import requests
 import time
-from datetime import datetime
-from bs4 import BeautifulSoup
-import yfinance as yf
+import ohlcv_store
 import plotly.graph_objects as go
 
 # --- 1. PAGE CONFIGURATION ---
@@ -41,68 +41,26 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# --- 3. THE SMART PRICE ENGINE (Groww + Google + Auto-Router) ---
-def get_current_price(ticker):
-    ticker_upper = ticker.upper().strip()
-    
-    clean_ticker = ticker_upper
-    for suffix in ['.NSE', '.NS', '.BSE', '.BO']:
-        if clean_ticker.endswith(suffix):
-            clean_ticker = clean_ticker[:-len(suffix)]
-            break
-            
-    if clean_ticker.isdigit() or ticker_upper.endswith(('.BO', '.BSE')):
-        groww_exchange = "BSE"
-        google_exchange = "BOM"
-    else:
-        groww_exchange = "NSE"
-        google_exchange = "NSE"
-        
-    headers = {'User-Agent': 'Mozilla/5.0', 'Accept': 'application/json'}
+BACKEND_URL = os.getenv("BACKEND_URL", "https://agentic-finance-explorer.onrender.com")
 
+# --- 3. LIVE PRICES (shared quote service on the backend) ---
+def get_current_price(ticker):
+    # The backend walks Groww -> Google -> yfinance and caches each quote for a
+    # few seconds, so every open dashboard shares one upstream fetch per ticker
     try:
-        url = f"https://groww.in/v1/api/stocks_data/v1/tr_live_prices/exchange/{groww_exchange}/segment/CASH/{clean_ticker}/latest"
-        res = requests.get(url, headers=headers, timeout=5)
-        if res.status_code == 200:
-            data = res.json()
-            price = float(data.get('ltp', 0.0))
-            prev_close = float(data.get('close', 0.0))
-            if price > 0:
-                return price, "₹", (price - prev_close), datetime.now().weekday() >= 5
-    except Exception:
-        pass
-
-    try:
-        url = f"https://www.google.com/finance/quote/{clean_ticker}:{google_exchange}"
-        res = requests.get(url, headers=headers, timeout=5)
-        soup = BeautifulSoup(res.text, 'html.parser')
-        price_div = soup.find('div', {'data-last-price': True})
-        if price_div:
-            price = float(price_div['data-last-price'])
-            prev_close_div = soup.find('div', {'data-previous-close': True})
-            change = price - float(prev_close_div['data-previous-close']) if prev_close_div else 0.0
-            return price, "₹", change, datetime.now().weekday() >= 5
-    except Exception:
-        pass
-        
-    try:
-        yf_ticker = f"{clean_ticker}.BO" if groww_exchange == "BSE" else f"{clean_ticker}.NS"
-        stock = yf.Ticker(yf_ticker)
-        hist = stock.history(period="5d")
-        if not hist.empty:
-            price = float(hist['Close'].iloc[-1])
-            prev_close = float(hist['Close'].iloc[-2]) if len(hist) >= 2 else price
-            return price, "₹", (price - prev_close), datetime.now().weekday() >= 5
-    except Exception:
-        pass
+        response = requests.get(f"{BACKEND_URL}/quote/{ticker}", timeout=10)
+        if response.status_code == 200:
+            quote = response.json()
+            return quote["price"], quote["currency"], quote["change"], quote["is_weekend"]
+    except Exception as e:
+        print(f"Quote fetch error: {e}")
 
     return None, None, None, False
 
 @st.cache_data(ttl=1800)
 def get_fundamentals(ticker):
     try:
-        backend_url = "https://agentic-finance-explorer.onrender.com"
-        response = requests.get(f"{backend_url}/fundamentals/{ticker}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/fundamentals/{ticker}", timeout=10)
         if response.status_code == 200:
             return response.json()
     except Exception as e:
@@ -187,13 +145,9 @@ def render_interactive_chart(ticker):
         else:
             yf_ticker = f"{clean_ticker}.NS"
             
-        hist = yf.Ticker(yf_ticker).history(period=period, interval=interval)
-        
-        if hist.empty and period == "1d":
-            hist = yf.Ticker(yf_ticker).history(period="5d", interval=interval)
-            if not hist.empty:
-                last_day = hist.index[-1].date()
-                hist = hist[hist.index.date == last_day]
+        # Served from the local bar store; switching timeframes doesn't re-download
+        # Intraday "1d" is the latest session in the store, even before today's open
+        hist = ohlcv_store.get_history(yf_ticker, period=period, interval=interval)
         
         if not hist.empty:
             fig = go.Figure()
@@ -224,7 +178,55 @@ def render_interactive_chart(ticker):
     except Exception as e:
         st.error(f"Could not load chart: {e}")
 
-# --- 5. SESSION STATE & TRIGGERS ---
+# --- 5. JOB TRACKING ---
+STAGE_LABELS = {
+    "running":  "🕵️ Agents are compiling reports...",
+    "quant":    "📊 Quant Analyst finished the technicals...",
+    "news":     "📰 News Correspondent finished the news scan...",
+    "risk":     "🛡️ Risk Officer finished the audit...",
+}
+
+def stream_job(job_id, status_box):
+    """
+    Follows the backend's /stream/{job_id} server-sent events and returns the
+    final job payload the moment it is pushed. Returns None if the stream
+    can't be used, so the caller can fall back to polling.
+    """
+    try:
+        with requests.get(f"{BACKEND_URL}/stream/{job_id}", stream=True, timeout=(5, 60)) as res:
+            if res.status_code != 200:
+                return None
+            event = None
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    payload = json.loads(line[len("data:"):])
+                    if event == "queue":
+                        status_box.update(label=f"⏳ Queued — position {payload['queue_position']} of {payload['queue_depth']}", state="running")
+                    elif event == "progress" and payload.get("stage") in STAGE_LABELS:
+                        status_box.update(label=STAGE_LABELS[payload["stage"]], state="running")
+                    elif event in ("result", "failed"):
+                        return payload
+    except Exception as e:
+        print(f"Stream error for job {job_id}: {e}")
+    return None
+
+def poll_job(job_id, status_box):
+    max_attempts, attempts = 25, 0
+    while attempts < max_attempts:
+        poll_res = requests.get(f"{BACKEND_URL}/status/{job_id}")
+        if poll_res.status_code != 200: break
+        poll_data = poll_res.json()
+        if poll_data.get("status") in ("completed", "failed"):
+            return poll_data
+
+        status_box.update(label=f"🕵️ Agents are compiling reports...", state="running")
+        time.sleep(5)
+        attempts += 1
+    return None
+
+# --- 6. SESSION STATE & TRIGGERS ---
 if "is_analyzing" not in st.session_state: st.session_state.is_analyzing = False
 if "analysis_results" not in st.session_state: st.session_state.analysis_results = None
 if "analysis_source" not in st.session_state: st.session_state.analysis_source = None
@@ -239,7 +241,7 @@ def trigger_analysis():
     else:
         st.session_state.is_analyzing = False
 
-# --- 6. MAIN UI LOGIC ---
+# --- 7. MAIN UI LOGIC ---
 def main():
     st.title("🔬 AI Investment Research Assistant")
     st.subheader("Autonomous Information Synthesis & Risk Highlighting")
@@ -263,10 +265,12 @@ def main():
         if st.session_state.analysis_results is None:
             with st.status(f"Agents synthesizing data for {st.session_state.current_ticker}...", expanded=True) as status_box:
                 try:                    
-                    backend_url = "https://agentic-finance-explorer.onrender.com" 
-                    response = requests.post(f"{backend_url}/analyze", json={"ticker": st.session_state.current_ticker})
+                    response = requests.post(f"{BACKEND_URL}/analyze", json={"ticker": st.session_state.current_ticker})
                     
-                    if response.status_code == 200:
+                    if response.status_code == 429:
+                        status_box.update(label="Analysis queue is busy. Please try again in a minute.", state="error")
+                        st.session_state.is_analyzing = False
+                    elif response.status_code == 200:
                         data = response.json()
                         if data.get("status") == "completed":
                             st.session_state.analysis_results, st.session_state.analysis_source = data.get("result"), data.get("source")
@@ -275,26 +279,16 @@ def main():
                             st.rerun() 
                         else:
                             job_id = data.get("job_id")
-                            max_attempts, attempts = 25, 0
-                            while attempts < max_attempts:
-                                poll_res = requests.get(f"{backend_url}/status/{job_id}")
-                                if poll_res.status_code != 200: break
-                                poll_data = poll_res.json()
-                                current_status = poll_data.get("status")
-        
-                                if current_status == "completed":
-                                    st.session_state.analysis_results, st.session_state.analysis_source = poll_data.get("result"), "Live Agent Analysis"
-                                    status_box.update(label="Analysis Complete!", state="complete", expanded=False)
-                                    #time.sleep(1)
-                                    st.rerun() 
-                                    break 
-                                elif current_status == "failed":
-                                    status_box.update(label=f"Analysis failed.", state="error")
-                                    break
-                                
-                                status_box.update(label=f"🕵️ Agents are compiling reports...", state="running")
-                                time.sleep(5)
-                                attempts += 1
+                            status_box.update(label=f"🕵️ Agents are compiling reports...", state="running")
+                            # Push updates first; plain polling if the stream is unavailable
+                            final = stream_job(job_id, status_box) or poll_job(job_id, status_box)
+
+                            if final and final.get("status") == "completed":
+                                st.session_state.analysis_results, st.session_state.analysis_source = final.get("result"), "Live Agent Analysis"
+                                status_box.update(label="Analysis Complete!", state="complete", expanded=False)
+                                st.rerun()
+                            elif final and final.get("status") == "failed":
+                                status_box.update(label=f"Analysis failed.", state="error")
                 except Exception as e:
                     status_box.update(label=f"System Error: {str(e)}", state="error")
                     st.session_state.is_analyzing = False
@@ -0,0 +1,235 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from cache import TieredCache
+from lazy import lazy_import
+
+# --- 1. SOURCE CACHE ---
+# Each upstream source is cached on its own clock: quotes move every few
+# seconds, annual statements a few times a year.
+SOURCE_TTLS = {
+    "fast_info":     int(os.getenv("FUNDAMENTALS_FAST_INFO_TTL", "60")),
+    "info":          int(os.getenv("FUNDAMENTALS_INFO_TTL", str(6 * 3600))),
+    "income_stmt":   int(os.getenv("FUNDAMENTALS_STATEMENT_TTL", str(24 * 3600))),
+    "balance_sheet": int(os.getenv("FUNDAMENTALS_STATEMENT_TTL", str(24 * 3600))),
+    "cashflow":      int(os.getenv("FUNDAMENTALS_STATEMENT_TTL", str(24 * 3600))),
+}
+
+# yfinance answers a rate-limited request (or an unknown symbol) with an
+# empty frame, {} or all-None fields rather than an error. Those are kept
+# briefly, so a throttled source isn't hit again on every request, but not
+# for the source's full TTL.
+EMPTY_RESULT_TTL = int(os.getenv("FUNDAMENTALS_EMPTY_TTL", "60"))
+
+source_cache = TieredCache(
+    SOURCE_TTLS,
+    memory_size=int(os.getenv("FUNDAMENTALS_CACHE_SIZE", "512"))
+)
+
+FAST_INFO_FIELDS = ("shares", "last_price", "market_cap", "year_high", "year_low")
+
+def _ticker(symbol):
+    # yfinance takes ~0.7s to import; only paid once a fetch misses the cache
+    return lazy_import("yfinance").Ticker(symbol)
+
+def _load_fast_info(symbol):
+    fast = _ticker(symbol).fast_info
+    values = {}
+    for field in FAST_INFO_FIELDS:
+        try:
+            values[field] = getattr(fast, field, None)
+        except Exception:
+            # fast_info computes lazily and raises for unknown symbols
+            values[field] = None
+    return values
+
+_LOADERS = {
+    "fast_info":     _load_fast_info,
+    "info":          lambda symbol: _ticker(symbol).get_info() or {},
+    "income_stmt":   lambda symbol: _ticker(symbol).get_income_stmt(),
+    "balance_sheet": lambda symbol: _ticker(symbol).balance_sheet,
+    "cashflow":      lambda symbol: _ticker(symbol).cashflow,
+}
+
+def _is_empty(value):
+    if value is None or getattr(value, "empty", False):
+        return True
+    if isinstance(value, dict):
+        return all(v is None for v in value.values())
+    return False
+
+def _ttl_for(value):
+    return EMPTY_RESULT_TTL if _is_empty(value) else None
+
+def fetch_source(source, symbol):
+    """One fundamentals source for an exchange symbol (e.g. RELIANCE.NS), through the cache."""
+    return source_cache.get_or_load(source, symbol, lambda: _LOADERS[source](symbol), ttl_for=_ttl_for)
+
+
+# --- 2. PARALLEL FAN-OUT ---
+# The sources don't depend on each other, so they are fetched side by
+# side; the endpoint costs the slowest source instead of their sum.
+# Each source has a deadline counted from the start of the request. A
+# source that misses it is left out of this response, but keeps running
+# in the background and lands in the cache for the next one.
+SOURCE_TIMEOUTS = {
+    "fast_info":     float(os.getenv("FUNDAMENTALS_FAST_INFO_TIMEOUT", "4")),
+    "info":          float(os.getenv("FUNDAMENTALS_SOURCE_TIMEOUT", "6")),
+    "income_stmt":   float(os.getenv("FUNDAMENTALS_SOURCE_TIMEOUT", "6")),
+    "balance_sheet": float(os.getenv("FUNDAMENTALS_SOURCE_TIMEOUT", "6")),
+    "cashflow":      float(os.getenv("FUNDAMENTALS_SOURCE_TIMEOUT", "6")),
+}
+DETAIL_SOURCES = ("info", "income_stmt", "balance_sheet", "cashflow")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FUNDAMENTALS_WORKERS", "16")),
+    thread_name_prefix="fundamentals"
+)
+
+def submit_sources(symbol, sources):
+    return {source: _executor.submit(fetch_source, source, symbol) for source in sources}
+
+def collect(futures, source, started):
+    """Result of one source, or None if it failed or missed its deadline."""
+    remaining = started + SOURCE_TIMEOUTS[source] - time.monotonic()
+    try:
+        return futures[source].result(timeout=max(remaining, 0))
+    except TimeoutError:
+        print(f"⏱️ Fundamentals source {source} timed out; returning partial result")
+    except Exception as e:
+        print(f"{source} failed: {e}")
+    return None
+
+
+# --- 3. HELPERS ---
+def sf(val):
+    try:
+        return float(str(val).replace(',', '').strip())
+    except:
+        return None
+
+def fmt(val, prefix='', suffix='', decimals=2):
+    f = sf(val)
+    return f"{prefix}{f:.{decimals}f}{suffix}" if f is not None else "N/A"
+
+def get_row(df, *keys):
+    if df is None:
+        return None
+    for k in keys:
+        if k in df.index:
+            val = sf(df.loc[k].iloc[0])
+            if val is not None:
+                return val
+    return None
+
+
+# --- 4. SNAPSHOT ---
+def build_fundamentals(ticker: str):
+    clean = ticker.upper().strip()
+    for suffix in ['.NSE', '.NS', '.BSE', '.BO']:
+        if clean.endswith(suffix):
+            clean = clean[:-len(suffix)]
+            break
+
+    result = {
+        "mcap": "N/A", "pe": "N/A", "high52": "N/A", "low52": "N/A",
+        "book_value": "N/A", "div_yield": "N/A", "roce": "N/A",
+        "roe": "N/A", "eps": "N/A", "debt_eq": "N/A"
+    }
+
+    try:
+        started = time.monotonic()
+
+        # Try NSE first, fall back to BSE. Both probes go out together, and
+        # the NSE details are requested up front on the bet that NSE wins.
+        nse = submit_sources(f"{clean}.NS", ("fast_info",) + DETAIL_SOURCES)
+        bse = submit_sources(f"{clean}.BO", ("fast_info",))
+
+        symbol, futures = f"{clean}.NS", nse
+        fast = collect(nse, "fast_info", started) or {}
+
+        # Test if this ticker is valid — fast_info.last_price is None for invalid tickers
+        if not fast.get('last_price'):
+            fast = collect(bse, "fast_info", started) or {}
+            symbol = f"{clean}.BO"
+            futures = submit_sources(symbol, DETAIL_SOURCES)
+
+        # --- LAYER 1: fast_info — always reliable ---
+        shares  = sf(fast.get('shares'))
+        price   = sf(fast.get('last_price'))
+        mcap    = sf(fast.get('market_cap'))
+        yr_high = sf(fast.get('year_high'))
+        yr_low  = sf(fast.get('year_low'))
+
+        if mcap:    result['mcap']   = f"₹{mcap/1e7:,.0f} Cr"
+        if yr_high: result['high52'] = f"₹{yr_high:.2f}"
+        if yr_low:  result['low52']  = f"₹{yr_low:.2f}"
+
+        # --- LAYER 2: get_info() — try first for derived metrics ---
+        info = collect(futures, "info", started) or {}
+
+        if info.get('trailingEps'):   result['eps']        = fmt(info['trailingEps'], prefix='₹')
+        if info.get('bookValue'):     result['book_value'] = fmt(info['bookValue'], prefix='₹')
+        if info.get('returnOnEquity'):result['roe']        = fmt(info['returnOnEquity'] * 100, suffix='%')
+        if info.get('debtToEquity'):  result['debt_eq']    = fmt(info['debtToEquity'])
+
+        # --- LAYER 3: Financial statements — fallback + ROCE ---
+        try:
+            income_stmt   = collect(futures, "income_stmt", started)
+            balance_sheet = collect(futures, "balance_sheet", started)
+
+            net_income     = get_row(income_stmt,   'Net Income', 'NetIncome')
+            ebitda         = get_row(income_stmt,   'Normalized EBITDA', 'EBITDA')
+            common_equity  = get_row(balance_sheet, 'Common Stock Equity', 'StockholdersEquity')
+            total_debt     = get_row(balance_sheet, 'Total Debt', 'LongTermDebt')
+            invested_cap   = get_row(balance_sheet, 'Invested Capital')
+            total_assets   = get_row(balance_sheet, 'Total Assets')
+            current_liab   = get_row(balance_sheet, 'Current Liabilities')
+
+            # P/E: Price / EPS — calculate directly, don't rely on result['eps'] string
+            if result['pe'] == 'N/A' and price and net_income and shares and shares > 0:
+                eps_val = net_income / shares
+                if eps_val > 0:
+                    result['pe'] = f"{price / eps_val:.2f}"
+
+            # Dividend Yield: Annual Dividends Paid / Market Cap * 100
+            try:
+                cashflow = collect(futures, "cashflow", started)
+                dividends_paid = get_row(cashflow, 'Cash Dividends Paid', 'Common Stock Dividend Paid')
+                if dividends_paid and mcap and mcap > 0:
+                    # dividends_paid is negative in cashflow statement, so abs()
+                    result['div_yield'] = f"{(abs(dividends_paid) / mcap) * 100:.2f}%"
+            except Exception as e:
+                print(f"Dividend yield calc error: {e}")
+
+            # Fallback EPS: Net Income / shares
+            if result['eps'] == 'N/A' and net_income and shares and shares > 0:
+                result['eps'] = f"₹{net_income / shares:.2f}"
+
+            # Fallback Book Value: Common Equity / shares
+            if result['book_value'] == 'N/A' and common_equity and shares and shares > 0:
+                result['book_value'] = f"₹{common_equity / shares:.2f}"
+
+            # Fallback ROE: Net Income / Common Equity
+            if result['roe'] == 'N/A' and net_income and common_equity and common_equity > 0:
+                result['roe'] = f"{(net_income / common_equity) * 100:.2f}%"
+
+            # Fallback D/E: Total Debt / Common Equity (as percentage, matching yfinance format)
+            if result['debt_eq'] == 'N/A' and total_debt and common_equity and common_equity > 0:
+                result['debt_eq'] = fmt((total_debt / common_equity) * 100)
+
+            # ROCE: Net Income / Invested Capital (best approximation from available data)
+            # Fall back to Total Assets - Current Liabilities if Invested Capital missing
+            capital_employed = invested_cap or (
+                (total_assets - current_liab) if total_assets and current_liab else None
+            )
+            if net_income and capital_employed and capital_employed > 0:
+                result['roce'] = f"{(net_income / capital_employed) * 100:.2f}%"
+
+        except Exception as e:
+            print(f"Statements fallback error for {clean}: {e}")
+
+    except Exception as e:
+        print(f"❌ Fundamentals Error for {ticker}: {e}")
+
+    return result
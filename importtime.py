@@ -0,0 +1,89 @@
+"""
+Per-module import cost of the API process, to catch cold-start regressions.
+
+    python importtime.py                    # report for `import app`
+    python importtime.py --top 25
+    python importtime.py --budget-ms 1500   # exit 1 if `import app` takes longer
+    python importtime.py --forbid crewai,yfinance,langfuse,openai,bs4
+
+The import runs in a fresh interpreter under `python -X importtime`.
+Cumulative time is reported for every first-party module and for each
+third-party package's first import. --forbid fails the run if `import app`
+pulls in any of the named packages. Those are loaded lazily on purpose;
+an eager import anywhere on the startup path would undo that.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FORBIDDEN = "crewai,crewai_tools,yfinance,langfuse,openai,bs4,pandas_ta"
+
+
+def first_party_modules():
+    return {name[:-3] for name in os.listdir(BASE_DIR) if name.endswith(".py")}
+
+
+def measure(module):
+    """[(name, self_us, cumulative_us, depth), ...] in the order -X importtime reports them."""
+    env = {**os.environ, "PYTHONPATH": BASE_DIR}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"❌ import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report (and gate) per-module import time.")
+    parser.add_argument("module", nargs="?", default="app", help="Module to import (default: app)")
+    parser.add_argument("--top", type=int, default=15, help="Third-party packages to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the whole import takes longer")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="Comma-separated packages that must not load at import ('' to allow all)")
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    ours = first_party_modules()
+    total_ms = next(cum for name, _, cum, _ in rows if name == args.module) / 1000
+
+    print(f"⏱️ import {args.module}: {total_ms:.0f} ms\n")
+    print("First-party modules (cumulative):")
+    for name, _, cum, _ in sorted((r for r in rows if r[0] in ours), key=lambda r: -r[2]):
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    # A package's first import is the row for its top-level name
+    packages = {}
+    for name, _, cum, _ in rows:
+        if "." not in name and name not in ours and not name.startswith("_"):
+            packages.setdefault(name, cum)
+    print(f"\nThird-party packages (top {args.top}, cumulative):")
+    for name, cum in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cum / 1000:8.1f} ms  {name}")
+
+    failures = []
+    forbidden = [p.strip() for p in args.forbid.split(",") if p.strip()]
+    loaded = [p for p in forbidden if p in packages]
+    if loaded:
+        failures.append(f"eagerly imported: {', '.join(loaded)}")
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if failures:
+        print(f"\n❌ {'; '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ Within budget")
+
+
+if __name__ == "__main__":
+    main()
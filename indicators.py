@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+import ohlcv_store
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Six months of daily bars lets RSI(14), MA50, MACD(12/26/9) and ATR(14)
+# settle; one month left MA20 as "Calculating..." on most days.
+DEFAULT_PERIOD = "6mo"
+
+OHLCV_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def normalize_symbol(ticker: str) -> str:
+    """Bare NSE symbols get the .NS suffix yfinance needs."""
+    ticker = ticker.upper().strip()
+    if not ticker.endswith((".NS", ".BO")):
+        ticker = f"{ticker}.NS"
+    return ticker
+
+
+# --- 1. DATA ---
+def load_ohlcv(tickers, period=DEFAULT_PERIOD, interval="1d"):
+    """
+    Bars for every ticker from the local OHLCV store, which tops itself up
+    from Yahoo with one call for the whole group.
+    Returns {field: DataFrame(index=dates, columns=tickers)}, or {} if there's no data.
+    """
+    histories = ohlcv_store.get_history_bulk(list(tickers), period=period, interval=interval)
+    histories = {t: h for t, h in histories.items() if not h.empty}
+    if not histories:
+        return {}
+
+    ohlcv = {}
+    for field in OHLCV_FIELDS:
+        frame = pd.DataFrame({t: h[field] for t, h in histories.items()})
+        ohlcv[field] = frame.reindex(columns=list(tickers)).astype(float)
+    return ohlcv
+
+
+# --- 2. VECTORIZED PRIMITIVES ---
+# Every function takes a 2-D float array shaped (dates, tickers) and
+# returns the same shape, NaN where the window isn't full yet.
+
+def sma(values, length):
+    out = np.full(values.shape, np.nan)
+    if len(values) >= length:
+        out[length - 1:] = sliding_window_view(values, length, axis=0).mean(axis=-1)
+    return out
+
+
+def rolling_std(values, length):
+    out = np.full(values.shape, np.nan)
+    if len(values) >= length:
+        out[length - 1:] = sliding_window_view(values, length, axis=0).std(axis=-1)
+    return out
+
+
+def ema(values, length, alpha=None):
+    """
+    Exponential average seeded with the SMA of the first full window.
+    Recursion runs down the time axis; each step updates all tickers at once.
+    alpha defaults to 2/(length+1); pass 1/length for Wilder's smoothing.
+    """
+    alpha = alpha if alpha is not None else 2.0 / (length + 1)
+    seed = sma(values, length)
+    out = np.full(values.shape, np.nan)
+    prev = np.full(values.shape[1], np.nan)
+
+    for t in range(len(values)):
+        started = ~np.isnan(prev)
+        x = values[t]
+        step = np.where(started, alpha * x + (1 - alpha) * prev, seed[t])
+        # Gaps (missing bar for one ticker) carry the last value forward
+        prev = np.where(started & np.isnan(x), prev, step)
+        out[t] = prev
+    return out
+
+
+def rma(values, length):
+    """Wilder's moving average, used by RSI and ATR."""
+    return ema(values, length, alpha=1.0 / length)
+
+
+def rsi(close, length=14):
+    delta = np.diff(close, axis=0, prepend=np.nan)
+    gains = np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None))
+    losses = np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None))
+
+    # The first row has no delta; start averaging from row 1
+    avg_gain = np.full(close.shape, np.nan)
+    avg_loss = np.full(close.shape, np.nan)
+    avg_gain[1:] = rma(gains[1:], length)
+    avg_loss[1:] = rma(losses[1:], length)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        out = 100 - 100 / (1 + rs)
+    return np.where((avg_loss == 0) & ~np.isnan(avg_gain), 100.0, out)
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, length=20, width=2.0):
+    mid = sma(close, length)
+    std = rolling_std(close, length)
+    return mid + width * std, mid, mid - width * std
+
+
+def atr(high, low, close, length=14):
+    prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rma(true_range, length)
+
+
+# --- 3. ENGINE ---
+class BarAligner:
+    """
+    Moves each ticker onto its own bars and back.
+
+    The frames share the union of every ticker's dates, so a ticker with a
+    missing bar has a NaN row there, and every window that spans the NaN row
+    would come out NaN. pack() right-aligns each column's bars instead: the
+    last row is every ticker's latest bar, and the rows above it go back one
+    bar at a time, padded with NaN at the top. Indicators come out exactly
+    as they would for the ticker on its own. unpack() puts them back on the
+    shared dates.
+    """
+
+    def __init__(self, close):
+        valid = ~np.isnan(close)
+        counts = valid.sum(axis=0)
+        self.shape = close.shape
+        self.depth = int(counts.max(initial=0))
+        self.rows, self.cols = np.nonzero(valid)
+        # n-th bar of a ticker (counting from 0) -> its row once right-aligned
+        nth = np.cumsum(valid, axis=0)[self.rows, self.cols] - 1
+        self.packed_rows = self.depth - counts[self.cols] + nth
+
+    def pack(self, values):
+        out = np.full((self.depth, self.shape[1]), np.nan)
+        out[self.packed_rows, self.cols] = values[self.rows, self.cols]
+        return out
+
+    def unpack(self, values):
+        out = np.full(self.shape, np.nan)
+        out[self.rows, self.cols] = values[self.packed_rows, self.cols]
+        return out
+
+
+def compute_indicators(ohlcv):
+    """
+    All indicators for all tickers in one pass, each ticker computed over its
+    own bars (see BarAligner), so a gap in one doesn't affect the others.
+    Returns {name: DataFrame(index=dates, columns=tickers)}, NaN on dates a
+    ticker has no bar.
+    """
+    close_df = ohlcv["Close"]
+    aligner = BarAligner(close_df.to_numpy(dtype=float))
+    close = aligner.pack(close_df.to_numpy(dtype=float))
+    high = aligner.pack(ohlcv["High"].to_numpy(dtype=float))
+    low = aligner.pack(ohlcv["Low"].to_numpy(dtype=float))
+
+    macd_line, macd_signal, macd_hist = macd(close)
+    bb_upper, bb_mid, bb_lower = bollinger(close)
+    atr14 = atr(high, low, close)
+
+    arrays = {
+        "close": close,
+        "rsi14": rsi(close, 14),
+        "sma20": sma(close, 20),
+        "sma50": sma(close, 50),
+        "ema20": ema(close, 20),
+        "macd": macd_line,
+        "macd_signal": macd_signal,
+        "macd_hist": macd_hist,
+        "bb_upper": bb_upper,
+        "bb_mid": bb_mid,
+        "bb_lower": bb_lower,
+        "atr14": atr14,
+        "atr_pct": atr14 / close * 100,
+    }
+    return {name: pd.DataFrame(aligner.unpack(arr), index=close_df.index, columns=close_df.columns)
+            for name, arr in arrays.items()}
+
+
+def latest_snapshot(indicators):
+    """
+    One row per ticker with every indicator as of that ticker's latest bar.
+    An indicator that is NaN there (window not full yet) stays NaN; it is
+    not filled from an older bar.
+    """
+    has_bar = indicators["close"].notna().to_numpy()
+    last = len(has_bar) - 1 - np.argmax(has_bar[::-1], axis=0)
+    columns = np.arange(has_bar.shape[1])
+    return pd.DataFrame({name: pd.Series(frame.to_numpy()[last, columns], index=frame.columns)
+                         for name, frame in indicators.items()})
+
+
+def analyze_tickers(tickers, period=DEFAULT_PERIOD, ohlcv=None):
+    """
+    Plain-function entry point: latest indicators for many tickers.
+    Pass ohlcv to reuse a frame that was already loaded.
+    """
+    symbols = [normalize_symbol(t) for t in tickers]
+    if ohlcv is None:
+        ohlcv = load_ohlcv(symbols, period=period)
+    if not ohlcv:
+        return pd.DataFrame()
+    return latest_snapshot(compute_indicators(ohlcv)).dropna(subset=["close"])
@@ -0,0 +1,365 @@
+import json
+import threading
+import time
+
+from db import get_pool
+
+FINISHED_STATUSES = ("completed", "failed")
+FINISHED_SQL = "('completed', 'failed')"
+# A claim is only kept alive while its job is one of these
+ACTIVE_STATUSES = ("waiting", "queued", "running")
+ACTIVE_SQL = "('waiting', 'queued', 'running')"
+ORPHANED_ERROR = "The server restarted before this job finished. Please retry."
+
+UPSERT_JOB = """INSERT INTO jobs (job_id, ticker, status, data, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    ticker=COALESCE(excluded.ticker, jobs.ticker),
+                    status=excluded.status, data=excluded.data, updated_at=excluded.updated_at"""
+
+
+class JobStore:
+    """
+    Where job state lives between /analyze and /status.
+
+    Besides the job records themselves, the store owns the per-ticker
+    single-flight claims so that every uvicorn worker sharing the store
+    also shares deduplication.
+
+    Finished jobs are evicted once they are older than ttl_seconds.
+    While this store holds a claim, a heartbeat thread refreshes the claim
+    and its job every claim_ttl_seconds / 3, however long the job waits or
+    runs. The scheduler's queue is in memory, so a claim or unfinished job
+    nobody has refreshed for claim_ttl_seconds belongs to a process that
+    is gone: the claim can be taken over, and the job is marked failed
+    instead of reporting "queued" forever. The heartbeat only refreshes
+    claims whose job is still waiting, queued or running; a claim whose
+    job finished (or was never stored) without releasing it is dropped
+    once it is claim_ttl_seconds old.
+    """
+
+    def __init__(self, ttl_seconds=3600, claim_ttl_seconds=90, evict_every_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self.evict_every_seconds = evict_every_seconds
+        self._last_evict = 0.0
+        self._held = {}        # ticker -> (job_id, claimed_at), claims taken through this store
+        self._held_lock = threading.Lock()
+        self._heartbeat = None
+
+    def get(self, job_id):
+        self._maybe_evict()
+        return self._get(job_id)
+
+    def _get(self, job_id):
+        raise NotImplementedError
+
+    def put(self, job_id, data, ticker=None):
+        raise NotImplementedError
+
+    def update(self, job_id, fields, ticker=None):
+        """Merges fields into the job record, keeping anything not mentioned (e.g. events)."""
+        def merge(data):
+            data.update(fields)
+        self._modify(job_id, merge, ticker)
+
+    def append_event(self, job_id, event):
+        """Adds an event to the job's progress log, which /stream replays to clients."""
+        def append(data):
+            data.setdefault("events", []).append(event)
+        self._modify(job_id, append)
+
+    def delete(self, job_id):
+        raise NotImplementedError
+
+    def _modify(self, job_id, fn, ticker=None):
+        """
+        Atomic read-modify-write of one job record. A job that was never
+        stored, or has been evicted, is left missing rather than recreated
+        as a record without a status.
+        """
+        raise NotImplementedError
+
+    def claim_ticker(self, ticker, job_id):
+        """Claims ticker for job_id. Returns the job_id already holding it, or None if we got it."""
+        held = self._claim(ticker, job_id)
+        if held is None:
+            self._hold(ticker, job_id)
+        return held
+
+    def release_ticker(self, ticker, job_id):
+        with self._held_lock:
+            if self._held.get(ticker, (None,))[0] == job_id:
+                del self._held[ticker]
+        self._release(ticker, job_id)
+
+    def _claim(self, ticker, job_id):
+        raise NotImplementedError
+
+    def _release(self, ticker, job_id):
+        raise NotImplementedError
+
+    def _touch_claims(self, held, now):
+        """
+        Marks each (ticker, job_id) claim that is still ours and whose job is
+        active, and that job, as alive at now. Returns the job_ids refreshed.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _fail_orphan(data, now):
+        data.update(status="failed", error=ORPHANED_ERROR)
+        data.setdefault("events", []).append({"stage": "failed", "ts": now})
+
+    # --- HEARTBEAT ---
+    def _hold(self, ticker, job_id):
+        with self._held_lock:
+            self._held[ticker] = (job_id, time.time())
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="job-store-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def refresh_claims(self):
+        now = time.time()
+        with self._held_lock:
+            held = list(self._held.items())
+        if not held:
+            return
+        alive = self._touch_claims([(ticker, job_id) for ticker, (job_id, _) in held], now)
+        for ticker, (job_id, claimed_at) in held:
+            # Younger claims may belong to a job that is about to be stored
+            if job_id not in alive and now - claimed_at >= self.claim_ttl_seconds:
+                print(f"🧹 Dropping claim on {ticker}: job {job_id} is no longer active")
+                self.release_ticker(ticker, job_id)
+
+    def _beat(self):
+        while True:
+            time.sleep(self.claim_ttl_seconds / 3)
+            try:
+                self.refresh_claims()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def active_job(self, ticker):
+        raise NotImplementedError
+
+    def evict_expired(self):
+        raise NotImplementedError
+
+    def _maybe_evict(self):
+        now = time.time()
+        if now - self._last_evict >= self.evict_every_seconds:
+            self._last_evict = now
+            self.evict_expired()
+
+
+class MemoryJobStore(JobStore):
+    """Single-process store. Fine for local dev and one-worker deployments."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs = {}       # job_id -> (data, updated_at)
+        self._claims = {}     # ticker -> (job_id, claimed_at)
+        self._lock = threading.Lock()
+
+    def _get(self, job_id):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            return dict(entry[0]) if entry else None
+
+    def put(self, job_id, data, ticker=None):
+        with self._lock:
+            self._jobs[job_id] = (dict(data), time.time())
+        self._maybe_evict()
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _modify(self, job_id, fn, ticker=None):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return
+            data = dict(entry[0])
+            fn(data)
+            self._jobs[job_id] = (data, time.time())
+
+    def _claim(self, ticker, job_id):
+        now = time.time()
+        with self._lock:
+            held = self._claims.get(ticker)
+            if held and now - held[1] < self.claim_ttl_seconds:
+                return held[0]
+            self._claims[ticker] = (job_id, now)
+            return None
+
+    def _release(self, ticker, job_id):
+        with self._lock:
+            held = self._claims.get(ticker)
+            if held and held[0] == job_id:
+                del self._claims[ticker]
+
+    def _touch_claims(self, held, now):
+        alive = set()
+        with self._lock:
+            for ticker, job_id in held:
+                entry = self._jobs.get(job_id)
+                if entry and entry[0].get("status") in ACTIVE_STATUSES \
+                        and self._claims.get(ticker, (None,))[0] == job_id:
+                    self._claims[ticker] = (job_id, now)
+                    self._jobs[job_id] = (entry[0], now)
+                    alive.add(job_id)
+        return alive
+
+    def active_job(self, ticker):
+        with self._lock:
+            held = self._claims.get(ticker)
+            if held and time.time() - held[1] < self.claim_ttl_seconds:
+                return held[0]
+            return None
+
+    def evict_expired(self):
+        now = time.time()
+        cutoff, orphan_cutoff = now - self.ttl_seconds, now - self.claim_ttl_seconds
+        with self._lock:
+            expired = []
+            for job_id, (data, updated_at) in self._jobs.items():
+                if data.get("status") in FINISHED_STATUSES:
+                    if updated_at < cutoff:
+                        expired.append(job_id)
+                elif data.get("kind") != "batch" and updated_at < orphan_cutoff:
+                    self._fail_orphan(data, now)
+                    self._jobs[job_id] = (data, now)
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Job state in a WAL-mode SQLite file, shared by every process that
+    points at the same path. Goes through the pooled connections in db.py,
+    so /status readers run while a worker is writing. The file and tables
+    are created on first use, not at construction.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._pool = None
+        self._schema_ready = False
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = get_pool(self.path)
+        if not self._schema_ready:
+            self._init_schema(self._pool)
+            self._schema_ready = True
+        return self._pool
+
+    def _init_schema(self, pool):
+        with pool.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs
+                            (job_id TEXT PRIMARY KEY, ticker TEXT, status TEXT,
+                             data TEXT, updated_at REAL)''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated_at)")
+            conn.execute('''CREATE TABLE IF NOT EXISTS job_claims
+                            (ticker TEXT PRIMARY KEY, job_id TEXT, claimed_at REAL)''')
+
+    def _get(self, job_id):
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, job_id, data, ticker=None):
+        with self.pool.connection() as conn:
+            conn.execute(
+                UPSERT_JOB,
+                (job_id, ticker, data.get("status"), json.dumps(data), time.time())
+            )
+        self._maybe_evict()
+
+    def delete(self, job_id):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id=?", (job_id,))
+
+    def _modify(self, job_id, fn, ticker=None):
+        with self.pool.transaction(immediate=True) as conn:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            fn(data)
+            conn.execute(
+                UPSERT_JOB,
+                (job_id, ticker, data.get("status"), json.dumps(data), time.time())
+            )
+
+    def _claim(self, ticker, job_id):
+        now = time.time()
+        # IMMEDIATE takes the write lock up front so two processes can't
+        # both see the ticker as free.
+        with self.pool.transaction(immediate=True) as conn:
+            row = conn.execute("SELECT job_id, claimed_at FROM job_claims WHERE ticker=?", (ticker,)).fetchone()
+            if row and now - row[1] < self.claim_ttl_seconds:
+                return row[0]
+            conn.execute("REPLACE INTO job_claims (ticker, job_id, claimed_at) VALUES (?, ?, ?)",
+                         (ticker, job_id, now))
+            return None
+
+    def _release(self, ticker, job_id):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM job_claims WHERE ticker=? AND job_id=?", (ticker, job_id))
+
+    def _touch_claims(self, held, now):
+        alive = set()
+        with self.pool.transaction(immediate=True) as conn:
+            for ticker, job_id in held:
+                touched = conn.execute(
+                    f"UPDATE jobs SET updated_at=? WHERE job_id=? AND status IN {ACTIVE_SQL} "
+                    f"AND EXISTS (SELECT 1 FROM job_claims WHERE ticker=? AND job_id=?)",
+                    (now, job_id, ticker, job_id)
+                ).rowcount
+                if touched:
+                    conn.execute("UPDATE job_claims SET claimed_at=? WHERE ticker=? AND job_id=?",
+                                 (now, ticker, job_id))
+                    alive.add(job_id)
+        return alive
+
+    def active_job(self, ticker):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM job_claims WHERE ticker=? AND claimed_at > ?",
+                (ticker, time.time() - self.claim_ttl_seconds)
+            ).fetchone()
+        return row[0] if row else None
+
+    def evict_expired(self):
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN {FINISHED_SQL} AND updated_at < ?",
+                (now - self.ttl_seconds,)
+            )
+            conn.execute("DELETE FROM job_claims WHERE claimed_at < ?", (now - self.claim_ttl_seconds,))
+            # Ticker jobs only: batch records carry no claim and finish from their members
+            orphans = conn.execute(
+                f"SELECT job_id, data FROM jobs WHERE ticker IS NOT NULL AND status NOT IN {FINISHED_SQL} "
+                f"AND updated_at < ?", (now - self.claim_ttl_seconds,)
+            ).fetchall()
+            for job_id, data in orphans:
+                data = json.loads(data)
+                self._fail_orphan(data, now)
+                conn.execute("UPDATE jobs SET status=?, data=?, updated_at=? WHERE job_id=?",
+                             (data["status"], json.dumps(data), now, job_id))
+        if orphans:
+            print(f"🧹 Marked {len(orphans)} orphaned job(s) failed")
+
+
+def create_job_store(backend, path=None, **kwargs):
+    if backend == "memory":
+        return MemoryJobStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteJobStore(path, **kwargs)
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,14 @@
+import importlib
+import threading
+
+# Heavy dependencies (crewai, openai, yfinance, langfuse) are imported on
+# first use, which can happen on several worker threads at once. Their
+# import graphs overlap, and pydantic's lazily loaded submodules fail
+# when two threads initialise them concurrently. So first imports are
+# serialized. Once a module is loaded, the import is a dict lookup under
+# an uncontended lock.
+_lock = threading.RLock()
+
+def lazy_import(name):
+    with _lock:
+        return importlib.import_module(name)
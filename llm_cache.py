@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from db import get_pool
+from metrics import LLM_SECONDS, LLM_TOKENS
+
+CREATE_LLM_CACHE = '''CREATE TABLE IF NOT EXISTS llm_cache
+                      (key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,
+                       created_at REAL, expires_at REAL, last_used REAL)'''
+CREATE_LLM_CACHE_INDEX = "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)"
+SELECT_RESPONSE = "SELECT response, expires_at FROM llm_cache WHERE key=?"
+TOUCH_RESPONSE = "UPDATE llm_cache SET last_used=? WHERE key=?"
+UPSERT_RESPONSE = '''REPLACE INTO llm_cache (key, model, response, size, created_at, expires_at, last_used)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)'''
+PURGE_EXPIRED = "DELETE FROM llm_cache WHERE expires_at < ?"
+TOTAL_SIZE = "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+LRU_ENTRIES = "SELECT key, size FROM llm_cache ORDER BY last_used"
+DELETE_ENTRY = "DELETE FROM llm_cache WHERE key=?"
+
+
+def cache_key(model, messages, **params):
+    """
+    Content address of one completion request: the same model, messages
+    and parameters always hash to the same key. Objects that don't
+    serialize (e.g. tool instances) are keyed by their name.
+    """
+    payload = {"model": model, "messages": messages, "params": params}
+    encoded = json.dumps(payload, sort_keys=True, default=lambda o: getattr(o, "name", type(o).__name__))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Disk-backed cache of completion texts, keyed on model + prompt + params.
+
+    Only deterministic calls (temperature 0) should go through it; a
+    re-run whose inputs didn't change then costs a SQLite lookup instead
+    of an API round trip. Entries expire after `ttl` seconds, and the
+    least recently used are evicted once the table exceeds `max_bytes`.
+    """
+
+    def __init__(self, ttl=86400, max_bytes=64 * 1024 * 1024, pool=None, evict_every=20):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._pool = pool
+        self._schema_ready = False
+        self._lock = threading.Lock()
+        self._sets_since_evict = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = get_pool()
+        if not self._schema_ready:
+            with self._pool.connection() as conn:
+                conn.execute(CREATE_LLM_CACHE)
+                conn.execute(CREATE_LLM_CACHE_INDEX)
+            self._schema_ready = True
+        return self._pool
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def get(self, key):
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_RESPONSE, (key,)).fetchone()
+            if row and row[1] >= now:
+                conn.execute(TOUCH_RESPONSE, (now, key))
+                self._count("hits")
+                return row[0]
+        self._count("misses")
+        return None
+
+    def set(self, key, model, response):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(UPSERT_RESPONSE, (key, model, response, len(response.encode()),
+                                           now, now + self.ttl, now))
+        self._count("stores")
+
+        with self._lock:
+            self._sets_since_evict += 1
+            due = self._sets_since_evict >= self.evict_every
+            if due:
+                self._sets_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until under max_bytes."""
+        with self.pool.transaction(immediate=True) as conn:
+            removed = conn.execute(PURGE_EXPIRED, (time.time(),)).rowcount
+            excess = conn.execute(TOTAL_SIZE).fetchone()[0] - self.max_bytes
+            if excess > 0:
+                victims = []
+                for key, size in conn.execute(LRU_ENTRIES):
+                    if excess <= 0:
+                        break
+                    victims.append((key,))
+                    excess -= size
+                conn.executemany(DELETE_ENTRY, victims)
+                removed += len(victims)
+        self._count("evictions", removed)
+
+    def stats_snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMCache(
+    ttl=int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600))),
+    max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+
+
+def cached_chat_completion(client, model, messages, component="judge", **params):
+    """
+    Text of client.chat.completions.create(...), served from the cache
+    when the exact same request was answered before. Non-zero
+    temperatures always go to the API. Latency and billed tokens are
+    recorded under `component` for /metrics.
+    """
+    started = time.perf_counter()
+    cacheable = LLM_CACHE_ENABLED and params.get("temperature", 1) == 0
+    key = cache_key(model, messages, **params) if cacheable else None
+    if cacheable:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            LLM_SECONDS.observe(time.perf_counter() - started, component=component, model=model, cached="true")
+            return cached
+
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, **params)
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, component=component, model=model, cached="false")
+    if response.usage is not None:
+        LLM_TOKENS.inc(response.usage.prompt_tokens, component=component, model=model, kind="prompt")
+        LLM_TOKENS.inc(response.usage.completion_tokens, component=component, model=model, kind="completion")
+    content = response.choices[0].message.content
+    if cacheable and content:
+        llm_cache.set(key, model, content)
+    return content
@@ -0,0 +1,134 @@
+"""
+Shows that /status latency stays flat while /analyze is under load.
+
+    uvicorn app:app --port 8000
+    python loadtest.py --base-url http://localhost:8000 --tickers TCS,INFY,RELIANCE
+    python loadtest.py --rate 40           # fixed arrival rate instead of closed-loop clients
+
+Phase 1 (baseline): only the /status probe runs.
+Phase 2 (load): the same probe runs while `--concurrency` clients post
+/analyze as fast as they can, or while /analyze is posted at `--rate`
+requests per second. Closed-loop clients push the server to full CPU,
+so on a small box expect some queueing either way; --rate shows the
+latency at a given offered load.
+
+The script prints latency percentiles for both phases. When every call
+on the /analyze path is non-blocking, the /status numbers barely change
+between them.
+
+/analyze on a stale ticker queues a real crew run, so use tickers that
+are already cached (run them once first), or expect 429s once the agent
+queue fills up. Both still exercise the cache check, the quote fetch
+and the job store. GROWW_BASE_URL / GOOGLE_FINANCE_BASE_URL on the
+server let the quote sources point at local stubs.
+"""
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+
+def percentiles(samples):
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+    return (f"n={len(ordered)}  p50={pick(0.50):.1f}ms  p95={pick(0.95):.1f}ms  "
+            f"p99={pick(0.99):.1f}ms  max={ordered[-1] * 1000:.1f}ms")
+
+
+async def probe_status(client, stop, interval):
+    """Polls /status for a job that doesn't exist: pure event-loop + job-store cost."""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.get("/status/loadtest-probe")
+        except httpx.HTTPError:
+            pass   # a timeout still counts, at its full duration
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def post_analyze(client, ticker, outcomes, latencies):
+    started = time.perf_counter()
+    try:
+        res = await client.post("/analyze", json={"ticker": ticker})
+        outcomes[res.status_code] += 1
+    except httpx.HTTPError as e:
+        outcomes[type(e).__name__] += 1
+    latencies.append(time.perf_counter() - started)
+
+
+async def hammer_analyze(client, stop, tickers, worker, outcomes, latencies):
+    """Closed loop: one client posting back to back."""
+    i = worker
+    while not stop.is_set():
+        await post_analyze(client, tickers[i % len(tickers)], outcomes, latencies)
+        i += 1
+
+
+async def paced_analyze(client, stop, tickers, rate, outcomes, latencies):
+    """Open loop: `rate` posts per second whether or not earlier ones have answered."""
+    tasks, i = [], 0
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        tasks.append(asyncio.create_task(post_analyze(client, tickers[i % len(tickers)], outcomes, latencies)))
+        i += 1
+        next_at += 1 / rate
+        await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+    await asyncio.gather(*tasks)
+
+
+async def run_phase(client, seconds, interval, tickers=None, concurrency=0, rate=None):
+    stop = asyncio.Event()
+    outcomes, analyze_latencies = Counter(), []
+    probe = asyncio.create_task(probe_status(client, stop, interval))
+    if not tickers:
+        load = []
+    elif rate:
+        load = [asyncio.create_task(paced_analyze(client, stop, tickers, rate, outcomes, analyze_latencies))]
+    else:
+        load = [
+            asyncio.create_task(hammer_analyze(client, stop, tickers, n, outcomes, analyze_latencies))
+            for n in range(concurrency)
+        ]
+    await asyncio.sleep(seconds)
+    stop.set()
+    status_latencies = await probe
+    await asyncio.gather(*load)
+    return status_latencies, analyze_latencies, outcomes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load /analyze while measuring /status latency.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--tickers", default="TCS,INFY,RELIANCE,HDFCBANK,ITC", help="Comma-separated tickers to post")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent /analyze clients")
+    parser.add_argument("--rate", type=float, help="Post /analyze at this many requests/s instead (open loop)")
+    parser.add_argument("--seconds", type=float, default=20, help="Length of each phase")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="Pause between /status probes")
+    args = parser.parse_args()
+    tickers = [t.strip().upper() for t in args.tickers.split(",") if t.strip()]
+
+    limits = httpx.Limits(max_connections=None if args.rate else args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+        print(f"⏱️ Baseline: /status only for {args.seconds:.0f}s")
+        baseline, _, _ = await run_phase(client, args.seconds, args.probe_interval)
+
+        load = f"{args.rate:g} req/s" if args.rate else f"{args.concurrency} clients"
+        print(f"🔨 Load: {load} on /analyze for {args.seconds:.0f}s")
+        loaded, analyze, outcomes = await run_phase(client, args.seconds, args.probe_interval,
+                                                    tickers, args.concurrency, args.rate)
+
+    print(f"\n/status baseline : {percentiles(baseline)}")
+    print(f"/status under load: {percentiles(loaded)}")
+    print(f"/analyze          : {percentiles(analyze)}  "
+          f"({len(analyze) / args.seconds:.0f} req/s, {dict(outcomes)})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,13 @@
 import os
+import json
+import time
+import threading
 from dotenv import load_dotenv
-from crewai import Agent, Task, Crew, LLM
-from crewai_tools import SerperDevTool
-from tools import stock_price_analyzer
+from crewai import Agent, Task, Crew
+from crewai.llms.providers.openai.completion import OpenAICompletion
+from tools import stock_price_analyzer, technicals_snapshot, news_search
+from llm_cache import llm_cache, cache_key, LLM_CACHE_ENABLED
+from metrics import LLM_SECONDS, LLM_TOKENS, AGENT_TASK_SECONDS
 from pydantic import BaseModel, Field
 from typing import List
 
@@ -15,72 +20,211 @@ class FinancialAnalysisOutput(BaseModel):
 
 load_dotenv()
 
-def run_financial_analysis(ticker: str):
-    # 1. Tools & LLM Setup
-    search_tool = SerperDevTool()
-    my_llm = LLM(model="openai/gpt-4o-mini", api_key=os.getenv("OPENAI_API_KEY"), temperature=0)
-
-    # 2. Define Agents
-    quant_analyst = Agent(
-        role='Senior Quant Researcher',
-        goal=f'Report technical indicators for {ticker}',
-        backstory="You are a precise technical analyst at a Mumbai firm.",
-        tools=[stock_price_analyzer],
-        llm=my_llm,
-        verbose=True,
-        allow_delegation=False
-    )
-
-    news_analyst = Agent(
-        role='Financial News Correspondent',
-        goal=f'Identify major news catalysts for {ticker}',
-        backstory="""You are an expert financial journalist in India. 
-        You scan news from Moneycontrol, Economic Times, and Livemint to find sentiment. 
-        You look for earnings, scandals and regulatory news.""",
-        tools=[search_tool],
-        llm=my_llm,
-        verbose=True
-    )
-
-    risk_manager = Agent(
-        role='Chief Risk Officer (CRO)',
-        goal=f'Identify all potential risks and downsides for {ticker}',
-        backstory="""You are a cynical, veteran risk manager at a top Indian bank. 
-        You believe every investment has a hidden trap. Your job is to find 
-        3 specific reasons why the Quant and News agents might be over-optimistic. 
-        Look for regulatory risks, promoter issues, or macro-economic threats.""",
-        llm=my_llm,
-        verbose=True,
-        allow_delegation=False
-    )
-
-    # 3. Define Tasks
-    tech_task = Task(description=f'Fetch Technicals for {ticker}.',
-                     expected_output='Price, RSI, and MA20.',
-                     agent=quant_analyst
-                    )
-    
-    news_task = Task(description=f'Search news for {ticker} from the last 7 days.',
-                     expected_output='3-bullet summary + sentiment score.',
-                     agent=news_analyst,
-                     context=[tech_task]
-                    )
-    
-    risk_task = Task(
-                    description="""Analyze risks for {ticker} based on tech and news. 
+# Quant and news don't depend on each other: run them side by side and let
+# the risk stage join on both. Set CREW_PARALLEL=0 to run strictly in sequence.
+PARALLEL_STAGES = os.getenv("CREW_PARALLEL", "1") == "1"
+
+# "agent": the Quant Analyst calls stock_price_analyzer and reports back.
+# "precompute": technicals are computed in Python and handed to the risk
+# stage as JSON, so no LLM hop is spent reformatting the numbers.
+QUANT_MODE = os.getenv("CREW_QUANT_MODE", "agent")
+
+# --- CACHED LLM ---
+class CachedLLM(OpenAICompletion):
+    """
+    The OpenAI LLM that crewai.LLM("openai/...") resolves to, with the
+    response cache in front of call(). Plain text completions at
+    temperature 0 are looked up by model + messages + tools first.
+    Calls that execute tools inside the LLM (available_functions) or
+    ask for a structured response model always go to the API.
+
+    Every call is timed, and the tokens the API reports are counted, for
+    /metrics.
+
+    OpenAICompletion and its _token_usage are crewai internals, so crewai
+    is pinned exactly; tests/test_cached_llm.py fails if an upgrade moves
+    either.
+    """
+
+    _metered_lock = threading.Lock()
+
+    def _meter_tokens(self):
+        # Agents running in parallel share this client, so count what the
+        # running totals grew by since the last look, not per call.
+        usage = getattr(self, "_token_usage", None) or {}
+        with self._metered_lock:
+            seen = self.__dict__.setdefault("_tokens_metered", {})
+            for kind in ("prompt_tokens", "completion_tokens"):
+                delta = usage.get(kind, 0) - seen.get(kind, 0)
+                if delta > 0:
+                    LLM_TOKENS.inc(delta, component="crew", model=self.model, kind=kind.split("_")[0])
+                seen[kind] = usage.get(kind, 0)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        started = time.perf_counter()
+        cacheable = (LLM_CACHE_ENABLED and self.temperature == 0
+                     and available_functions is None and response_model is None)
+        key = None
+        if cacheable:
+            key = cache_key(self.model, messages, tools=tools, temperature=self.temperature,
+                            max_tokens=self.max_tokens, stop=self.stop)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                LLM_SECONDS.observe(time.perf_counter() - started, component="crew", model=self.model, cached="true")
+                return cached
+
+        try:
+            result = super().call(messages, tools, callbacks, available_functions,
+                                  from_task, from_agent, response_model)
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, component="crew", model=self.model, cached="false")
+            self._meter_tokens()
+        if key is not None and isinstance(result, str) and result:
+            llm_cache.set(key, self.model, result)
+        return result
+
+
+# --- CREW FACTORY ---
+class CrewFactory:
+    """
+    The long-lived parts of the crew: one LLM client (and its keep-alive
+    connection pool), the tool instances and the three agents. Agent
+    texts are {ticker} templates that CrewAI fills in on every kickoff,
+    so the same agents serve every job. Only the tasks and the Crew,
+    which carry per-job callbacks and outputs, are built per job.
+
+    Agents hold per-run state, so each worker thread gets its own factory
+    (see get_crew_factory) instead of sharing one.
+    """
+
+    def __init__(self):
+        started = time.perf_counter()
+
+        # 1. Tools & LLM Setup
+        self.search_tool = news_search
+        self.llm = CachedLLM(model="gpt-4o-mini", api_key=os.getenv("OPENAI_API_KEY"), temperature=0)
+
+        # 2. Define Agents
+        self.quant_analyst = Agent(
+            role='Senior Quant Researcher',
+            goal='Report technical indicators for {ticker}',
+            backstory="You are a precise technical analyst at a Mumbai firm.",
+            tools=[stock_price_analyzer],
+            llm=self.llm,
+            verbose=True,
+            allow_delegation=False
+        )
+
+        self.news_analyst = Agent(
+            role='Financial News Correspondent',
+            goal='Identify major news catalysts for {ticker}',
+            backstory="""You are an expert financial journalist in India. 
+            You scan news from Moneycontrol, Economic Times, and Livemint to find sentiment. 
+            You look for earnings, scandals and regulatory news.""",
+            tools=[self.search_tool],
+            llm=self.llm,
+            verbose=True
+        )
+
+        self.risk_manager = Agent(
+            role='Chief Risk Officer (CRO)',
+            goal='Identify all potential risks and downsides for {ticker}',
+            backstory="""You are a cynical, veteran risk manager at a top Indian bank. 
+            You believe every investment has a hidden trap. Your job is to find 
+            3 specific reasons why the Quant and News agents might be over-optimistic. 
+            Look for regulatory risks, promoter issues, or macro-economic threats.""",
+            llm=self.llm,
+            verbose=True,
+            allow_delegation=False
+        )
+
+        self.build_seconds = time.perf_counter() - started
+
+    def build(self, precompute=False, on_progress=None):
+        # on_progress(stage) is called as each agent finishes: "quant", "news", "risk"
+        tasks_by_stage = {}
+
+        def stage_callback(stage):
+            def callback(_output):
+                # CrewAI stamps start_time/end_time on the task before the callback
+                duration = tasks_by_stage[stage].execution_duration
+                if duration is not None:
+                    AGENT_TASK_SECONDS.observe(duration, task=stage)
+                if on_progress is not None:
+                    on_progress(stage)
+            return callback
+
+        # 3. Define Tasks
+        tech_task = Task(description='Fetch Technicals for {ticker}.',
+                         expected_output='Price, RSI, and MA20.',
+                         agent=self.quant_analyst,
+                         async_execution=PARALLEL_STAGES,
+                         callback=stage_callback("quant")
+                        )
+
+        news_task = Task(description='Search news for {ticker} from the last 7 days.',
+                         expected_output='3-bullet summary + sentiment score.',
+                         agent=self.news_analyst,
+                         # Searching news doesn't need the RSI values
+                         context=[] if PARALLEL_STAGES or precompute else [tech_task],
+                         async_execution=PARALLEL_STAGES and not precompute,
+                         callback=stage_callback("news")
+                        )
+
+        risk_description = """Analyze risks for {ticker} based on tech and news. 
                     Provide a sentiment_score, strictly between 0 and 10 (where 0 is extreme panic and 10 is euphoria).
-                    Ensure all fields in the JSON are filled accurately.""", 
-                    expected_output='A structured JSON object with analysis and risk summary.', 
-                    agent=risk_manager, 
-                    context=[tech_task, news_task],
-                    output_json=FinancialAnalysisOutput
-                    )
-
-    # 4. Assemble & Execute
-    financial_crew = Crew(
-        agents=[quant_analyst, news_analyst, risk_manager],
-        tasks=[tech_task, news_task, risk_task],
-        verbose=True
-    )
-
-    return financial_crew.kickoff(inputs={'ticker': ticker})
\ No newline at end of file
+                    Ensure all fields in the JSON are filled accurately."""
+        if precompute:
+            risk_description += """
+                    Technical indicators for {ticker} (exact, computed from daily bars): {technicals}"""
+
+        risk_task = Task(
+                        description=risk_description, 
+                        expected_output='A structured JSON object with analysis and risk summary.', 
+                        agent=self.risk_manager, 
+                        context=[news_task] if precompute else [tech_task, news_task],
+                        output_json=FinancialAnalysisOutput,
+                        callback=stage_callback("risk")
+                        )
+
+        tasks_by_stage.update(quant=tech_task, news=news_task, risk=risk_task)
+
+        # 4. Assemble
+        if precompute:
+            agents, tasks = [self.news_analyst, self.risk_manager], [news_task, risk_task]
+        else:
+            agents, tasks = [self.quant_analyst, self.news_analyst, self.risk_manager], [tech_task, news_task, risk_task]
+
+        return Crew(agents=agents, tasks=tasks, verbose=True)
+
+
+_local = threading.local()
+
+def get_crew_factory():
+    """This thread's CrewFactory, built on first use."""
+    factory = getattr(_local, "factory", None)
+    if factory is None:
+        factory = _local.factory = CrewFactory()
+        print(f"🏗️ Crew factory built in {factory.build_seconds * 1000:.0f} ms "
+              f"({threading.current_thread().name})")
+    return factory
+
+
+def run_financial_analysis(ticker: str, on_progress=None):
+    precompute = QUANT_MODE == "precompute"
+    inputs = {'ticker': ticker}
+    if precompute:
+        # Timed as the "quant" task, the stage it replaces
+        with AGENT_TASK_SECONDS.time(task="quant"):
+            technicals = technicals_snapshot(ticker)
+        inputs['technicals'] = json.dumps(technicals) if technicals else "unavailable (no price history)"
+        if on_progress is not None:
+            on_progress("quant")
+
+    started = time.perf_counter()
+    financial_crew = get_crew_factory().build(precompute=precompute, on_progress=on_progress)
+    print(f"⚙️ Crew setup for {ticker}: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # 5. Execute
+    return financial_crew.kickoff(inputs=inputs)
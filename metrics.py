@@ -0,0 +1,189 @@
+"""
+In-process metrics in the Prometheus text format, with no client library
+and nothing sent anywhere: GET /metrics renders the current values.
+Works with Langfuse disabled and fully offline.
+
+Counters and histograms are updated where the work happens. Callback
+gauges and counters read values that other objects already track, such
+as queue depth and cache hit counts, at scrape time.
+
+Each process keeps its own values. With several uvicorn workers, or
+AGENT_WORKER_MODE=process, each process reports only what it ran.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds: from a cached quote (~ms) up to a slow crew run (minutes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += self.samples()
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}"
+                for key, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the block's duration, including when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets + (float("inf"),), values[:len(self.buckets)] + [values[-1]]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {values[-1]}")
+        return lines
+
+
+class Callback(_Metric):
+    """
+    A gauge or counter that is read at scrape time. fn() returns a number,
+    or {label values tuple: number} when the metric has labels.
+    """
+
+    def __init__(self, name, help, fn, labels=(), type="gauge"):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.type = type
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} unavailable: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}"
+                for key, v in sorted(values.items()) if v is not None]
+
+
+def render():
+    """Every registered metric in Prometheus text exposition format 0.0.4."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- METRICS ---
+# Request path
+QUOTE_FETCH_SECONDS = Histogram(
+    "analyst_quote_fetch_seconds", "Hedged live-quote fetch, by the source that answered", ("source",))
+QUOTE_SOURCE_SECONDS = Histogram(
+    "analyst_quote_source_seconds", "One price source call", ("source", "outcome"))
+CACHE_LOOKUP_SECONDS = Histogram(
+    "analyst_cache_lookup_seconds", "Report cache read plus freshness check, including any live price", ("result",))
+REPORT_CACHE = Counter(
+    "analyst_report_cache_total", "Report cache lookups by outcome (fresh, stale, miss)", ("route", "result"))
+
+# Crew jobs
+QUEUE_WAIT_SECONDS = Histogram(
+    "analyst_queue_wait_seconds", "Time a job waited for an agent worker", ("priority",))
+ANALYSIS_SECONDS = Histogram(
+    "analyst_analysis_seconds", "Whole crew job, from worker pick-up to saved report", ("status",))
+AGENT_TASK_SECONDS = Histogram(
+    "analyst_agent_task_seconds", "One crew task (quant, news, risk)", ("task",))
+TOOL_SECONDS = Histogram(
+    "analyst_tool_seconds", "One agent tool call", ("tool",))
+SERPER_SECONDS = Histogram(
+    "analyst_serper_seconds", "One Serper news search", ("outcome",))
+
+# LLM usage (crew agents and the eval judge)
+LLM_SECONDS = Histogram(
+    "analyst_llm_request_seconds", "One LLM call; cached=true means answered from the response cache",
+    ("component", "model", "cached"))
+LLM_TOKENS = Counter(
+    "analyst_llm_tokens_total", "Tokens billed by the LLM API", ("component", "model", "kind"))
+JUDGE_SECONDS = Histogram(
+    "analyst_judge_seconds", "One LLM-judge scoring request", ("mode",))
+
+# Storage
+DB_WRITE_SECONDS = Histogram(
+    "analyst_db_write_seconds", "One batched report write transaction")
+DB_ROWS_WRITTEN = Counter(
+    "analyst_db_reports_written_total", "Reports written to the reports and report_history tables")
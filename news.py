@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import requests
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from zoneinfo import ZoneInfo
+
+from db import get_pool
+from metrics import SERPER_SECONDS
+
+# --- 1. CONFIGURATION ---
+SERPER_URL = os.getenv("SERPER_NEWS_URL", "https://google.serper.dev/news")
+MARKET_TZ = ZoneInfo("Asia/Kolkata")
+
+# Each search is cached per (ticker, query, market day) and re-run at most
+# once per NEWS_TTL_SECONDS; a 7-day news window barely moves within an hour.
+NEWS_TTL = int(os.getenv("NEWS_TTL_SECONDS", "3600"))
+NEWS_QUERIES = ("{symbol} share news", "{symbol} stock results earnings")
+
+# Offline mode: read Serper-format responses from <dir>/<SYMBOL>.json instead
+# of the network. Lets the whole pipeline run against a local fixture store.
+FIXTURE_DIR = os.getenv("NEWS_FIXTURE_DIR")
+
+CREATE_ARTICLES = '''CREATE TABLE IF NOT EXISTS news_articles
+                     (id INTEGER PRIMARY KEY, url_key TEXT UNIQUE, content_hash TEXT UNIQUE,
+                      url TEXT, title TEXT, snippet TEXT, source TEXT,
+                      published_at REAL, first_seen REAL)'''
+CREATE_MENTIONS = '''CREATE TABLE IF NOT EXISTS news_mentions
+                     (ticker TEXT, article_id INTEGER, PRIMARY KEY (ticker, article_id))'''
+CREATE_SEARCHES = '''CREATE TABLE IF NOT EXISTS news_searches
+                     (ticker TEXT, query TEXT, day TEXT, fetched_at REAL,
+                      PRIMARY KEY (ticker, query, day))'''
+SELECT_SEARCH = "SELECT fetched_at FROM news_searches WHERE ticker=? AND query=? AND day=?"
+UPSERT_SEARCH = "REPLACE INTO news_searches (ticker, query, day, fetched_at) VALUES (?, ?, ?, ?)"
+FIND_ARTICLE = "SELECT id FROM news_articles WHERE url_key=? OR content_hash=?"
+INSERT_ARTICLE = '''INSERT INTO news_articles
+                    (url_key, content_hash, url, title, snippet, source, published_at, first_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+INSERT_MENTION = "INSERT OR IGNORE INTO news_mentions (ticker, article_id) VALUES (?, ?)"
+SELECT_RECENT = '''SELECT a.title, a.snippet, a.source, a.url, a.published_at
+                   FROM news_mentions m JOIN news_articles a ON a.id = m.article_id
+                   WHERE m.ticker = ? AND a.published_at >= ?
+                   ORDER BY a.published_at DESC LIMIT ?'''
+INDEXES = ("CREATE INDEX IF NOT EXISTS idx_news_articles_published ON news_articles (published_at)",)
+
+
+# --- 2. NORMALIZATION + DEDUP KEYS ---
+_TRACKING_PARAMS = re.compile(r"^(utm_|fbclid$|gclid$|ref$|amp$)")
+
+def clean_symbol(ticker):
+    symbol = ticker.upper().strip()
+    for suffix in ['.NSE', '.NS', '.BSE', '.BO']:
+        if symbol.endswith(suffix):
+            return symbol[:-len(suffix)]
+    return symbol
+
+def url_key(url):
+    """Same article behind different tracking params / AMP paths / trailing slashes -> one key."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    path = re.sub(r"/amp/?$|/$", "", parts.path)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)])
+    return hashlib.sha1(urlunsplit(("", host, path, query, "")).encode()).hexdigest()
+
+def content_hash(title):
+    """Syndicated copies of one story (same headline, different site) hash the same."""
+    text = re.sub(r"[^a-z0-9]+", " ", title.lower()).strip()
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def parse_published(value, now):
+    """Serper dates are either relative ("3 hours ago") or absolute ("Mar 3, 2026")."""
+    value = (value or "").strip().lower()
+    match = re.match(r"(\d+)\s+(minute|hour|day|week|month)s?\s+ago", value)
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        days = {"minute": 1 / 1440, "hour": 1 / 24, "day": 1, "week": 7, "month": 30}[unit]
+        return now - n * days * 86400
+    for fmt in ("%b %d, %Y", "%d %b %Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.title(), fmt).replace(tzinfo=MARKET_TZ).timestamp()
+        except ValueError:
+            continue
+    return now
+
+
+# --- 3. UPSTREAM ---
+_session = requests.Session()
+
+def search_serper(query):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        res = _session.post(
+            SERPER_URL,
+            headers={"X-API-KEY": os.getenv("SERPER_API_KEY", ""), "Content-Type": "application/json"},
+            json={"q": query, "gl": "in", "tbs": "qdr:w", "num": 20},
+            timeout=10,
+        )
+        res.raise_for_status()
+        outcome = "ok"
+        return res.json().get("news", [])
+    finally:
+        SERPER_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+
+def search_fixture(symbol):
+    path = os.path.join(FIXTURE_DIR, f"{symbol}.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("news", data) if isinstance(data, dict) else data
+
+
+# --- 4. LOCAL INDEX ---
+class NewsIndex:
+    """
+    Local store of news articles per ticker. Searches are refreshed at
+    most once per TTL per (ticker, query, day); every article found is
+    stored once, however many queries, tickers or syndicating sites
+    surface it.
+    """
+
+    def __init__(self, pool=None, ttl=NEWS_TTL, queries=NEWS_QUERIES):
+        self.ttl = ttl
+        self.queries = queries
+        self._pool = pool
+        self._schema_ready = False
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.stats = {"search_hits": 0, "search_misses": 0, "articles_new": 0, "articles_deduped": 0}
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = get_pool()
+        if not self._schema_ready:
+            with self._pool.connection() as conn:
+                for statement in (CREATE_ARTICLES, CREATE_MENTIONS, CREATE_SEARCHES) + INDEXES:
+                    conn.execute(statement)
+            self._schema_ready = True
+        return self._pool
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _store(self, symbol, items, now):
+        new = deduped = 0
+        with self.pool.transaction(immediate=True) as conn:
+            for item in items:
+                url, title = item.get("link"), item.get("title")
+                if not url or not title:
+                    continue
+                keys = (url_key(url), content_hash(title))
+                row = conn.execute(FIND_ARTICLE, keys).fetchone()
+                if row:
+                    article_id = row[0]
+                    deduped += 1
+                else:
+                    article_id = conn.execute(INSERT_ARTICLE, keys + (
+                        url, title, item.get("snippet", ""), item.get("source", ""),
+                        parse_published(item.get("date"), now), now,
+                    )).lastrowid
+                    new += 1
+                conn.execute(INSERT_MENTION, (symbol, article_id))
+        self.stats["articles_new"] += new
+        self.stats["articles_deduped"] += deduped
+
+    def refresh(self, symbol, query):
+        """Runs one search unless it was already run for this day within the TTL."""
+        now = time.time()
+        day = datetime.now(MARKET_TZ).strftime("%Y-%m-%d")
+
+        with self._lock_for((symbol, query)):
+            with self.pool.connection() as conn:
+                row = conn.execute(SELECT_SEARCH, (symbol, query, day)).fetchone()
+            if row and now - row[0] < self.ttl:
+                self.stats["search_hits"] += 1
+                return
+            self.stats["search_misses"] += 1
+
+            items = search_fixture(symbol) if FIXTURE_DIR else search_serper(query)
+            self._store(symbol, items, now)
+            with self.pool.connection() as conn:
+                conn.execute(UPSERT_SEARCH, (symbol, query, day, now))
+
+    def recent(self, ticker, days=7, limit=10):
+        """Latest articles for a ticker from the last `days`, refreshing stale searches first."""
+        symbol = clean_symbol(ticker)
+        for template in self.queries:
+            try:
+                self.refresh(symbol, template.format(symbol=symbol))
+            except Exception as e:
+                # Serve whatever is already indexed rather than nothing
+                print(f"⚠️ News search failed for {symbol}: {e}")
+
+        since = (datetime.now(MARKET_TZ) - timedelta(days=days)).timestamp()
+        with self.pool.connection() as conn:
+            rows = conn.execute(SELECT_RECENT, (symbol, since, limit)).fetchall()
+        return [
+            {"title": title, "snippet": snippet, "source": source, "url": url,
+             "published": datetime.fromtimestamp(published, MARKET_TZ).strftime("%Y-%m-%d %H:%M")}
+            for title, snippet, source, url, published in rows
+        ]
+
+
+news_index = NewsIndex()
+
+def get_news(ticker, days=7, limit=10):
+    return news_index.recent(ticker, days=days, limit=limit)
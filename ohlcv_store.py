@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from lazy import lazy_import
+
+# --- 1. CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.getenv("OHLCV_STORE_DIR", os.path.join(BASE_DIR, "data", "ohlcv"))
+
+MARKET_TZ = "Asia/Kolkata"
+
+BAR_DTYPE = np.dtype([
+    ("ts", "<i8"),          # bar open time, UTC epoch nanoseconds
+    ("Open", "<f8"),
+    ("High", "<f8"),
+    ("Low", "<f8"),
+    ("Close", "<f8"),
+    ("Volume", "<f8"),
+])
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+# How much history the first fetch of a ticker pulls, per interval.
+# Yahoo only serves ~60 days of 5m bars.
+INITIAL_LOOKBACK = {"1d": "2y", "1h": "6mo", "5m": "1mo"}
+
+# Skip the upstream check entirely if the file was refreshed this recently
+DEFAULT_MAX_AGE = {"1d": 900, "1h": 300, "5m": 120}
+
+_PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+
+
+def period_to_timedelta(period):
+    for unit in ("mo", "wk", "d", "y"):
+        if period.endswith(unit):
+            return pd.Timedelta(days=int(period[:-len(unit)]) * _PERIOD_DAYS[unit])
+    raise ValueError(f"Unsupported period: {period}")
+
+
+# --- 2. FILE LAYOUT ---
+# One file per (interval, ticker): STORE_DIR/<interval>/<TICKER>.npy,
+# sorted by ts. Reads memory-map the file, so nothing is parsed.
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _lock_for(path):
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+def _path(ticker, interval):
+    return os.path.join(STORE_DIR, interval, f"{ticker.upper()}.npy")
+
+def _read(path):
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+def _write(path, bars):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, bars)
+    # Atomic swap: readers in other processes see the old or new file, never half of one
+    os.replace(tmp, path)
+
+
+# --- 3. UPSTREAM ---
+def _frame_to_bars(frame):
+    frame = frame.dropna(subset=["Close"])
+    index = frame.index
+    if index.tz is None:
+        index = index.tz_localize(MARKET_TZ)
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["ts"] = index.tz_convert("UTC").as_unit("ns").asi8
+    for field in PRICE_FIELDS:
+        bars[field] = frame[field].to_numpy(dtype=float)
+    return bars
+
+def fetch_bars(tickers, interval, start=None, period=None):
+    """One yf.download for all tickers -> {ticker: bars array}."""
+    yf = lazy_import("yfinance")   # loaded on the first download, not on every process start
+    window = {"start": start} if start else {"period": period}
+    data = yf.download(list(tickers), interval=interval, auto_adjust=True,
+                       progress=False, group_by="ticker", threads=True, **window)
+    result = {}
+    if data.empty:
+        return result
+    for ticker in tickers:
+        try:
+            frame = data[ticker] if isinstance(data.columns, pd.MultiIndex) else data
+            result[ticker] = _frame_to_bars(frame)
+        except KeyError:
+            continue
+    return result
+
+def _merge(existing, new):
+    """New bars win from their first timestamp on (the last stored bar may have been partial)."""
+    if existing is None or len(existing) == 0:
+        return new
+    if len(new) == 0:
+        return np.array(existing)
+    keep = existing[existing["ts"] < new["ts"][0]]
+    return np.concatenate([keep, new])
+
+
+# --- 4. REFRESH + READ ---
+def refresh(tickers, interval="1d", max_age=None):
+    """
+    Brings the stored bars for every ticker up to date with one upstream
+    call for the whole group, fetching only what's missing since each
+    file's last bar. Files refreshed within max_age seconds are skipped.
+    """
+    max_age = DEFAULT_MAX_AGE.get(interval, 300) if max_age is None else max_age
+    now = time.time()
+
+    stale, starts = [], []
+    for ticker in tickers:
+        path = _path(ticker, interval)
+        if os.path.exists(path) and now - os.path.getmtime(path) < max_age:
+            continue
+        stale.append(ticker)
+        bars = _read(path)
+        starts.append(int(bars["ts"][-1]) if bars is not None and len(bars) else None)
+
+    if not stale:
+        return
+
+    try:
+        if any(s is None for s in starts):
+            fetched = fetch_bars(stale, interval, period=INITIAL_LOOKBACK.get(interval, "1y"))
+        else:
+            start = pd.Timestamp(min(starts), unit="ns", tz="UTC").tz_convert(MARKET_TZ)
+            fetched = fetch_bars(stale, interval, start=start.strftime("%Y-%m-%d"))
+    except Exception as e:
+        print(f"⚠️ OHLCV refresh failed for {len(stale)} tickers ({interval}): {e}")
+        return
+
+    for ticker in stale:
+        path = _path(ticker, interval)
+        with _lock_for(path):
+            merged = _merge(_read(path), fetched.get(ticker, np.empty(0, dtype=BAR_DTYPE)))
+            # An empty file still records that we asked, so unknown tickers
+            # and market holidays don't hit Yahoo on every call
+            _write(path, merged)
+
+def _is_intraday(interval):
+    return interval.endswith(("m", "h")) and not interval.endswith("mo")
+
+def read_history(ticker, period="6mo", interval="1d"):
+    """
+    Stored bars for the last `period`, as a DataFrame indexed in market time.
+    For intraday bars, "Nd" means the last N sessions in the file, as with
+    yfinance: "1d" is the latest session, not the last 24 hours.
+    """
+    bars = _read(_path(ticker, interval))
+    columns = list(PRICE_FIELDS)
+    if bars is None or len(bars) == 0:
+        return pd.DataFrame(columns=columns)
+
+    index = pd.to_datetime(bars["ts"], unit="ns", utc=True).tz_convert(MARKET_TZ)
+    if _is_intraday(interval) and period.endswith("d"):
+        sessions = index.normalize().unique()
+        keep = index >= sessions[-min(int(period[:-1]), len(sessions))]
+    else:
+        keep = bars["ts"] >= (pd.Timestamp.now(tz="UTC") - period_to_timedelta(period)).value
+    window = bars[keep]
+    return pd.DataFrame({field: window[field] for field in columns}, index=index[keep])
+
+def get_history(ticker, period="6mo", interval="1d", max_age=None):
+    refresh([ticker], interval, max_age)
+    return read_history(ticker, period, interval)
+
+def get_history_bulk(tickers, period="6mo", interval="1d", max_age=None):
+    refresh(tickers, interval, max_age)
+    return {ticker: read_history(ticker, period, interval) for ticker in tickers}
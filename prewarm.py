@@ -0,0 +1,258 @@
+"""
+Pre-open cache warming.
+
+Traffic peaks in the first half hour after NSE opens, which is exactly
+when yesterday's reports go stale. The prewarmer re-runs the analysis
+and fundamentals for a watchlist in the window before the open, so the
+first wave of /analyze requests is served from the `reports` cache.
+
+    python prewarm.py                         # every pre-open window, until stopped
+    python prewarm.py --now                   # one pass right away, then exit
+    python prewarm.py --now --ticker TCS --ticker INFY
+
+Inside the API process, set PREWARM=1 instead.
+
+Tickers come from PREWARM_TICKERS (comma-separated) if it is set.
+Otherwise they are the PREWARM_TOP_N tickers with the most reports in
+the last PREWARM_LOOKBACK_DAYS. A report is written each time a stale
+ticker is requested, so the report count follows demand.
+"""
+import os
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+import db
+from freshness import MarketCalendar
+
+# --- 1. CLOCKS ---
+class SystemClock:
+    def now(self):
+        return datetime.now().astimezone()
+
+    def sleep(self, seconds, stop=None):
+        if stop is None:
+            time.sleep(seconds)
+        else:
+            stop.wait(seconds)
+
+
+class FakeClock:
+    """Time moves only when sleep() or advance() is called, so a test can run a whole morning instantly."""
+
+    def __init__(self, start):
+        self._now = start
+        self.slept = []
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds, stop=None):
+        self.slept.append(seconds)
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self._now += timedelta(seconds=seconds)
+
+
+# --- 2. TICKER SELECTION ---
+TOP_TICKERS = '''SELECT ticker FROM report_history WHERE timestamp >= ?
+                 GROUP BY ticker ORDER BY COUNT(*) DESC, MAX(timestamp) DESC LIMIT ?'''
+
+def top_tickers(since, limit, pool=None):
+    with (pool or db.get_pool()).connection() as conn:
+        return [row[0] for row in conn.execute(TOP_TICKERS, (since, limit))]
+
+
+# --- 3. PREWARMER ---
+class Prewarmer:
+    """
+    Runs warm(ticker) for each watchlist ticker in the window that ends
+    at the market open and starts `lead` before it.
+
+    warm(ticker) does the work and blocks until it is finished. It
+    returns True if it ran an analysis and False if it skipped the
+    ticker, for example because another process was already running it.
+
+    Rate limiting happens in two ways:
+    - consecutive warms start at least 60/rate_per_minute seconds apart;
+    - at most `concurrency` warms run at once.
+    This leaves the agent workers free for anyone who is up early.
+
+    A ticker whose report was written after the window opened is
+    skipped, so a restart in the middle of the window does not redo
+    finished work. Tickers that are still left when the market opens
+    are dropped until the next day's window.
+    """
+
+    def __init__(self, warm, tickers=None, clock=None, calendar=None, lead=timedelta(minutes=45),
+                 rate_per_minute=2, concurrency=1, top_n=20, lookback_days=30,
+                 get_report=db.get_report, pool=None):
+        self.warm = warm
+        self.tickers = tickers
+        self.clock = clock or SystemClock()
+        self.calendar = calendar or MarketCalendar()
+        self.lead = lead
+        self.interval = 60.0 / rate_per_minute
+        self.concurrency = concurrency
+        self.top_n = top_n
+        self.lookback_days = lookback_days
+        self.get_report = get_report
+        self.pool = pool
+        self.last_window = None          # trading day of the last completed pass
+        self.stats = {"passes": 0, "warmed": 0, "skipped": 0, "failed": 0, "missed": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def _sleep(self, seconds):
+        if seconds > 0:
+            self.clock.sleep(seconds, self._stop)
+
+    # --- SCHEDULE ---
+    def window(self, day):
+        """(start, end) of the pre-open window on a trading day."""
+        open_at = datetime.combine(day, self.calendar.open_at, self.calendar.tz)
+        return open_at - self.lead, open_at
+
+    def next_window(self, now):
+        """The window in progress, or the next one, that has not been run yet."""
+        day = now.astimezone(self.calendar.tz).date()
+        for _ in range(30):
+            if self.calendar.is_trading_day(day) and day != self.last_window:
+                start, end = self.window(day)
+                if now < end:
+                    return start, end
+            day += timedelta(days=1)
+        raise RuntimeError("No trading day in the next 30 days; check NSE_HOLIDAYS")
+
+    def select_tickers(self):
+        if self.tickers:
+            return list(self.tickers)
+        # report_history timestamps are naive local time
+        since = (self.clock.now().astimezone() - timedelta(days=self.lookback_days)).replace(tzinfo=None)
+        return top_tickers(since.isoformat(), self.top_n, self.pool)
+
+    def is_warm(self, ticker, since):
+        """True if the cached report was written at or after `since`."""
+        try:
+            row = self.get_report(ticker)
+        except Exception as e:
+            print(f"⚠️ Prewarm cache lookup failed for {ticker}: {e}")
+            return False
+        return bool(row) and datetime.fromisoformat(row[1]).astimezone() >= since
+
+    # --- PASSES ---
+    def _run_one(self, ticker, slots):
+        try:
+            self._count("warmed" if self.warm(ticker) else "skipped")
+        except Exception as e:
+            print(f"❌ Prewarm failed for {ticker}: {e}")
+            self._count("failed")
+        finally:
+            slots.release()
+
+    def run_pass(self, since=None, deadline=None):
+        """Warms every selected ticker that has not been refreshed since `since`, stopping at `deadline`."""
+        tickers = self.select_tickers()
+        print(f"🔥 Pre-warming {len(tickers)} ticker(s)")
+        slots = threading.Semaphore(self.concurrency)
+        workers = []
+        next_start = self.clock.now()
+
+        for i, ticker in enumerate(tickers):
+            if since is not None and self.is_warm(ticker, since):
+                self._count("skipped")
+                continue
+            self._sleep((next_start - self.clock.now()).total_seconds())
+            slots.acquire()
+            if self._stop.is_set() or (deadline is not None and self.clock.now() >= deadline):
+                slots.release()
+                print(f"⏰ Pre-open window closed; {len(tickers) - i} ticker(s) left cold")
+                self._count("missed", len(tickers) - i)
+                break
+
+            next_start = self.clock.now() + timedelta(seconds=self.interval)
+            worker = threading.Thread(target=self._run_one, args=(ticker, slots),
+                                      name=f"prewarm-{ticker}", daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+        self._count("passes")
+        print(f"✅ Pre-warm pass done: {self.stats}")
+
+    def run_forever(self, max_passes=None):
+        """Sleeps until each pre-open window and runs one pass in it."""
+        passes = 0
+        while not self._stop.is_set() and (max_passes is None or passes < max_passes):
+            start, end = self.next_window(self.clock.now())
+            wait = (start - self.clock.now()).total_seconds()
+            if wait > 0:
+                # Wake hourly rather than once, so a suspended host or a
+                # clock change can't make us sleep through a window
+                self._sleep(min(wait, 3600))
+                continue
+            self.run_pass(since=start, deadline=end)
+            self.last_window = start.astimezone(self.calendar.tz).date()
+            passes += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name="prewarmer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def create_prewarmer(warm, tickers=None, clock=None):
+    """A Prewarmer configured from PREWARM_* and NSE_HOLIDAYS env vars."""
+    if tickers is None:
+        tickers = [t.strip().upper() for t in os.getenv("PREWARM_TICKERS", "").split(",") if t.strip()]
+    return Prewarmer(
+        warm,
+        tickers=tickers or None,
+        clock=clock,
+        calendar=MarketCalendar(holidays=os.getenv("NSE_HOLIDAYS", "").split(",")),
+        lead=timedelta(minutes=int(os.getenv("PREWARM_LEAD_MINUTES", "45"))),
+        rate_per_minute=float(os.getenv("PREWARM_RATE_PER_MINUTE", "2")),
+        concurrency=int(os.getenv("PREWARM_CONCURRENCY", "1")),
+        top_n=int(os.getenv("PREWARM_TOP_N", "20")),
+        lookback_days=int(os.getenv("PREWARM_LOOKBACK_DAYS", "30")),
+    )
+
+
+# --- 4. STANDALONE ENTRY POINT ---
+def main():
+    parser = argparse.ArgumentParser(description="Pre-compute analyses before the market opens.")
+    parser.add_argument("--ticker", action="append", dest="tickers", help="Warm this ticker (repeatable)")
+    parser.add_argument("--now", action="store_true", help="Run one pass immediately and exit")
+    args = parser.parse_args()
+
+    # Uses the API's job path, so its runs share claims (and the job
+    # store) with the API and are saved and evaluated the same way
+    import app
+    db.init_db()   # the API does this in its lifespan hook
+
+    prewarmer = create_prewarmer(app.prewarm_ticker,
+                                 tickers=[t.upper() for t in args.tickers] if args.tickers else None)
+    try:
+        if args.now:
+            prewarmer.run_pass()
+        else:
+            prewarmer.run_forever()
+    except KeyboardInterrupt:
+        prewarmer.stop()
+    finally:
+        app.eval_pipeline.shutdown()
+        db.get_writer().flush()
+
+
+if __name__ == "__main__":
+    main()
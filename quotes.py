@@ -0,0 +1,435 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+import requests
+from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import ohlcv_store
+from metrics import QUOTE_FETCH_SECONDS, QUOTE_SOURCE_SECONDS
+
+# --- 1. SYMBOLS ---
+def parse_symbol(ticker):
+    """RELIANCE / RELIANCE.NS / 500325.BO -> (clean symbol, "NSE" or "BSE")."""
+    ticker_upper = ticker.upper().strip()
+
+    clean_ticker = ticker_upper
+    for suffix in ['.NSE', '.NS', '.BSE', '.BO']:
+        if clean_ticker.endswith(suffix):
+            clean_ticker = clean_ticker[:-len(suffix)]
+            break
+
+    if clean_ticker.isdigit() or ticker_upper.endswith(('.BO', '.BSE')):
+        return clean_ticker, "BSE"
+    return clean_ticker, "NSE"
+
+
+# --- 2. UPSTREAM SOURCES (Groww + Google + yfinance) ---
+# Each returns (price, change_vs_prev_close), or None if the source has no
+# price for the symbol. Transport errors and 5xx responses raise, so they
+# count against the source's health; "no such ticker" does not.
+HEADERS = {'User-Agent': 'Mozilla/5.0', 'Accept': 'application/json'}
+SOURCE_TIMEOUT = float(os.getenv("QUOTE_SOURCE_TIMEOUT", "5"))
+
+# Overridable so local stub servers can stand in for the real endpoints
+GROWW_BASE_URL = os.getenv("GROWW_BASE_URL", "https://groww.in").rstrip("/")
+GOOGLE_FINANCE_BASE_URL = os.getenv("GOOGLE_FINANCE_BASE_URL", "https://www.google.com/finance").rstrip("/")
+
+def groww_url(clean_ticker, exchange):
+    return f"{GROWW_BASE_URL}/v1/api/stocks_data/v1/tr_live_prices/exchange/{exchange}/segment/CASH/{clean_ticker}/latest"
+
+def parse_groww(res):
+    if res.status_code >= 500:
+        res.raise_for_status()
+    if res.status_code == 200:
+        data = res.json()
+        price = float(data.get('ltp', 0.0))
+        prev_close = float(data.get('close', 0.0))
+        if price > 0:
+            return price, (price - prev_close)
+    return None
+
+def google_url(clean_ticker, exchange):
+    google_exchange = "BOM" if exchange == "BSE" else "NSE"
+    return f"{GOOGLE_FINANCE_BASE_URL}/quote/{clean_ticker}:{google_exchange}"
+
+def parse_google(res):
+    from bs4 import BeautifulSoup
+    if res.status_code >= 500:
+        res.raise_for_status()
+    soup = BeautifulSoup(res.text, 'html.parser')
+    price_div = soup.find('div', {'data-last-price': True})
+    if price_div:
+        price = float(price_div['data-last-price'])
+        prev_close_div = soup.find('div', {'data-previous-close': True})
+        change = price - float(prev_close_div['data-previous-close']) if prev_close_div else 0.0
+        return price, change
+    return None
+
+def fetch_groww(clean_ticker, exchange):
+    return parse_groww(requests.get(groww_url(clean_ticker, exchange), headers=HEADERS, timeout=SOURCE_TIMEOUT))
+
+def fetch_google(clean_ticker, exchange):
+    return parse_google(requests.get(google_url(clean_ticker, exchange), headers=HEADERS, timeout=SOURCE_TIMEOUT))
+
+def fetch_yfinance(clean_ticker, exchange):
+    yf_ticker = f"{clean_ticker}.BO" if exchange == "BSE" else f"{clean_ticker}.NS"
+    # Local bar store; only tops up from Yahoo if the last refresh is over a minute old
+    hist = ohlcv_store.get_history(yf_ticker, period="5d", max_age=60)
+    if not hist.empty:
+        price = float(hist['Close'].iloc[-1])
+        prev_close = float(hist['Close'].iloc[-2]) if len(hist) >= 2 else price
+        return price, (price - prev_close)
+    return None
+
+# Async twins for the event loop. Groww and Google go through one pooled
+# httpx.AsyncClient; yfinance has no async API, so it runs on a thread.
+_async_client = None
+
+def get_async_client():
+    """The shared AsyncClient, created on first use inside the running event loop."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=SOURCE_TIMEOUT,
+            limits=httpx.Limits(max_connections=int(os.getenv("QUOTE_HTTP_POOL_SIZE", "32")))
+        )
+    return _async_client
+
+async def aclose_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+async def afetch_groww(clean_ticker, exchange):
+    return parse_groww(await get_async_client().get(groww_url(clean_ticker, exchange)))
+
+async def afetch_google(clean_ticker, exchange):
+    res = await get_async_client().get(google_url(clean_ticker, exchange))
+    # A full quote page is big enough that parsing it would stall the loop
+    return await asyncio.to_thread(parse_google, res)
+
+async def afetch_yfinance(clean_ticker, exchange):
+    return await asyncio.to_thread(fetch_yfinance, clean_ticker, exchange)
+
+SOURCES = (("groww", fetch_groww), ("google", fetch_google), ("yfinance", fetch_yfinance))
+ASYNC_SOURCES = (("groww", afetch_groww), ("google", afetch_google), ("yfinance", afetch_yfinance))
+
+
+# --- 3. SOURCE HEALTH + HEDGED ROUTING ---
+class SourceHealth:
+    """
+    Rolling latency and error record for one price source, plus a circuit
+    breaker: after `trip_after` consecutive errors the source is skipped
+    for `cooldown` seconds, then given one trial call (half-open).
+    """
+
+    def __init__(self, window=50, trip_after=3, cooldown=30.0):
+        self.window = window
+        self.trip_after = trip_after
+        self.cooldown = cooldown
+        self._samples = deque(maxlen=window)   # (latency_seconds, outcome)
+        self._consecutive_errors = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+        self.wins = 0
+
+    def record(self, latency, outcome):
+        """outcome is "price", "empty" (answered without a price) or "error"."""
+        with self._lock:
+            self._samples.append((latency, outcome))
+            if outcome != "error":
+                self._consecutive_errors = 0
+                self._open_until = 0.0
+            else:
+                self._consecutive_errors += 1
+                if self._consecutive_errors >= self.trip_after:
+                    self._open_until = time.monotonic() + self.cooldown
+
+    def available(self):
+        with self._lock:
+            return time.monotonic() >= self._open_until
+
+    def _priced_latencies(self, samples):
+        return sorted(latency for latency, outcome in samples if outcome == "price")
+
+    def expected_latency(self):
+        """Median time to a usable price, with every miss (error or no price) costing a full timeout."""
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return 0.0   # untried sources get a turn first
+        priced = self._priced_latencies(samples)
+        miss_rate = 1 - len(priced) / len(samples)
+        median = priced[len(priced) // 2] if priced else SOURCE_TIMEOUT
+        return median + miss_rate * SOURCE_TIMEOUT
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+            open_for = max(self._open_until - time.monotonic(), 0.0)
+        priced = self._priced_latencies(samples)
+        errors = sum(1 for _, outcome in samples if outcome == "error")
+        return {
+            "calls": len(samples),
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+            "hit_rate": round(len(priced) / len(samples), 3) if samples else 0.0,
+            "p50_ms": round(priced[len(priced) // 2] * 1000, 1) if priced else None,
+            "wins": self.wins,
+            "circuit_open": open_for > 0,
+        }
+
+
+class SourceRouter:
+    """
+    Hedged fetch across price sources. The healthiest source goes first;
+    if it hasn't answered after `hedge_delay` seconds (or fails outright),
+    the next one is launched alongside it, and so on. The first valid
+    price wins; slower calls finish in the background and still feed the
+    health stats. A degraded source costs one hedge delay, not a timeout.
+    """
+
+    def __init__(self, sources=SOURCES, async_sources=ASYNC_SOURCES, hedge_delay=0.3,
+                 deadline=SOURCE_TIMEOUT, workers=16):
+        self.sources = dict(sources)
+        self.async_sources = dict(async_sources)
+        self.hedge_delay = hedge_delay
+        self.deadline = deadline
+        self.health = {name: SourceHealth() for name in self.sources}
+        self._stragglers = set()   # async calls still running after their fetch returned
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quotes")
+
+    def ranked(self):
+        """Closed circuits by expected latency (ties keep the default order); open ones last."""
+        names = list(self.sources)
+        names.sort(key=lambda name: (not self.health[name].available(), self.health[name].expected_latency()))
+        return names
+
+    def _record(self, name, latency, outcome):
+        self.health[name].record(latency, outcome)
+        QUOTE_SOURCE_SECONDS.observe(latency, source=name, outcome=outcome)
+
+    def _call(self, name, clean_ticker, exchange):
+        started = time.monotonic()
+        try:
+            result = self.sources[name](clean_ticker, exchange)
+        except Exception:
+            self._record(name, time.monotonic() - started, "error")
+            return None
+        self._record(name, time.monotonic() - started, "price" if result else "empty")
+        return result
+
+    def fetch(self, clean_ticker, exchange):
+        """Returns (source_name, (price, change)) or (None, None)."""
+        queue = self.ranked()
+        pending = {}
+        deadline = time.monotonic() + self.deadline
+        next_hedge = 0.0
+
+        while queue or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if queue and (not pending or now >= next_hedge):
+                name = queue.pop(0)
+                pending[self._executor.submit(self._call, name, clean_ticker, exchange)] = name
+                next_hedge = now + self.hedge_delay
+
+            timeout = deadline - now
+            if queue:
+                timeout = min(timeout, max(next_hedge - now, 0))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                result = future.result()
+                if result:
+                    self.health[name].wins += 1
+                    return name, result
+            if done:
+                next_hedge = 0.0   # a source came back empty: hedge now
+
+        return None, None
+
+    async def _acall(self, name, clean_ticker, exchange):
+        started = time.monotonic()
+        try:
+            result = await self.async_sources[name](clean_ticker, exchange)
+        except Exception:
+            self._record(name, time.monotonic() - started, "error")
+            return None
+        self._record(name, time.monotonic() - started, "price" if result else "empty")
+        return result
+
+    async def afetch(self, clean_ticker, exchange):
+        """fetch() on the event loop: the same hedging, with tasks instead of pool threads."""
+        queue = self.ranked()
+        pending = {}
+        deadline = time.monotonic() + self.deadline
+        next_hedge = 0.0
+
+        try:
+            while queue or pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if queue and (not pending or now >= next_hedge):
+                    name = queue.pop(0)
+                    pending[asyncio.create_task(self._acall(name, clean_ticker, exchange))] = name
+                    next_hedge = now + self.hedge_delay
+
+                timeout = deadline - now
+                if queue:
+                    timeout = min(timeout, max(next_hedge - now, 0))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = pending.pop(task)
+                    result = task.result()
+                    if result:
+                        self.health[name].wins += 1
+                        return name, result
+                if done:
+                    next_hedge = 0.0
+        finally:
+            # Losers keep running to completion so their latency still
+            # reaches the health stats, as with the threaded fetch
+            self._stragglers.update(pending)
+            for task in pending:
+                task.add_done_callback(self._stragglers.discard)
+
+        return None, None
+
+    def snapshot(self):
+        return {"order": self.ranked(), "sources": {n: h.snapshot() for n, h in self.health.items()}}
+
+
+router = SourceRouter(
+    hedge_delay=float(os.getenv("QUOTE_HEDGE_SECONDS", "0.3")),
+    workers=int(os.getenv("QUOTE_WORKERS", "16"))
+)
+
+def _make_quote(clean_ticker, exchange, source, result, started):
+    QUOTE_FETCH_SECONDS.observe(time.monotonic() - started, source=source or "none")
+    if result is None:
+        return None
+    price, change = result
+    return {
+        "ticker": clean_ticker,
+        "exchange": exchange,
+        "price": price,
+        "currency": "₹",
+        "change": change,
+        "is_weekend": datetime.now().weekday() >= 5,
+        "source": source,
+        "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "as_of": time.time(),
+    }
+
+def fetch_quote(clean_ticker, exchange):
+    """Hedged fetch across the sources; the quote records which one answered."""
+    started = time.monotonic()
+    source, result = router.fetch(clean_ticker, exchange)
+    return _make_quote(clean_ticker, exchange, source, result, started)
+
+async def afetch_quote(clean_ticker, exchange):
+    started = time.monotonic()
+    source, result = await router.afetch(clean_ticker, exchange)
+    return _make_quote(clean_ticker, exchange, source, result, started)
+
+
+# --- 4. SHARED QUOTE SERVICE ---
+class QuoteService:
+    """
+    One short-TTL quote per symbol, shared by every caller in the process.
+
+    Concurrent requests for a symbol whose quote is stale are coalesced:
+    the first caller fetches upstream, the rest wait on its result. N
+    dashboards watching one ticker cost one upstream fetch per TTL.
+    """
+
+    def __init__(self, ttl=5.0, fetcher=fetch_quote, afetcher=afetch_quote):
+        self.ttl = ttl
+        self.fetcher = fetcher
+        self.afetcher = afetcher
+        self._quotes = {}      # (symbol, exchange) -> (quote or None, fetched_at)
+        self._inflight = {}    # (symbol, exchange) -> Future
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fetches": 0, "coalesced": 0}
+
+    def _begin(self, key):
+        """("hit", quote), or ("follow", future) / ("lead", future) when a fetch is needed."""
+        now = time.time()
+        with self._lock:
+            cached = self._quotes.get(key)
+            if cached and now - cached[1] < self.ttl:
+                self.stats["hits"] += 1
+                return "hit", cached[0]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return "follow", future
+            future = self._inflight[key] = Future()
+            self.stats["fetches"] += 1
+            return "lead", future
+
+    def _finish(self, key, future, quote):
+        with self._lock:
+            self._quotes[key] = (quote, time.time())
+            del self._inflight[key]
+        if not future.cancelled():
+            future.set_result(quote)
+
+    def get_quote(self, ticker):
+        key = parse_symbol(ticker)
+        role, value = self._begin(key)
+        if role == "hit":
+            return value
+        if role == "follow":
+            return value.result()
+
+        quote = None
+        try:
+            quote = self.fetcher(*key)
+        except Exception as e:
+            print(f"⚠️ Quote fetch failed for {ticker}: {e}")
+        finally:
+            self._finish(key, value, quote)
+        return quote
+
+    async def aget_quote(self, ticker):
+        """get_quote() without blocking the event loop. Coalesces with sync callers too."""
+        key = parse_symbol(ticker)
+        role, value = self._begin(key)
+        if role == "hit":
+            return value
+        if role == "follow":
+            # Shielded: a cancelled caller must not cancel the fetch the
+            # leader and every other follower share
+            return await asyncio.shield(asyncio.wrap_future(value))
+
+        quote = None
+        try:
+            quote = await self.afetcher(*key)
+        except Exception as e:
+            print(f"⚠️ Quote fetch failed for {ticker}: {e}")
+        finally:
+            # Also on cancellation, so followers are never left waiting
+            self._finish(key, value, quote)
+        return quote
+
+    def peek(self, ticker, max_age=None):
+        """The quote already in memory, if any and not older than max_age. Never fetches."""
+        with self._lock:
+            cached = self._quotes.get(parse_symbol(ticker))
+        if not cached or cached[0] is None:
+            return None
+        if max_age is not None and time.time() - cached[1] > max_age:
+            return None
+        return cached[0]
+
+
+quote_service = QuoteService(ttl=float(os.getenv("QUOTE_TTL_SECONDS", "5")))
@@ -0,0 +1,207 @@
+"""
+Re-grade stored reports with the current evaluator rubric.
+
+    python rescore.py                          # every report
+    python rescore.py --ticker TCS --ticker INFY --since 2025-01-01
+    python rescore.py --no-llm                 # consistency rule only; keeps stored judge grades
+    python rescore.py --restart                # ignore the saved checkpoint
+
+Rows are streamed from report_history in id order, one chunk at a
+time. The consistency rule runs over each chunk in one vectorized pass,
+and the LLM judge scores micro-batches with bounded concurrency. Scores
+land in eval_scores, one row per (report, rubric version). After every
+chunk the last rowid is checkpointed, so an interrupted run picks up
+where it stopped.
+
+A judge failure stops the run before that chunk is written. No
+placeholder scores are stored, and re-running resumes at the chunk
+that failed.
+"""
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()  # before evaluator, which builds its OpenAI client at import
+
+import db
+from evaluator import RUBRIC_VERSION, eval_signal_consistency_batch, eval_batch_with_llm_judge
+
+# --- 1. SCHEMA ---
+CREATE_SCORES = '''CREATE TABLE IF NOT EXISTS eval_scores
+                   (report_key TEXT, rubric TEXT, ticker TEXT, report_timestamp TEXT,
+                    signal_consistency REAL, consistency_reason TEXT,
+                    risk_specificity REAL, catalyst_specificity REAL, overall_quality REAL,
+                    reasoning TEXT, scored_at REAL,
+                    PRIMARY KEY (report_key, rubric))'''
+CREATE_SCORES_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_eval_scores_ticker ON eval_scores (ticker, report_timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_eval_scores_quality ON eval_scores (rubric, overall_quality)",
+)
+UPSERT_SCORE = '''REPLACE INTO eval_scores
+                  (report_key, rubric, ticker, report_timestamp, signal_consistency, consistency_reason,
+                   risk_specificity, catalyst_specificity, overall_quality, reasoning, scored_at)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+# --no-llm: refresh the consistency rule only. Judge grades already stored
+# for the report and rubric are kept; new rows get the judge columns empty.
+UPSERT_CONSISTENCY = '''INSERT INTO eval_scores
+                        (report_key, rubric, ticker, report_timestamp, signal_consistency, consistency_reason,
+                         risk_specificity, catalyst_specificity, overall_quality, reasoning, scored_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (report_key, rubric) DO UPDATE SET
+                            signal_consistency=excluded.signal_consistency,
+                            consistency_reason=excluded.consistency_reason,
+                            scored_at=excluded.scored_at'''
+
+CREATE_CHECKPOINTS = '''CREATE TABLE IF NOT EXISTS rescore_checkpoints
+                        (run_id TEXT PRIMARY KEY, filters TEXT, last_rowid INTEGER,
+                         scored INTEGER, updated_at REAL)'''
+SELECT_CHECKPOINT = "SELECT last_rowid, scored FROM rescore_checkpoints WHERE run_id=?"
+UPSERT_CHECKPOINT = '''REPLACE INTO rescore_checkpoints (run_id, filters, last_rowid, scored, updated_at)
+                       VALUES (?, ?, ?, ?, ?)'''
+
+def ensure_schema(pool):
+    with pool.connection() as conn:
+        for statement in (CREATE_SCORES, CREATE_CHECKPOINTS) + CREATE_SCORES_INDEXES:
+            conn.execute(statement)
+
+
+# --- 2. STREAMING READ ---
+def stream_reports(pool, after_rowid=0, tickers=None, since=None, until=None, chunk_size=500):
+    """
+    Yields (last_rowid, [(rowid, ticker, timestamp, data_dict), ...]) chunk by chunk.
+    Keyset pagination on id: no read transaction is held between
+    chunks, and any chunk boundary is a valid resume point.
+    """
+    where, params = ["id > ?"], []
+    if tickers:
+        where.append(f"ticker IN ({','.join('?' * len(tickers))})")
+        params.extend(tickers)
+    if since:
+        where.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("timestamp < ?")
+        params.append(until)
+    query = (f"SELECT id, ticker, timestamp, data FROM report_history "
+             f"WHERE {' AND '.join(where)} ORDER BY id LIMIT ?")
+
+    last = after_rowid
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(query, [last, *params, chunk_size]).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        chunk = []
+        for rowid, ticker, timestamp, data in rows:
+            try:
+                chunk.append((rowid, ticker, timestamp, json.loads(data)))
+            except (TypeError, ValueError):
+                print(f"⚠️ Skipping report {ticker}@{timestamp}: unreadable JSON")
+        yield last, chunk
+
+
+# --- 3. SCORING ---
+class JudgeFailed(RuntimeError):
+    """The LLM judge couldn't score a chunk; it was not saved or checkpointed."""
+
+SKIPPED_JUDGE = {"risk_specificity": None, "catalyst_specificity": None,
+                 "overall_quality": None, "reasoning": "LLM judge skipped (--no-llm)"}
+
+def score_chunk(chunk, executor, judge_batch_size, use_llm):
+    """Score rows for one chunk, ready for UPSERT_SCORE (or UPSERT_CONSISTENCY without the judge)."""
+    consistency = eval_signal_consistency_batch([data for _, _, _, data in chunk])
+
+    if use_llm:
+        batches = [chunk[i:i + judge_batch_size] for i in range(0, len(chunk), judge_batch_size)]
+        # strict: a failed judge call raises rather than returning neutral scores
+        futures = [executor.submit(eval_batch_with_llm_judge, [(data, ticker) for _, ticker, _, data in b], True)
+                   for b in batches]
+        judged = [scores for f in futures for scores in f.result()]
+    else:
+        judged = [SKIPPED_JUDGE] * len(chunk)
+
+    now = time.time()
+    return [
+        (f"{ticker}@{timestamp}", RUBRIC_VERSION, ticker, timestamp,
+         c["score"], c["reason"],
+         j["risk_specificity"], j["catalyst_specificity"], j["overall_quality"], j["reasoning"],
+         now)
+        for (_, ticker, timestamp, _), c, j in zip(chunk, consistency, judged)
+    ]
+
+
+# --- 4. RUN ---
+def run_id_for(filters):
+    """Runs with the same rubric and filters share a checkpoint."""
+    key = json.dumps({"rubric": RUBRIC_VERSION, **filters}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def rescore(path=db.DB_PATH, tickers=None, since=None, until=None, concurrency=4,
+            judge_batch_size=4, chunk_size=200, use_llm=True, restart=False):
+    db.init_db(path)   # brings older databases up to report_history
+    pool = db.get_pool(path)
+    ensure_schema(pool)
+
+    filters = {"source": "report_history", "tickers": sorted(tickers or []),
+               "since": since, "until": until, "llm": use_llm}
+    run_id = run_id_for(filters)
+    upsert = UPSERT_SCORE if use_llm else UPSERT_CONSISTENCY
+
+    after_rowid, scored = 0, 0
+    if not restart:
+        with pool.connection() as conn:
+            row = conn.execute(SELECT_CHECKPOINT, (run_id,)).fetchone()
+        if row:
+            after_rowid, scored = row
+            print(f"↩️ Resuming run {run_id} after rowid {after_rowid} ({scored} already scored)")
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rescore") as executor:
+        for last_rowid, chunk in stream_reports(pool, after_rowid, tickers, since, until, chunk_size):
+            try:
+                rows = score_chunk(chunk, executor, judge_batch_size, use_llm)
+            except Exception as e:
+                raise JudgeFailed(f"judge failed on rowids {after_rowid + 1}–{last_rowid} "
+                                  f"({type(e).__name__}: {e}); nothing from that chunk was saved, "
+                                  f"re-run to resume after rowid {after_rowid}") from e
+            scored += len(rows)
+            # Scores and checkpoint commit together: a crash re-does at most one chunk
+            with pool.transaction(immediate=True) as conn:
+                conn.executemany(upsert, rows)
+                conn.execute(UPSERT_CHECKPOINT, (run_id, json.dumps(filters), last_rowid, scored, time.time()))
+            after_rowid = last_rowid
+            print(f"📝 {scored} reports scored (rubric {RUBRIC_VERSION}, through rowid {last_rowid}, "
+                  f"{time.time() - started:.1f}s)")
+
+    print(f"✅ Rescore complete: {scored} reports under rubric {RUBRIC_VERSION}")
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-grade stored reports with the current eval rubric.")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database (default: market_data.db)")
+    parser.add_argument("--ticker", action="append", dest="tickers", help="Only this ticker (repeatable)")
+    parser.add_argument("--since", help="Only reports at or after this ISO date/time")
+    parser.add_argument("--until", help="Only reports before this ISO date/time")
+    parser.add_argument("--concurrency", type=int, default=4, help="Judge requests in flight at once")
+    parser.add_argument("--judge-batch-size", type=int, default=4, help="Reports per judge request")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Rows read (and checkpointed) at a time")
+    parser.add_argument("--no-llm", action="store_true", help="Consistency rule only, no judge calls")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    args = parser.parse_args()
+
+    try:
+        rescore(path=args.db, tickers=[t.upper() for t in args.tickers or []], since=args.since,
+                until=args.until, concurrency=args.concurrency, judge_batch_size=args.judge_batch_size,
+                chunk_size=args.chunk_size, use_llm=not args.no_llm, restart=args.restart)
+    except JudgeFailed as e:
+        sys.exit(f"❌ Rescore stopped: {e}")
+
+
+if __name__ == "__main__":
+    main()
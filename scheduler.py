@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import QUEUE_WAIT_SECONDS
+
+# Lower number = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_BACKGROUND = 9
+
+
+class QueueFullError(Exception):
+    """Raised by JobScheduler.submit() when the queue is at capacity."""
+
+
+class JobScheduler:
+    """
+    A fixed pool of worker threads draining a bounded priority queue.
+
+    Replaces FastAPI BackgroundTasks for the 45s+ crew runs so they no
+    longer borrow threads from the Starlette threadpool that serves the
+    cheap routes, and so a burst of requests is rejected instead of
+    piling up without limit.
+
+    mode="thread"  -> jobs run directly on the worker threads
+    mode="process" -> heavy calls routed through offload() run in a
+                      process pool of the same size (one per worker)
+
+    Threads (and the process pool) start on start() or the first
+    submit(), not at construction, so building one at import is cheap.
+    """
+
+    def __init__(self, workers=2, max_queue=20, mode="thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.mode = mode
+
+        self._heap = []
+        self._queued = {}          # job_id -> (priority, seq)
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        self._process_pool = None
+        self._threads = []
+
+    def start(self):
+        """Starts the workers. Safe to call more than once."""
+        with self._cond:
+            if self._threads or self._stopped:
+                return
+            if self.mode == "process":
+                # spawn, not fork: forking a process that already runs threads is unsafe
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"agent-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    # --- SUBMISSION ---
+    def submit(self, job_id, fn, *args, priority=PRIORITY_INTERACTIVE):
+        self.start()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Scheduler is shut down")
+            if len(self._heap) >= self.max_queue:
+                raise QueueFullError(f"Queue is full ({self.max_queue} jobs waiting)")
+
+            seq = next(self._seq)
+            heapq.heappush(self._heap, (priority, seq, job_id, fn, args, time.monotonic()))
+            self._queued[job_id] = (priority, seq)
+            self._cond.notify()
+
+    def offload(self, fn, *args):
+        """Runs fn in the process pool when in process mode, inline otherwise."""
+        if self._process_pool is None:
+            return fn(*args)
+        return self._process_pool.submit(fn, *args).result()
+
+    # --- INTROSPECTION ---
+    def position(self, job_id):
+        """1-based position of a queued job, or None if it is not waiting."""
+        with self._cond:
+            key = self._queued.get(job_id)
+            if key is None:
+                return None
+            return 1 + sum(1 for other in self._queued.values() if other < key)
+
+    def depth(self):
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": len(self._heap),
+                "max_queue": self.max_queue,
+            }
+
+    # --- WORKERS ---
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                priority, _, job_id, fn, args, queued_at = heapq.heappop(self._heap)
+                del self._queued[job_id]
+                self._running.add(job_id)
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued_at, priority=priority)
+
+            try:
+                fn(*args)
+            except Exception as e:
+                # Jobs are expected to record their own failures; this only
+                # keeps a stray exception from killing the worker thread.
+                print(f"❌ Worker crashed on job {job_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+
+    def shutdown(self, wait=False):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,73 @@
+"""
+CachedLLM subclasses crewai's internal OpenAICompletion and meters tokens
+from its private _token_usage. Neither is public API; these tests fail,
+rather than metering silently stopping, if a crewai upgrade moves them.
+"""
+import inspect
+import types
+
+import pytest
+from openai.types.chat import ChatCompletion
+
+import main
+from metrics import LLM_TOKENS
+
+
+def completion(text, prompt_tokens, completion_tokens):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    })
+
+
+class FakeCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, model, value):
+        self.entries[key] = value
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(main, "llm_cache", FakeCache())
+    monkeypatch.setattr(main, "LLM_CACHE_ENABLED", True)
+    llm = main.CachedLLM(model="gpt-4o-mini", api_key="test", temperature=0)
+    requests = []
+
+    def create(**params):
+        requests.append(params)
+        return completion("Bullish", prompt_tokens=12, completion_tokens=3)
+    llm.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    llm.requests = requests
+    return llm
+
+
+def test_the_base_class_is_crewais_openai_provider():
+    from crewai.llms.providers.openai.completion import OpenAICompletion
+    assert issubclass(main.CachedLLM, OpenAICompletion)
+    assert list(inspect.signature(OpenAICompletion.call).parameters) == [
+        "self", "messages", "tools", "callbacks", "available_functions", "from_task", "from_agent",
+        "response_model",
+    ]
+
+
+def test_token_usage_is_where_cached_llm_reads_it(llm):
+    assert {"prompt_tokens", "completion_tokens"} <= set(llm._token_usage)
+
+
+def test_calls_are_metered_and_cached(llm):
+    before = dict(LLM_TOKENS._values)
+    messages = [{"role": "user", "content": "Signal for TCS?"}]
+
+    assert llm.call(messages) == "Bullish"
+    assert llm.call(messages) == "Bullish"
+
+    assert len(llm.requests) == 1
+    grown = {key: value - before.get(key, 0) for key, value in LLM_TOKENS._values.items()}
+    assert sorted(v for v in grown.values() if v) == [3, 12]
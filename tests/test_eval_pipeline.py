@@ -0,0 +1,69 @@
+import sys
+import types
+import threading
+
+import pytest
+
+from eval_pipeline import EvalPipeline
+
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    """A stand-in evaluator module: every report scores 1.0, or the whole batch fails."""
+    module = types.SimpleNamespace(fail=False)
+
+    def run_eval_batch(items):
+        if module.fail:
+            raise RuntimeError("judge down")
+        return [{"overall_quality": 1.0} for _ in items]
+    module.run_eval_batch = run_eval_batch
+    monkeypatch.setitem(sys.modules, "evaluator", module)
+    return module
+
+
+def run(pipeline, tickers):
+    for ticker in tickers:
+        assert pipeline.submit({"ticker": ticker, "analysis_data": {}})
+    pipeline.shutdown(timeout=5)
+
+
+def test_reports_are_scored_in_batches(evaluator):
+    scored, flushes = [], []
+    pipeline = EvalPipeline(on_scored=lambda item, scores: scored.append(item["ticker"]),
+                            after_batch=lambda: flushes.append(1), batch_size=4, max_wait=0.2)
+    run(pipeline, ["TCS", "INFY", "ITC"])
+
+    assert sorted(scored) == ["INFY", "ITC", "TCS"]
+    assert pipeline.stats["scored"] == 3
+    assert len(flushes) == pipeline.stats["batches"]
+
+
+def test_a_failed_batch_skips_every_report(evaluator):
+    evaluator.fail = True
+    skipped = []
+    pipeline = EvalPipeline(on_scored=lambda item, scores: None,
+                            on_skipped=lambda item, reason: skipped.append((item["ticker"], reason)), max_wait=0.2)
+    run(pipeline, ["TCS", "INFY"])
+
+    assert sorted(skipped) == [("INFY", "eval failed: judge down"), ("TCS", "eval failed: judge down")]
+
+
+def test_a_failed_flush_does_not_skip_scored_reports(evaluator):
+    events = []
+    lock = threading.Lock()
+
+    def record(kind):
+        def callback(item, *args):
+            with lock:
+                events.append((kind, item["ticker"]))
+        return callback
+
+    def flush():
+        raise ConnectionError("langfuse down")
+
+    pipeline = EvalPipeline(on_scored=record("scored"), on_skipped=record("skipped"), after_batch=flush,
+                            max_wait=0.2)
+    run(pipeline, ["TCS", "INFY"])
+
+    assert sorted(events) == [("scored", "INFY"), ("scored", "TCS")]
+    assert pipeline.stats["scored"] == 2
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+import ohlcv_store
+from freshness import (MarketCalendar, WallClock, FixedThresholdPolicy, VolatilityPolicy,
+                       FRESH, STALE, NEEDS_PRICE)
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+def ist(*args):
+    return datetime(*args, tzinfo=IST)
+
+def report(price, made_at):
+    """A reports row: (price, naive local timestamp, data)."""
+    return (price, made_at.astimezone().replace(tzinfo=None).isoformat(), "{}")
+
+
+# --- MARKET CALENDAR ---
+def test_weekends_and_holidays_are_not_trading_days():
+    calendar = MarketCalendar(holidays=["2026-10-20", " "])
+    assert calendar.is_trading_day(ist(2026, 10, 19).date())
+    assert not calendar.is_trading_day(ist(2026, 10, 20).date())
+    assert not calendar.is_trading_day(ist(2026, 10, 17).date())   # Saturday
+
+
+def test_is_open_uses_market_time_whatever_the_input_zone():
+    calendar = MarketCalendar()
+    assert calendar.is_open(ist(2026, 10, 19, 9, 15))
+    assert not calendar.is_open(ist(2026, 10, 19, 15, 30))
+    # 04:00 UTC is 09:30 IST
+    assert calendar.is_open(datetime(2026, 10, 19, 4, 0, tzinfo=ZoneInfo("UTC")))
+
+
+def test_trading_seconds_count_only_open_market_time():
+    calendar = MarketCalendar(holidays=["2026-10-19"])
+    # Friday 15:00 -> Tuesday 09:45, Monday a holiday: 30 min + 30 min
+    assert calendar.trading_seconds(ist(2026, 10, 16, 15, 0), ist(2026, 10, 20, 9, 45)) == 3600
+    assert calendar.trading_seconds(ist(2026, 10, 16, 16, 0), ist(2026, 10, 19, 9, 0)) == 0
+    assert calendar.trading_seconds(ist(2026, 10, 20), ist(2026, 10, 16)) == 0
+    assert calendar.trading_seconds(ist(2026, 1, 1), ist(2026, 10, 1)) == float("inf")
+
+
+def test_wall_clock_counts_every_second():
+    assert WallClock().trading_seconds(ist(2026, 10, 17, 10), ist(2026, 10, 17, 11)) == 3600
+
+
+# --- POLICIES ---
+def test_report_made_after_the_close_stays_fresh_until_the_open():
+    policy = FixedThresholdPolicy(calendar=MarketCalendar())
+    row = report(100.0, ist(2026, 10, 16, 16, 0))
+    assert policy.check("TCS", row, now=ist(2026, 10, 19, 9, 0)) == FRESH
+
+
+def test_price_decides_within_the_max_age():
+    policy = FixedThresholdPolicy(threshold=0.005, max_age=3600, calendar=MarketCalendar())
+    row = report(100.0, ist(2026, 10, 19, 10, 0))
+    now = ist(2026, 10, 19, 10, 30)
+    assert policy.check("TCS", row, now=now) == NEEDS_PRICE
+    assert policy.check("TCS", row, current_price=100.4, now=now) == FRESH
+    assert policy.check("TCS", row, current_price=101.0, now=now) == STALE
+    assert policy.check("TCS", row, current_price=100.0, now=now + timedelta(hours=1)) == STALE
+
+
+def test_an_in_memory_quote_avoids_the_price_fetch():
+    class Quotes:
+        def peek(self, ticker, max_age=None):
+            return {"price": 100.2}
+
+    policy = FixedThresholdPolicy(calendar=MarketCalendar(), quotes=Quotes())
+    row = report(100.0, ist(2026, 10, 19, 10, 0))
+    assert policy.check("TCS", row, now=ist(2026, 10, 19, 10, 30)) == FRESH
+
+
+@pytest.fixture
+def bar_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(ohlcv_store, "STORE_DIR", str(tmp_path))
+
+    def write(symbol, closes, spread):
+        # Dated back from today: read_history windows against the real clock
+        today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+        days = [today - timedelta(days=len(closes) - i) for i in range(len(closes))]
+        bars = np.zeros(len(closes), dtype=ohlcv_store.BAR_DTYPE)
+        bars["ts"] = [int(d.timestamp() * 1e9) for d in days]
+        bars["Close"] = closes
+        bars["High"] = np.asarray(closes) + spread / 2
+        bars["Low"] = np.asarray(closes) - spread / 2
+        path = tmp_path / "1d" / f"{symbol}.npy"
+        path.parent.mkdir(exist_ok=True)
+        np.save(path, bars)
+    return write
+
+
+def test_volatility_threshold_scales_with_atr_and_is_clamped(bar_store):
+    bar_store("CALM.NS", [100.0] * 40, spread=0.4)    # ATR 0.4% of price
+    bar_store("WILD.NS", [100.0] * 40, spread=20.0)   # ATR 20%
+    policy = VolatilityPolicy(atr_fraction=0.25, floor=0.0025, cap=0.03, default=0.005)
+
+    assert policy.max_move("CALM") == pytest.approx(0.0025)   # 0.1% raised to the floor
+    assert policy.max_move("WILD") == pytest.approx(0.03)     # 5% cut to the cap
+    assert policy.max_move("UNKNOWN") == 0.005                # no bars: the default
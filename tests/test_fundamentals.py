@@ -0,0 +1,45 @@
+import time
+
+import pandas as pd
+import pytest
+
+import db
+import fundamentals
+from cache import TieredCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = TieredCache(fundamentals.SOURCE_TTLS, pool=db.get_pool(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(fundamentals, "source_cache", cache)
+    return cache
+
+
+def expires_in(cache, source, symbol):
+    return cache._memory[(source, symbol)][1] - time.time()
+
+
+@pytest.mark.parametrize("source, empty", [
+    ("income_stmt", pd.DataFrame()),
+    ("info", {}),
+    ("fast_info", dict.fromkeys(fundamentals.FAST_INFO_FIELDS)),
+])
+def test_empty_answers_are_cached_briefly(cache, monkeypatch, source, empty):
+    monkeypatch.setitem(fundamentals._LOADERS, source, lambda symbol: empty)
+
+    fundamentals.fetch_source(source, "TCS.NS")
+    assert 0 < expires_in(cache, source, "TCS.NS") <= fundamentals.EMPTY_RESULT_TTL
+
+
+def test_real_answers_get_the_source_ttl(cache, monkeypatch):
+    calls = []
+
+    def load(symbol):
+        calls.append(symbol)
+        return pd.DataFrame({"2025": [1.0]}, index=["Total Revenue"])
+    monkeypatch.setitem(fundamentals._LOADERS, "income_stmt", load)
+
+    fundamentals.fetch_source("income_stmt", "TCS.NS")
+    fundamentals.fetch_source("income_stmt", "TCS.NS")
+    assert calls == ["TCS.NS"]
+    assert expires_in(cache, "income_stmt", "TCS.NS") > fundamentals.SOURCE_TTLS["income_stmt"] - 60
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import (sma, rolling_std, ema, rsi, atr, macd, bollinger, normalize_symbol,
+                        analyze_tickers, OHLCV_FIELDS)
+
+
+def prices(n=80, columns=2, seed=7):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 1, size=(n, columns)), axis=0)
+
+def reference_ema(values, length, alpha=None):
+    """Textbook EMA, one series at a time, seeded with the first full window's mean."""
+    alpha = alpha if alpha is not None else 2.0 / (length + 1)
+    out = np.full(len(values), np.nan)
+    out[length - 1] = values[:length].mean()
+    for t in range(length, len(values)):
+        out[t] = alpha * values[t] + (1 - alpha) * out[t - 1]
+    return out
+
+
+def test_sma_and_std_match_pandas():
+    close = prices()
+    frame = pd.DataFrame(close)
+    np.testing.assert_allclose(sma(close, 20), frame.rolling(20).mean().to_numpy())
+    np.testing.assert_allclose(rolling_std(close, 20), frame.rolling(20).std(ddof=0).to_numpy())
+
+
+def test_windows_longer_than_the_data_are_all_nan():
+    assert np.isnan(sma(prices(n=10), 20)).all()
+
+
+def test_ema_matches_the_textbook_recursion_per_column():
+    close = prices()
+    out = ema(close, 20)
+    for column in range(close.shape[1]):
+        np.testing.assert_allclose(out[:, column], reference_ema(close[:, column], 20))
+
+
+def test_ema_carries_the_last_value_over_a_missing_bar():
+    close = prices(columns=1)
+    close[30, 0] = np.nan
+    out = ema(close, 10)
+    assert out[30, 0] == out[29, 0]
+    assert not np.isnan(out[31, 0])
+
+
+def test_rsi_matches_wilders_definition():
+    close = prices(columns=1)[:, 0]
+    delta = np.diff(close)
+    avg_gain = reference_ema(np.clip(delta, 0, None), 14, alpha=1 / 14)
+    avg_loss = reference_ema(np.clip(-delta, 0, None), 14, alpha=1 / 14)
+    expected = np.concatenate([[np.nan], 100 - 100 / (1 + avg_gain / avg_loss)])
+
+    np.testing.assert_allclose(rsi(close[:, None], 14)[:, 0], expected)
+
+
+def test_rsi_is_100_when_price_only_rises():
+    close = np.arange(1.0, 31.0)[:, None]
+    assert rsi(close, 14)[-1, 0] == 100.0
+
+
+def test_atr_uses_the_true_range():
+    close = prices(columns=1)
+    high, low = close + 1.0, close - 1.5
+    prev_close = np.concatenate([[np.nan], close[:-1, 0]])
+    true_range = np.fmax(high[:, 0] - low[:, 0],
+                         np.fmax(np.abs(high[:, 0] - prev_close), np.abs(low[:, 0] - prev_close)))
+
+    np.testing.assert_allclose(atr(high, low, close, 14)[:, 0], reference_ema(true_range, 14, alpha=1 / 14))
+
+
+def test_macd_and_bollinger_are_built_from_their_averages():
+    close = prices()
+    line, signal, hist = macd(close)
+    np.testing.assert_allclose(line, ema(close, 12) - ema(close, 26))
+    np.testing.assert_allclose(hist, line - signal)
+
+    upper, mid, lower = bollinger(close, 20, 2.0)
+    np.testing.assert_allclose(upper - mid, 2.0 * rolling_std(close, 20))
+    np.testing.assert_allclose(mid - lower, upper - mid)
+
+
+def ohlcv_frames(close, dates, columns):
+    frame = pd.DataFrame(close, index=dates, columns=columns)
+    return {"Open": frame, "High": frame + 1.0, "Low": frame - 1.5, "Close": frame,
+            "Volume": frame * 0 + 1e6}
+
+
+def test_a_missing_bar_screens_the_same_as_the_ticker_alone():
+    dates = pd.bdate_range("2026-04-01", periods=120)
+    close = prices(n=120)
+    together = ohlcv_frames(close, dates, ["GAP.NS", "FULL.NS"])
+    for field in OHLCV_FIELDS:
+        together[field].iloc[-5, 0] = np.nan
+    alone = ohlcv_frames(np.delete(close[:, :1], -5, axis=0), dates.delete(-5), ["GAP.NS"])
+
+    screened = analyze_tickers(["GAP", "FULL"], ohlcv=together)
+    pd.testing.assert_series_equal(screened.loc["GAP.NS"], analyze_tickers(["GAP"], ohlcv=alone).loc["GAP.NS"])
+    assert not screened.loc["GAP.NS"].isna().any()
+
+
+def test_a_ticker_behind_the_others_reports_its_own_latest_bar():
+    dates = pd.bdate_range("2026-04-01", periods=80)
+    together = ohlcv_frames(prices(), dates, ["LATE.NS", "FULL.NS"])
+    for field in OHLCV_FIELDS:
+        together[field].iloc[-3:, 0] = np.nan
+
+    screened = analyze_tickers(["LATE", "FULL"], ohlcv=together)
+    assert screened.loc["LATE.NS", "close"] == together["Close"].iloc[-4, 0]
+    assert screened.loc["LATE.NS", "sma20"] == pytest.approx(together["Close"].iloc[-23:-3, 0].mean())
+
+
+@pytest.mark.parametrize("ticker, expected", [
+    ("tcs", "TCS.NS"), (" TCS.NS ", "TCS.NS"), ("500325.BO", "500325.BO"),
+])
+def test_normalize_symbol(ticker, expected):
+    assert normalize_symbol(ticker) == expected
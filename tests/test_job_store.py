@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from job_store import create_job_store, ORPHANED_ERROR
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return create_job_store(request.param, path=str(tmp_path / "jobs.db"), claim_ttl_seconds=90)
+
+
+def age(store, seconds):
+    """Moves every claim this store holds `seconds` into the past, as if that long had gone by."""
+    with store._held_lock:
+        store._held = {t: (j, since - seconds) for t, (j, since) in store._held.items()}
+    if hasattr(store, "_claims"):
+        store._claims = {t: (j, at - seconds) for t, (j, at) in store._claims.items()}
+        store._jobs = {j: (data, at - seconds) for j, (data, at) in store._jobs.items()}
+    else:
+        with store.pool.connection() as conn:
+            conn.execute("UPDATE job_claims SET claimed_at = claimed_at - ?", (seconds,))
+            conn.execute("UPDATE jobs SET updated_at = updated_at - ?", (seconds,))
+
+
+# --- CLAIMS ---
+def test_a_claimed_ticker_is_shared_until_released(store):
+    assert store.claim_ticker("TCS", "job1") is None
+    assert store.claim_ticker("TCS", "job2") == "job1"
+    assert store.active_job("TCS") == "job1"
+
+    store.release_ticker("TCS", "job2")     # not its claim: no effect
+    assert store.active_job("TCS") == "job1"
+    store.release_ticker("TCS", "job1")
+    assert store.active_job("TCS") is None
+    assert store.claim_ticker("TCS", "job2") is None
+
+
+def test_a_stale_claim_can_be_taken_over(store):
+    store.claim_ticker("TCS", "job1")
+    age(store, 100)
+    assert store.active_job("TCS") is None
+    assert store.claim_ticker("TCS", "job2") is None
+
+
+# --- HEARTBEAT ---
+@pytest.mark.parametrize("status", ["waiting", "queued", "running"])
+def test_heartbeat_keeps_active_jobs_claimed(store, status):
+    store.claim_ticker("TCS", "job1")
+    store.put("job1", {"status": status}, ticker="TCS")
+    age(store, 80)
+
+    store.refresh_claims()
+    age(store, 80)
+    assert store.active_job("TCS") == "job1"
+    store.evict_expired()
+    assert store.get("job1")["status"] == status
+
+
+def test_heartbeat_drops_claims_of_finished_jobs(store):
+    store.claim_ticker("TCS", "job1")
+    store.put("job1", {"status": "completed"}, ticker="TCS")
+    store.claim_ticker("INFY", "job2")      # job never stored
+    age(store, 100)
+
+    store.refresh_claims()
+    assert store._held == {}
+    assert store.claim_ticker("TCS", "job3") is None
+    assert store.claim_ticker("INFY", "job4") is None
+
+
+def test_heartbeat_spares_a_fresh_claim_whose_job_is_not_stored_yet(store):
+    store.claim_ticker("TCS", "job1")
+    store.refresh_claims()
+    store.put("job1", {"status": "queued"}, ticker="TCS")
+    assert store.active_job("TCS") == "job1"
+    assert "TCS" in store._held
+
+
+# --- EVICTION ---
+def test_unrefreshed_jobs_are_failed_as_orphans(store):
+    store.put("job1", {"status": "queued", "events": []}, ticker="TCS")
+    store.put("batch1", {"kind": "batch", "status": "running", "members": {}})
+    age(store, 100)
+
+    store.evict_expired()
+    job = store.get("job1")
+    assert (job["status"], job["error"]) == ("failed", ORPHANED_ERROR)
+    assert job["events"][-1]["stage"] == "failed"
+    assert store.get("batch1")["status"] == "running"
+
+
+def test_finished_jobs_are_evicted_after_the_ttl(store):
+    store.put("job1", {"status": "completed"}, ticker="TCS")
+    store.put("job2", {"status": "completed"}, ticker="INFY")
+    store.ttl_seconds = 50
+    age(store, 60)
+    store.put("job2", {"status": "completed"}, ticker="INFY")
+
+    store.evict_expired()
+    assert store.get("job1") is None
+    assert store.get("job2") == {"status": "completed"}
+
+
+def test_update_merges_and_events_append(store):
+    store.put("job1", {"status": "queued", "events": [{"stage": "queued"}]}, ticker="TCS")
+    store.update("job1", {"status": "running"})
+    store.append_event("job1", {"stage": "running"})
+    assert store.get("job1") == {"status": "running", "events": [{"stage": "queued"}, {"stage": "running"}]}
+
+
+def test_updating_a_missing_job_does_not_create_it(store):
+    store.update("gone", {"status": "running"})
+    store.append_event("gone", {"stage": "running"})
+    assert store.get("gone") is None
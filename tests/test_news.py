@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import db
+import news
+from news import NewsIndex, url_key, content_hash
+
+ARTICLES = [
+    {"link": "https://www.example.com/tcs-results/?utm_source=feed", "title": "TCS Q2 results beat estimates",
+     "source": "Example", "date": "2 hours ago"},
+    # The same page without tracking params, under an edited headline
+    {"link": "https://example.com/tcs-results", "title": "TCS second quarter numbers", "date": "2 hours ago"},
+    # The same story syndicated to another site
+    {"link": "https://other.in/markets/tcs-q2", "title": "TCS Q2 Results Beat Estimates!", "date": "3 hours ago"},
+    {"link": "https://example.com/tcs-deal", "title": "TCS wins a large deal", "date": "1 day ago"},
+    {"link": "https://example.com/tcs-old", "title": "TCS news from last month", "date": "3 weeks ago"},
+    {"title": "An item without a link"},
+]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(news, "FIXTURE_DIR", str(tmp_path))
+    (tmp_path / "TCS.json").write_text(json.dumps({"news": ARTICLES}))
+    return NewsIndex(pool=db.get_pool(str(tmp_path / "news.db")))
+
+
+# --- DEDUP KEYS ---
+@pytest.mark.parametrize("url", [
+    "https://example.com/tcs-results", "https://www.example.com/tcs-results/",
+    "https://example.com/tcs-results?utm_medium=social&fbclid=abc", "https://example.com/tcs-results/amp",
+])
+def test_url_key_ignores_tracking_and_presentation(url):
+    assert url_key(url) == url_key("https://example.com/tcs-results")
+
+def test_url_key_keeps_meaningful_params():
+    assert url_key("https://example.com/story?id=1") != url_key("https://example.com/story?id=2")
+
+def test_content_hash_ignores_case_and_punctuation():
+    assert content_hash("TCS Q2 results beat estimates") == content_hash("  TCS: Q2 Results -- beat estimates!")
+
+
+# --- LOCAL INDEX ---
+def test_fixture_articles_are_stored_once(index):
+    articles = index.recent("TCS.NS")
+
+    assert [a["title"] for a in articles] == ["TCS Q2 results beat estimates", "TCS wins a large deal"]
+    assert articles[0]["source"] == "Example"
+    # Both queries read the same fixture: the second one finds nothing new
+    assert index.stats == {"search_hits": 0, "search_misses": 2, "articles_new": 3, "articles_deduped": 7}
+
+def test_searches_are_cached_within_the_ttl(index):
+    index.recent("TCS")
+    assert index.recent("TCS", limit=1)[0]["title"] == "TCS Q2 results beat estimates"
+    assert index.stats["search_hits"] == 2
+    assert index.stats["search_misses"] == 2
+
+def test_a_failed_search_serves_what_is_already_indexed(index, monkeypatch):
+    index.recent("TCS")
+    index.ttl = 0
+
+    def down(symbol):
+        raise ConnectionError("down")
+    monkeypatch.setattr(news, "search_fixture", down)
+
+    assert len(index.recent("TCS")) == 2
+
+def test_a_ticker_without_a_fixture_has_no_news(index):
+    assert index.recent("INFY") == []
@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
+
+from freshness import MarketCalendar
+from prewarm import Prewarmer, FakeClock
+
+IST = ZoneInfo("Asia/Kolkata")
+FRIDAY_EVENING = datetime(2026, 10, 16, 18, 0, tzinfo=IST)
+MONDAY = date(2026, 10, 19)
+
+
+def local_naive(moment):
+    """Reports store naive local timestamps."""
+    return moment.astimezone().replace(tzinfo=None).isoformat()
+
+
+class Recorder:
+    def __init__(self, result=True):
+        self.result = result
+        self.tickers = []
+        self._lock = threading.Lock()
+
+    def __call__(self, ticker):
+        with self._lock:
+            self.tickers.append(ticker)
+        return self.result
+
+
+def make_prewarmer(warm, tickers, clock, holidays=(), get_report=lambda ticker: None, **kwargs):
+    return Prewarmer(warm, tickers=tickers, clock=clock, calendar=MarketCalendar(holidays=holidays),
+                     get_report=get_report, **kwargs)
+
+
+def test_sleeps_over_the_weekend_and_warms_in_mondays_window():
+    clock = FakeClock(FRIDAY_EVENING)
+    warm = Recorder()
+    prewarmer = make_prewarmer(warm, ["TCS", "INFY", "RELIANCE"], clock)
+
+    prewarmer.run_forever(max_passes=1)
+
+    assert warm.tickers == ["TCS", "INFY", "RELIANCE"]
+    assert prewarmer.last_window == MONDAY
+    assert prewarmer.stats == {"passes": 1, "warmed": 3, "skipped": 0, "failed": 0, "missed": 0}
+    # Hourly wake-ups until 08:30 IST Monday, the open minus the 45 minute lead
+    waits = clock.slept[:-2]
+    assert max(waits) <= 3600
+    assert FRIDAY_EVENING + timedelta(seconds=sum(waits)) == datetime(2026, 10, 19, 8, 30, tzinfo=IST)
+
+
+def test_starts_are_rate_limited_and_leftovers_are_missed_at_the_open():
+    clock = FakeClock(datetime(2026, 10, 19, 8, 30, tzinfo=IST))
+    warm = Recorder()
+    tickers = [f"T{i}" for i in range(100)]
+    prewarmer = make_prewarmer(warm, tickers, clock, rate_per_minute=2)
+
+    prewarmer.run_forever(max_passes=1)
+
+    # One start every 30s from 08:30 leaves room for 90 before 09:15
+    assert warm.tickers == tickers[:90]
+    assert prewarmer.stats["warmed"] == 90
+    assert prewarmer.stats["missed"] == 10
+    assert set(clock.slept) == {30.0}
+
+
+def test_holidays_move_the_window_to_the_next_trading_day():
+    clock = FakeClock(FRIDAY_EVENING)
+    prewarmer = make_prewarmer(Recorder(), ["TCS"], clock, holidays=["2026-10-19"])
+
+    prewarmer.run_forever(max_passes=1)
+
+    assert prewarmer.last_window == date(2026, 10, 20)
+
+
+def test_next_window_skips_a_window_already_run():
+    clock = FakeClock(datetime(2026, 10, 19, 8, 40, tzinfo=IST))
+    prewarmer = make_prewarmer(Recorder(), ["TCS"], clock)
+
+    start, end = prewarmer.next_window(clock.now())
+    assert (start, end) == (datetime(2026, 10, 19, 8, 30, tzinfo=IST), datetime(2026, 10, 19, 9, 15, tzinfo=IST))
+
+    prewarmer.last_window = MONDAY
+    assert prewarmer.next_window(clock.now())[0] == datetime(2026, 10, 20, 8, 30, tzinfo=IST)
+
+
+def test_tickers_refreshed_inside_the_window_are_skipped():
+    window_start = datetime(2026, 10, 19, 8, 30, tzinfo=IST)
+    reports = {
+        "TCS": (3500.0, local_naive(window_start + timedelta(minutes=5)), "{}"),   # warmed after a restart
+        "INFY": (1500.0, local_naive(window_start - timedelta(days=3)), "{}"),    # Friday's report
+    }
+    clock = FakeClock(window_start)
+    warm = Recorder()
+    prewarmer = make_prewarmer(warm, ["TCS", "INFY", "ITC"], clock, get_report=reports.get)
+
+    prewarmer.run_forever(max_passes=1)
+
+    assert warm.tickers == ["INFY", "ITC"]
+    assert prewarmer.stats["skipped"] == 1
+    assert prewarmer.stats["warmed"] == 2
+
+
+def test_declined_and_failing_warms_are_counted():
+    def warm(ticker):
+        if ticker == "BAD":
+            raise RuntimeError("crew failed")
+        return ticker != "BUSY"
+
+    clock = FakeClock(datetime(2026, 10, 19, 8, 30, tzinfo=IST))
+    prewarmer = make_prewarmer(warm, ["TCS", "BUSY", "BAD"], clock)
+
+    prewarmer.run_forever(max_passes=1)
+
+    assert prewarmer.stats == {"passes": 1, "warmed": 1, "skipped": 1, "failed": 1, "missed": 0}
@@ -0,0 +1,163 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+import quotes
+from quotes import SourceRouter, QuoteService
+
+GROWW_PRICES = {"TCS": {"ltp": 3500.0, "close": 3450.0}, "SLOW": {"ltp": 10.0, "close": 10.0}}
+GOOGLE_PAGE = '<div data-last-price="{price}"></div><div data-previous-close="{prev}"></div>'
+GOOGLE_PRICES = {"TCS": (3501.0, 3451.0), "SLOW": (20.0, 19.0)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Groww's JSON endpoint and Google Finance's quote page, by path."""
+
+    def do_GET(self):
+        if self.path.startswith("/groww/"):
+            symbol = self.path.split("/")[-2]
+            if symbol == "SLOW":
+                time.sleep(1.0)
+            self._reply(200, json.dumps(GROWW_PRICES[symbol])) if symbol in GROWW_PRICES else self._reply(404, "{}")
+        elif self.path.startswith("/finance/quote/"):
+            symbol = self.path.rsplit("/", 1)[-1].split(":")[0]
+            if symbol == "ERR":
+                self._reply(500, "")
+            elif symbol in GOOGLE_PRICES:
+                price, prev = GOOGLE_PRICES[symbol]
+                self._reply(200, GOOGLE_PAGE.format(price=price, prev=prev))
+            else:
+                self._reply(200, "<html></html>")
+        else:
+            self._reply(404, "")
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # A hedged-away SLOW request answers after its client has hung up
+        pass
+
+
+@pytest.fixture
+def stub_sources(monkeypatch):
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(quotes, "GROWW_BASE_URL", f"{base}/groww")
+    monkeypatch.setattr(quotes, "GOOGLE_FINANCE_BASE_URL", f"{base}/finance")
+    yield
+    server.shutdown()
+
+
+# --- SOURCES ---
+def test_sources_read_the_stub_endpoints(stub_sources):
+    assert quotes.fetch_groww("TCS", "NSE") == (3500.0, 50.0)
+    assert quotes.fetch_google("TCS", "NSE") == (3501.0, 50.0)
+    assert quotes.fetch_groww("NOPE", "NSE") is None
+    assert quotes.fetch_google("NOPE", "NSE") is None
+    with pytest.raises(requests.HTTPError):
+        quotes.fetch_google("ERR", "NSE")
+
+
+def test_async_sources_read_the_stub_endpoints(stub_sources):
+    async def fetch():
+        try:
+            return (await quotes.afetch_groww("TCS", "NSE"), await quotes.afetch_google("TCS", "NSE"))
+        finally:
+            await quotes.aclose_async_client()
+
+    assert asyncio.run(fetch()) == ((3500.0, 50.0), (3501.0, 50.0))
+
+
+# --- HEDGED ROUTING ---
+def make_router(**kwargs):
+    return SourceRouter(
+        sources=(("groww", quotes.fetch_groww), ("google", quotes.fetch_google)),
+        async_sources=(("groww", quotes.afetch_groww), ("google", quotes.afetch_google)),
+        hedge_delay=0.1, deadline=3, workers=4, **kwargs
+    )
+
+
+def test_a_slow_source_costs_one_hedge_delay(stub_sources):
+    router = make_router()
+    started = time.monotonic()
+    assert router.fetch("SLOW", "NSE") == ("google", (20.0, 1.0))
+    assert time.monotonic() - started < 0.8
+
+
+def test_async_fetch_hedges_the_same_way(stub_sources):
+    router = make_router()
+
+    async def fetch():
+        try:
+            started = time.monotonic()
+            return await router.afetch("SLOW", "NSE"), time.monotonic() - started
+        finally:
+            await quotes.aclose_async_client()
+
+    result, elapsed = asyncio.run(fetch())
+    assert result == ("google", (20.0, 1.0))
+    assert elapsed < 0.8
+
+
+def test_failing_source_is_moved_to_the_back():
+    def broken(clean_ticker, exchange):
+        raise ConnectionError("down")
+
+    def healthy(clean_ticker, exchange):
+        return (1.0, 0.0) if clean_ticker == "TCS" else None
+
+    router = SourceRouter(sources=(("broken", broken), ("ok", healthy)), async_sources=(),
+                          hedge_delay=0.05, workers=2)
+    assert router.fetch("TCS", "NSE") == ("ok", (1.0, 0.0))
+    assert router.ranked() == ["ok", "broken"]
+
+    # Nobody has a price for NOPE, so every call reaches the broken source
+    for _ in range(2):
+        assert router.fetch("NOPE", "NSE") == (None, None)
+    assert not router.health["broken"].available()
+
+
+# --- SHARED QUOTE SERVICE ---
+def test_cancelled_follower_does_not_cancel_the_shared_fetch():
+    release = threading.Event()
+
+    async def afetcher(symbol, exchange):
+        await asyncio.to_thread(release.wait)
+        return {"price": 1.0}
+
+    service = QuoteService(afetcher=afetcher, fetcher=lambda *key: None)
+    sync_result = {}
+
+    async def scenario():
+        leader = asyncio.create_task(service.aget_quote("TCS"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(service.aget_quote("TCS"))
+        sync_follower = threading.Thread(target=lambda: sync_result.setdefault("quote", service.get_quote("TCS")))
+        sync_follower.start()
+        await asyncio.sleep(0.05)
+        follower.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        quote = await leader
+        await asyncio.to_thread(sync_follower.join)
+        return quote
+
+    assert asyncio.run(scenario()) == {"price": 1.0}
+    assert sync_result == {"quote": {"price": 1.0}}
+    assert service.stats == {"hits": 0, "fetches": 1, "coalesced": 2}
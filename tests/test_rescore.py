@@ -0,0 +1,69 @@
+import os
+import json
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")   # evaluator builds its client at import
+
+import db
+import rescore
+
+REPORTS = [
+    ("TCS", 3500.0, "2026-10-16T16:00:00", {"technical_signal": "Bullish", "sentiment_score": 8.0}),
+    ("INFY", 1500.0, "2026-10-16T16:05:00", {"technical_signal": "Bearish", "sentiment_score": 7.0}),
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    path = str(tmp_path / "rescore.db")
+    db.init_db(path)
+    db.save_reports([(t, p, ts, json.dumps(data)) for t, p, ts, data in REPORTS], db.get_pool(path))
+    return path
+
+
+@pytest.fixture
+def judge(monkeypatch):
+    calls = []
+
+    def fake_judge(items, strict=False):
+        calls.append([ticker for _, ticker in items])
+        return [{"risk_specificity": 7.0, "catalyst_specificity": 6.0, "overall_quality": 8.0,
+                 "reasoning": "good"} for _ in items]
+    monkeypatch.setattr(rescore, "eval_batch_with_llm_judge", fake_judge)
+    return calls
+
+
+def scores(path):
+    with db.get_pool(path).connection() as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT ticker, signal_consistency, overall_quality, reasoning FROM eval_scores")}
+
+
+def test_llm_run_stores_judge_grades(history, judge):
+    assert rescore.rescore(path=history) == 2
+    assert scores(history) == {"TCS": (1.0, 8.0, "good"), "INFY": (0.0, 8.0, "good")}
+
+
+def test_no_llm_run_keeps_the_judge_grades(history, judge):
+    rescore.rescore(path=history)
+    assert rescore.rescore(path=history, use_llm=False) == 2
+
+    assert scores(history) == {"TCS": (1.0, 8.0, "good"), "INFY": (0.0, 8.0, "good")}
+    assert judge == [["TCS", "INFY"]]
+
+
+def test_no_llm_run_leaves_new_rows_ungraded(history, judge):
+    rescore.rescore(path=history, use_llm=False)
+    assert scores(history)["TCS"] == (1.0, None, "LLM judge skipped (--no-llm)")
+    assert judge == []
+
+
+def test_a_failed_judge_saves_nothing_and_resumes(history, monkeypatch):
+    def down(items, strict=False):
+        raise ConnectionError("judge down")
+    monkeypatch.setattr(rescore, "eval_batch_with_llm_judge", down)
+
+    with pytest.raises(rescore.JudgeFailed):
+        rescore.rescore(path=history)
+    assert scores(history) == {}
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+import app
+from job_store import MemoryJobStore
+from scheduler import JobScheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(workers=1, max_queue=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def occupy(scheduler):
+    """Keeps the only worker busy until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+    scheduler.submit("blocker", lambda: (started.set(), release.wait()))
+    assert started.wait(5)
+    return release
+
+
+# --- SCHEDULER ---
+def test_interactive_jobs_overtake_queued_batch_jobs(scheduler):
+    release, done = occupy(scheduler), threading.Event()
+    order = []
+
+    def record(name):
+        order.append(name)
+        if len(order) == 2:
+            done.set()
+
+    scheduler.submit("batch", record, "batch", priority=PRIORITY_BATCH)
+    scheduler.submit("interactive", record, "interactive", priority=PRIORITY_INTERACTIVE)
+    assert scheduler.position("interactive") == 1
+    assert scheduler.position("batch") == 2
+
+    release.set()
+    assert done.wait(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_a_full_queue_rejects_new_jobs(scheduler):
+    release = occupy(scheduler)
+    scheduler.submit("a", lambda: None)
+    scheduler.submit("b", lambda: None)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("c", lambda: None)
+    release.set()
+
+
+def test_a_shut_down_scheduler_rejects_jobs(scheduler):
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("a", lambda: None)
+
+
+# --- CLAIMS ON FAILED HAND-OFFS ---
+@pytest.fixture
+def stopped(monkeypatch):
+    """app with a fresh job store and a scheduler that has been shut down."""
+    store = MemoryJobStore()
+    stopped = JobScheduler(workers=1)
+    stopped.shutdown()
+    monkeypatch.setattr(app, "job_store", store)
+    monkeypatch.setattr(app, "scheduler", stopped)
+    return store
+
+
+def test_enqueue_releases_the_claim_when_the_scheduler_is_down(stopped):
+    with pytest.raises(RuntimeError):
+        app.enqueue_analysis("TCS")
+    assert stopped.active_job("TCS") is None
+    assert stopped._jobs == {}
+    assert stopped._held == {}
+
+
+def test_enqueue_releases_the_claim_when_the_job_cannot_be_stored(stopped, monkeypatch):
+    def busy(*args, **kwargs):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(stopped, "put", busy)
+
+    with pytest.raises(RuntimeError):
+        app.enqueue_analysis("TCS")
+    assert stopped.active_job("TCS") is None
+
+
+def test_batch_members_that_cannot_be_queued_are_failed_and_released(stopped):
+    members = []
+    for ticker in ("TCS", "INFY", "ITC"):
+        job_id = f"job-{ticker}"
+        stopped.claim_ticker(ticker, job_id)
+        stopped.put(job_id, {"status": "waiting", "events": []}, ticker=ticker)
+        members.append((job_id, ticker))
+
+    app.dispatch_batch(members)
+
+    for job_id, ticker in members:
+        job = stopped.get(job_id)
+        assert job["status"] == "failed"
+        assert job["events"][-1]["stage"] == "failed"
+        assert stopped.active_job(ticker) is None
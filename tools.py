@@ -1,43 +1,87 @@
 import pandas as pd
-import yfinance as yf
-import pandas_ta as ta
 from crewai.tools import tool
+from indicators import analyze_tickers, normalize_symbol
+from news import get_news
+from metrics import TOOL_SECONDS
+
+def _fmt(val, prefix=""):
+    return f"{prefix}{float(val):.2f}" if pd.notnull(val) else "Calculating..."
+
+def format_technicals(ticker, row):
+    """Renders one row of indicators.analyze_tickers() for an agent."""
+    return (f"--- Data for {ticker} ---\n"
+            f"Price: ₹{float(row['close']):.2f}\n"
+            f"RSI: {_fmt(row['rsi14'])}\n"
+            f"MA20: {_fmt(row['sma20'], '₹')}\n"
+            f"MA50: {_fmt(row['sma50'], '₹')}\n"
+            f"EMA20: {_fmt(row['ema20'], '₹')}\n"
+            f"MACD: {_fmt(row['macd'])} (signal {_fmt(row['macd_signal'])}, hist {_fmt(row['macd_hist'])})\n"
+            f"Bollinger(20,2): {_fmt(row['bb_lower'], '₹')} – {_fmt(row['bb_upper'], '₹')}\n"
+            f"ATR14: {_fmt(row['atr14'], '₹')} ({_fmt(row['atr_pct'])}% of price)\n")
+
+def technicals_snapshot(ticker):
+    """
+    Latest indicators for one ticker as a plain dict (None where a window
+    isn't full yet), or None if there's no data. Same numbers the
+    stock_price_analyzer tool reports, without going through an agent.
+    """
+    ticker = normalize_symbol(ticker)
+    with TOOL_SECONDS.time(tool="technicals_snapshot"):
+        snapshot = analyze_tickers([ticker])
+    if ticker not in snapshot.index:
+        return None
+    row = snapshot.loc[ticker]
+    values = {name: round(float(val), 2) if pd.notnull(val) else None for name, val in row.items()}
+    return {"ticker": ticker, **values}
 
 @tool("stock_price_analyzer")
 def stock_price_analyzer(ticker: str):
     """
-    Pulls historical data for an Indian stock (NSE) and calculates 
-    RSI and 20-day Moving Average.
+    Pulls historical data for an Indian stock (NSE) and calculates
+    RSI, 20/50-day Moving Averages, MACD, Bollinger Bands and ATR.
     """
-    if not ticker.endswith(".NS"):
-        ticker = f"{ticker}.NS"
-        
-    data = yf.download(ticker, period="1mo", interval="1d", auto_adjust=True)
-    
-    if data.empty:
+    ticker = normalize_symbol(ticker)
+    with TOOL_SECONDS.time(tool="stock_price_analyzer"):
+        snapshot = analyze_tickers([ticker])
+
+    if ticker not in snapshot.index:
         return f"Error: No data found for {ticker}."
 
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = data.columns.get_level_values(0)
-
-    # Calculate indicators
-    data['RSI'] = ta.rsi(data['Close'], length=14)
-    data['MA20'] = ta.sma(data['Close'], length=20)
-    
-    # Get the last row values as scalar floats
-    last_row = data.iloc[-1]
-    
-    current_price = float(last_row['Close'])
-    
-    # Handle NaN values for RSI/MA
-    rsi_val = last_row['RSI']
-    ma_val = last_row['MA20']
-    
-    # Convert to strings for the agent
-    rsi_str = f"{float(rsi_val):.2f}" if pd.notnull(rsi_val) else "Calculating..."
-    ma_str = f"{float(ma_val):.2f}" if pd.notnull(ma_val) else "Calculating..."
+    return format_technicals(ticker, snapshot.loc[ticker])
 
-    return (f"--- Data for {ticker} ---\n"
-            f"Price: ₹{current_price:.2f}\n"
-            f"RSI: {rsi_str}\n"
-            f"MA20: ₹{ma_str}\n")
\ No newline at end of file
+@tool("bulk_technical_screener")
+def bulk_technical_screener(tickers: str):
+    """
+    Screens many Indian stocks (NSE) at once. Takes a comma-separated list
+    of tickers and returns Price, RSI, moving averages, MACD, Bollinger
+    Bands and ATR for each, computed in a single pass.
+    """
+    symbols = [normalize_symbol(t) for t in tickers.split(",") if t.strip()]
+    with TOOL_SECONDS.time(tool="bulk_technical_screener"):
+        snapshot = analyze_tickers(symbols)
+
+    reports = []
+    for ticker in symbols:
+        if ticker in snapshot.index:
+            reports.append(format_technicals(ticker, snapshot.loc[ticker]))
+        else:
+            reports.append(f"Error: No data found for {ticker}.\n")
+    return "\n".join(reports)
+
+@tool("news_search")
+def news_search(ticker: str):
+    """
+    Recent news (last 7 days) for an Indian stock from Moneycontrol,
+    Economic Times, Livemint and other outlets. Takes a ticker such as
+    RELIANCE and returns deduplicated headlines with source, date and
+    a short snippet.
+    """
+    with TOOL_SECONDS.time(tool="news_search"):
+        articles = get_news(ticker)
+    if not articles:
+        return f"No news found for {ticker} in the last 7 days."
+
+    lines = [f"--- News for {ticker} ---"]
+    for a in articles:
+        lines.append(f"[{a['published']}] {a['title']} ({a['source']})\n{a['snippet']}\n{a['url']}")
+    return "\n\n".join(lines)